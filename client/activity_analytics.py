@@ -0,0 +1,314 @@
+"""Vectorized work/relax analytics over exported activity.
+
+Reads the NDJSON or CSV that /api/export/events streams (see the
+server's routes/export.js) into columnar NumPy arrays with one row per
+(minute, window) part: user id, epoch minute, interned window id and the
+share of the minute spent in that window. It then computes per-user
+hourly, daily and weekly work/relax minutes and each user's top windows
+by grouping combined integer keys with bincount, instead of looping
+over events. Work and relax are split on BANNED_APPS the way the
+server's utils/activity.js does.
+
+NumPy is only needed by this tool (and bench_activity_analytics.py), not
+by the client itself.
+
+    python activity_analytics.py events.ndjson --tz Asia/Taipei --out reports
+"""
+import os
+import sys
+import csv
+import json
+import argparse
+from array import array
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:  # Python 3.8
+    ZoneInfo = None
+
+# Same list as the server's contants/index.js
+BANNED_APPS = frozenset([
+    "dota2.exe", "AoK HD.exe", "hl.exe", "war3.exe", "Dota2Start.exe", "game.exe",
+    "fifa.exe", "call_to_arms.exe", "dnplayer.exe", "vietnam.exe", "mowas_2.exe",
+    "CivilizationV.exe", "SAN14_EN.exe",
+])
+
+GRANULARITIES = ('hour', 'day', 'week')
+MINUTES = {'hour': 60, 'day': 1440, 'week': 7 * 1440}
+# 1970-01-01 was a Thursday; weeks start on Sunday like the server's buckets
+WEEK_SHIFT_DAYS = 4
+# Largest key range grouped with a dense bincount, sparser keys use np.unique
+DENSE_KEYS = 1 << 26
+EPOCH = datetime(1970, 1, 1)
+
+
+class ActivityColumns:
+    """One row per (minute, window) part of the exported events"""
+
+    def __init__(self, users, windows, user, minute, window, weight):
+        self.users = users  # user id -> username
+        self.windows = windows  # window id -> window name
+        self.user = user  # int32 user id
+        self.minute = minute  # int64 epoch minute (UTC)
+        self.window = window  # int32 window id
+        self.weight = weight  # float32 share of the minute, the parts of a minute sum to 1
+
+    def __len__(self):
+        return len(self.user)
+
+    def relax_weight(self):
+        """Weight of each part that counts as relax"""
+        banned = np.fromiter((name in BANNED_APPS for name in self.windows),
+                             dtype=bool, count=len(self.windows))
+        return np.where(banned[self.window], self.weight, np.float32(0))
+
+
+class ColumnBuilder:
+    """Interns users and windows and appends parts to typed arrays"""
+
+    def __init__(self):
+        self.user_ids = {}
+        self.window_ids = {}
+        self.user = array('i')
+        self.minute = array('q')
+        self.window = array('i')
+        self.weight = array('f')
+        self.events = 0
+
+    def intern(self, ids, name):
+        index = ids.get(name)
+        if index is None:
+            index = ids[name] = len(ids)
+        return index
+
+    def add(self, username, dt, window, windows=None):
+        """Add one minute event, `dt` as epoch ms, `windows` as the dwell
+        histogram ([{window, seconds}]) if the client sent one"""
+        user = self.intern(self.user_ids, username)
+        minute = int(dt) // 60000
+        total = sum(part['seconds'] for part in windows) if windows else 0
+        if not total:
+            windows = [{'window': window or '', 'seconds': 1}]
+            total = 1
+        for part in windows:
+            self.user.append(user)
+            self.minute.append(minute)
+            self.window.append(self.intern(self.window_ids, part['window']))
+            self.weight.append(part['seconds'] / total)
+        self.events += 1
+
+    def build(self):
+        return ActivityColumns(
+            list(self.user_ids), list(self.window_ids),
+            np.frombuffer(self.user, dtype=np.int32),
+            np.frombuffer(self.minute, dtype=np.int64),
+            np.frombuffer(self.window, dtype=np.int32),
+            np.frombuffer(self.weight, dtype=np.float32),
+        )
+
+
+def parse_time(value):
+    """Epoch ms from an ISO string (as exported) or a number"""
+    if isinstance(value, (int, float)) or str(value).isdigit():
+        return int(value)
+    stamp = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if stamp.tzinfo is None:
+        stamp = stamp.replace(tzinfo=timezone.utc)
+    return int(stamp.timestamp() * 1000)
+
+
+def read_events(stream, fmt):
+    """Event dicts from an export stream, `fmt` 'ndjson' or 'csv'"""
+    if fmt == 'csv':
+        rows = csv.DictReader(line for line in stream if not line.startswith('#'))
+        for row in rows:
+            row['windows'] = json.loads(row['windows']) if row.get('windows') else []
+            yield row
+        return
+    for line in stream:
+        if not line.strip():
+            continue
+        event = json.loads(line)
+        if 'error' in event:
+            print(f"Export stream ended with an error: {event['error']}")
+            continue
+        yield event
+
+
+def load_columns_from(stream, fmt, builder):
+    """Add the events of one export stream to `builder`"""
+    for event in read_events(stream, fmt):
+        builder.add(event['username'], parse_time(event['dt']),
+                    event.get('window'), event.get('windows'))
+    return builder
+
+
+def load_columns(paths):
+    """Read export files ('-' for stdin) into ActivityColumns"""
+    builder = ColumnBuilder()
+    for path in paths:
+        fmt = 'csv' if path.endswith('.csv') else 'ndjson'
+        if path == '-':
+            load_columns_from(sys.stdin, fmt, builder)
+            continue
+        with open(path, encoding='utf-8', newline='') as stream:
+            load_columns_from(stream, fmt, builder)
+    return builder.build()
+
+
+def utc_offsets(first_hour, last_hour, tz_name=None):
+    """UTC offset in minutes for every UTC hour in [first_hour, last_hour],
+    in `tz_name` or the local timezone"""
+    if tz_name and ZoneInfo is None:
+        raise ValueError("--tz needs Python 3.9+ (zoneinfo)")
+    tz = ZoneInfo(tz_name) if tz_name else None
+    offsets = np.empty(last_hour - first_hour + 1, dtype=np.int64)
+    for i, hour in enumerate(range(first_hour, last_hour + 1)):
+        stamp = datetime.fromtimestamp(hour * 3600, tz) if tz else \
+            datetime.fromtimestamp(hour * 3600).astimezone()
+        offsets[i] = stamp.utcoffset() // timedelta(minutes=1)
+    return offsets
+
+
+def local_minutes(columns, tz_name=None):
+    """Local epoch minute of every part"""
+    if not len(columns):
+        return columns.minute.copy()
+    hours = columns.minute // 60
+    first = int(hours.min())
+    offsets = utc_offsets(first, int(hours.max()), tz_name)
+    return columns.minute + offsets[hours - first]
+
+
+def bucket_of(local_minute, granularity):
+    """Bucket number of local epoch minutes; buckets start at local
+    hour/midnight/Sunday midnight"""
+    if granularity == 'week':
+        return (local_minute // 1440 + WEEK_SHIFT_DAYS) // 7
+    return local_minute // MINUTES[granularity]
+
+
+def bucket_label(bucket, granularity):
+    """Local start of a bucket as 'YYYY-MM-DD HH:MM'"""
+    if granularity == 'week':
+        minute = (int(bucket) * 7 - WEEK_SHIFT_DAYS) * 1440
+    else:
+        minute = int(bucket) * MINUTES[granularity]
+    return (EPOCH + timedelta(minutes=minute)).strftime('%Y-%m-%d %H:%M')
+
+
+def group_sums(keys, weights_list, size=None):
+    """(unique keys, [sum of each weights array per key]) for int64 keys
+    in [0, size)"""
+    if size is not None and size <= DENSE_KEYS:
+        counts = np.bincount(keys, minlength=size)
+        present = np.flatnonzero(counts)
+        return present, [np.bincount(keys, weights, size)[present] for weights in weights_list]
+    unique, inverse = np.unique(keys, return_inverse=True)
+    return unique, [np.bincount(inverse, weights, len(unique)) for weights in weights_list]
+
+
+def work_relax(columns, granularity, tz_name=None, local=None, relax=None):
+    """Per user and bucket: (user ids, bucket numbers, work, relax minutes),
+    ordered by user then bucket"""
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+    empty = np.empty(0)
+    if not len(columns):
+        return empty.astype(np.int32), empty.astype(np.int64), empty, empty
+    local = local_minutes(columns, tz_name) if local is None else local
+    relax = columns.relax_weight() if relax is None else relax
+
+    buckets = bucket_of(local, granularity)
+    first = int(buckets.min())
+    span = int(buckets.max()) - first + 1
+    keys = columns.user.astype(np.int64) * span + (buckets - first)
+    present, (total, relaxed) = group_sums(keys, [columns.weight, relax],
+                                           len(columns.users) * span)
+    return ((present // span).astype(np.int32), present % span + first,
+            total - relaxed, relaxed)
+
+
+def top_windows(columns, top=10):
+    """user id -> [(window, minutes)] of its `top` windows, most used first"""
+    n_windows = len(columns.windows)
+    if not n_windows:
+        return {}
+    keys = columns.user.astype(np.int64) * n_windows + columns.window
+    minutes = np.bincount(keys, columns.weight, len(columns.users) * n_windows)
+    minutes = minutes.reshape(len(columns.users), n_windows)
+    result = {}
+    for user in range(len(columns.users)):
+        row = minutes[user]
+        count = min(top, n_windows)
+        best = np.argpartition(-row, count - 1)[:count]
+        best = sorted(best, key=lambda window: -row[window])
+        result[user] = [(columns.windows[w], float(row[w])) for w in best if row[w] > 0]
+    return result
+
+
+def write_reports(columns, directory, tz_name=None, granularities=GRANULARITIES, top=10):
+    """Write <granularity>.csv work/relax reports and top_windows.csv;
+    returns their paths"""
+    os.makedirs(directory, exist_ok=True)
+    local = local_minutes(columns, tz_name)
+    relax = columns.relax_weight()
+    paths = []
+    for granularity in granularities:
+        users, buckets, work, relaxed = work_relax(columns, granularity, local=local, relax=relax)
+        path = os.path.join(directory, f"{granularity}.csv")
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['username', granularity, 'work', 'relax', 'total'])
+            labels = {}
+            for user, bucket, w, r in zip(users.tolist(), buckets.tolist(),
+                                          work.tolist(), relaxed.tolist()):
+                label = labels.get(bucket)
+                if label is None:
+                    label = labels[bucket] = bucket_label(bucket, granularity)
+                writer.writerow([columns.users[user], label,
+                                 round(w, 2), round(r, 2), round(w + r, 2)])
+        paths.append(path)
+
+    path = os.path.join(directory, 'top_windows.csv')
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['username', 'rank', 'window', 'minutes', 'relax'])
+        for user, windows in top_windows(columns, top).items():
+            for rank, (window, minutes) in enumerate(windows, 1):
+                writer.writerow([columns.users[user], rank, window, round(minutes, 2),
+                                 int(window in BANNED_APPS)])
+    paths.append(path)
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('inputs', nargs='+',
+                        help='files from /api/export/events (.ndjson or .csv), - for stdin')
+    parser.add_argument('--out', default='reports', help='directory for the report files')
+    parser.add_argument('--tz', help='IANA timezone of the buckets, default local time')
+    parser.add_argument('--granularity', action='append', choices=GRANULARITIES,
+                        help='reports to write, repeatable (default all)')
+    parser.add_argument('--top', type=int, default=10, help='top windows per user')
+    args = parser.parse_args(argv)
+
+    try:
+        columns = load_columns(args.inputs)
+        print(f"{len(columns)} window parts, {len(columns.users)} users, "
+              f"{len(columns.windows)} windows")
+        paths = write_reports(columns, args.out, args.tz,
+                              args.granularity or GRANULARITIES, args.top)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Error writing reports: {str(e)}")
+        return 1
+    for path in paths:
+        print(f"Wrote {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
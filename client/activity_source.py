@@ -0,0 +1,162 @@
+import sys
+import time
+import ctypes
+import random
+import threading
+
+
+class ActivitySource:
+    """Answers "was there user input since time T" without polling.
+
+    Times are `time.monotonic()` seconds. `rearm()` is called after every
+    sample so hook-based sources can disarm themselves between samples.
+    `wakeups` counts how often the source ran code on behalf of input.
+    """
+
+    name = "base"
+
+    def __init__(self):
+        self.wakeups = 0
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def has_input_since(self, since):
+        raise NotImplementedError
+
+    def rearm(self):
+        pass
+
+
+class LastInputActivitySource(ActivitySource):
+    """Queries GetLastInputInfo on demand, costing no wakeups between samples"""
+
+    name = "last_input"
+
+    def __init__(self):
+        super().__init__()
+        from ctypes import wintypes
+
+        class LASTINPUTINFO(ctypes.Structure):
+            _fields_ = [('cbSize', wintypes.UINT), ('dwTime', wintypes.DWORD)]
+
+        self.info = LASTINPUTINFO()
+        self.info.cbSize = ctypes.sizeof(LASTINPUTINFO)
+        self.user32 = ctypes.windll.user32
+        self.kernel32 = ctypes.windll.kernel32
+        self.kernel32.GetTickCount.restype = wintypes.DWORD
+
+    def last_input_time(self):
+        if not self.user32.GetLastInputInfo(ctypes.byref(self.info)):
+            return None
+        # Both tick counts are 32-bit milliseconds and wrap every 49.7 days
+        idle_ms = (self.kernel32.GetTickCount() - self.info.dwTime) & 0xFFFFFFFF
+        return time.monotonic() - idle_ms / 1000.0
+
+    def has_input_since(self, since):
+        self.wakeups += 1
+        last_input = self.last_input_time()
+        return last_input is not None and last_input >= since
+
+
+class HookActivitySource(ActivitySource):
+    """Keyboard and mouse hooks that disarm after the first hit.
+
+    At most one input callback runs per sample interval; the hooks are
+    reinstalled by `rearm()` once the sample has been taken.
+    """
+
+    name = "hook"
+
+    def __init__(self):
+        super().__init__()
+        self.lock = threading.Lock()
+        self.last_input = None
+        self.armed = False
+        self.listeners = []
+
+    def on_input(self, *args):
+        self.wakeups += 1
+        with self.lock:
+            self.last_input = time.monotonic()
+            self.armed = False
+        return False  # Returning False stops the pynput listener
+
+    def start(self):
+        from pynput import keyboard, mouse
+
+        with self.lock:
+            if self.armed:
+                return
+            self.armed = True
+            self.listeners = [
+                keyboard.Listener(on_press=self.on_input),
+                mouse.Listener(on_move=self.on_input, on_click=self.on_input,
+                               on_scroll=self.on_input),
+            ]
+        for listener in self.listeners:
+            listener.daemon = True
+            listener.start()
+
+    def stop(self):
+        with self.lock:
+            listeners, self.listeners = self.listeners, []
+            self.armed = False
+        for listener in listeners:
+            try:
+                listener.stop()
+            except Exception:
+                pass
+
+    def rearm(self):
+        with self.lock:
+            if self.armed:
+                return
+        # A hit stopped one listener; tear down the other as well and start
+        # a fresh pair for the next interval
+        self.stop()
+        self.start()
+
+    def has_input_since(self, since):
+        with self.lock:
+            return self.last_input is not None and self.last_input >= since
+
+
+class SyntheticActivitySource(ActivitySource):
+    """Deterministic stand-in input for running and benchmarking on any OS.
+
+    Each query reports input with probability `input_probability`, drawn
+    from a seeded generator so runs are reproducible.
+    """
+
+    name = "synthetic"
+
+    def __init__(self, input_probability=0.8, seed=None):
+        super().__init__()
+        self.input_probability = input_probability
+        self.random = random.Random(seed)
+
+    def has_input_since(self, since):
+        self.wakeups += 1
+        return self.random.random() < self.input_probability
+
+
+def create_activity_source(kind="auto"):
+    """Build the cheapest activity source available on this platform"""
+    if kind == "synthetic":
+        return SyntheticActivitySource()
+    if kind in ("auto", "last_input") and sys.platform == "win32":
+        try:
+            return LastInputActivitySource()
+        except Exception as e:
+            print(f"Last-input query unavailable: {str(e)}")
+    if kind in ("auto", "hook", "last_input"):
+        try:
+            import pynput  # noqa: F401
+            return HookActivitySource()
+        except Exception as e:
+            print(f"Input hooks unavailable: {str(e)}")
+    raise RuntimeError(f"No activity source available for '{kind}'")
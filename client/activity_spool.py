@@ -0,0 +1,275 @@
+import os
+import struct
+import threading
+
+SPOOL_MAGIC = b"TMSP"
+SPOOL_VERSION = 2
+
+# magic, version, record size, padding, head offset (first unsent record)
+HEADER = struct.Struct("<4sBB2xQ")
+# Number of (window id, seconds) dwell slots kept per minute
+RECORD_WINDOWS = 3
+# client-side epoch seconds, then the top windows by dwell time as
+# (window id into the window table, seconds) pairs; unused slots are zero
+RECORD = struct.Struct("<I" + "HB" * RECORD_WINDOWS)
+# Version 1 records: epoch seconds, window id
+RECORD_V1 = struct.Struct("<IH")
+
+HEAD_OFFSET_POS = 8
+MAX_WINDOW_ID = 0xFFFF
+
+
+class ActivitySpool:
+    """Append-only, crash-safe journal of sampled activity minutes.
+
+    Records are fixed-size (13 bytes) holding the minute's top windows by
+    dwell time, and reference window names through a small side table, so
+    a week of offline minutes costs ~130 KB of disk.
+    The read position is stored in the file header and the file is
+    compacted once the consumed prefix grows large or the backlog drains.
+    """
+
+    def __init__(self, directory, name="activity", max_records=60 * 24 * 31,
+                 compact_threshold=64 * 1024):
+        self.path = os.path.join(directory, f"{name}.spool")
+        self.windows_path = os.path.join(directory, f"{name}.spool.win")
+        self.max_records = max_records
+        self.compact_threshold = compact_threshold
+        self.lock = threading.Lock()
+
+        self.windows = []
+        self.window_ids = {}
+        self.file = None
+        self.head = HEADER.size
+        self.end = HEADER.size
+
+        self._open()
+
+    def _open(self):
+        """Open the journal, recovering from a torn tail or a bad header"""
+        if os.path.exists(self.path):
+            self.file = open(self.path, 'r+b')
+            header = self.file.read(HEADER.size)
+            try:
+                magic, version, record_size, head = HEADER.unpack(header)
+            except struct.error:
+                magic, version, record_size, head = None, None, None, 0
+            if (magic, version, record_size) == (SPOOL_MAGIC, 1, RECORD_V1.size):
+                self._load_windows()
+                self._upgrade_v1(head)
+                head = HEADER.size
+            elif (magic, version, record_size) != (SPOOL_MAGIC, SPOOL_VERSION, RECORD.size):
+                # Unknown or damaged journal, start over rather than misread it
+                self.file.close()
+                self.file = None
+
+        if self.file is None:
+            self.file = open(self.path, 'w+b')
+            self.file.write(HEADER.pack(SPOOL_MAGIC, SPOOL_VERSION, RECORD.size, HEADER.size))
+            self._sync()
+            self._reset_windows()
+            return
+
+        # Drop a partially written record left behind by a crash
+        size = os.fstat(self.file.fileno()).st_size
+        self.end = HEADER.size + (size - HEADER.size) // RECORD.size * RECORD.size
+        if self.end != size:
+            self.file.truncate(self.end)
+
+        # A head that is out of range or misaligned means the header write was
+        # interrupted; replay everything instead of losing minutes
+        if (head < HEADER.size or head > self.end
+                or (head - HEADER.size) % RECORD.size):
+            head = HEADER.size
+        self.head = head
+
+        self._load_windows()
+
+    def _upgrade_v1(self, head):
+        """Rewrite a version 1 journal's unsent records in the current layout"""
+        self.file.seek(0, os.SEEK_END)
+        size = self.file.tell()
+        head = max(HEADER.size, head)
+        count = max(0, size - head) // RECORD_V1.size
+        self.file.seek(head)
+        data = self.file.read(count * RECORD_V1.size)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(SPOOL_MAGIC, SPOOL_VERSION, RECORD.size, HEADER.size))
+            for timestamp, window_id in RECORD_V1.iter_unpack(data):
+                # A version 1 record stood for one whole minute in one window
+                f.write(self._pack(timestamp, [(window_id, 60)]))
+            f.flush()
+            os.fsync(f.fileno())
+        self.file.close()
+        os.replace(tmp_path, self.path)
+        self.file = open(self.path, 'r+b')
+        self.file.read(HEADER.size)
+
+    @staticmethod
+    def _pack(timestamp, slots):
+        values = [int(timestamp)]
+        for window_id, seconds in slots[:RECORD_WINDOWS]:
+            values += [window_id, max(1, min(255, int(seconds)))]
+        values += [0, 0] * (RECORD_WINDOWS - len(slots[:RECORD_WINDOWS]))
+        return RECORD.pack(*values)
+
+    def _sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def _load_windows(self):
+        self.windows = []
+        self.window_ids = {}
+        if not os.path.exists(self.windows_path):
+            return
+        with open(self.windows_path, 'rb') as f:
+            data = f.read()
+        # The last line is incomplete if we crashed while adding a name; no
+        # record can reference it because records are written after names
+        for line in data.split(b"\n")[:-1]:
+            name = line.decode('utf-8', errors='replace')
+            self.window_ids.setdefault(name, len(self.windows))
+            self.windows.append(name)
+
+    def _reset_windows(self):
+        self.windows = []
+        self.window_ids = {}
+        with open(self.windows_path, 'wb') as f:
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _window_id(self, window):
+        window = (window or "").replace("\n", " ")
+        window_id = self.window_ids.get(window)
+        if window_id is not None:
+            return window_id
+        if len(self.windows) >= MAX_WINDOW_ID:
+            # Table full: use "" if it has an id, else an id past the table,
+            # which peek() also reads back as ""
+            return self.window_ids.get("", MAX_WINDOW_ID)
+
+        with open(self.windows_path, 'ab') as f:
+            f.write(window.encode('utf-8') + b"\n")
+            f.flush()
+            os.fsync(f.fileno())
+        window_id = len(self.windows)
+        self.windows.append(window)
+        self.window_ids[window] = window_id
+        return window_id
+
+    def _write_head(self):
+        self.file.seek(HEAD_OFFSET_POS)
+        self.file.write(struct.pack("<Q", self.head))
+        self._sync()
+
+    def __len__(self):
+        with self.lock:
+            return (self.end - self.head) // RECORD.size
+
+    def append(self, timestamp, windows):
+        """Journal one sampled minute with its (window, seconds) dwell pairs,
+        longest first; only the top RECORD_WINDOWS are kept"""
+        with self.lock:
+            slots = [(self._window_id(window), seconds)
+                     for window, seconds in windows[:RECORD_WINDOWS]]
+            record = self._pack(timestamp, slots)
+            self.file.seek(self.end)
+            self.file.write(record)
+            self._sync()
+            self.end += RECORD.size
+
+            # Bound disk usage by discarding the oldest minutes
+            overflow = (self.end - self.head) // RECORD.size - self.max_records
+            if overflow > 0:
+                self.head += overflow * RECORD.size
+                self._write_head()
+                self._maybe_compact()
+
+    def peek(self, limit):
+        """Return up to `limit` of the oldest unsent (timestamp, windows) pairs"""
+        with self.lock:
+            count = min(limit, (self.end - self.head) // RECORD.size)
+            if count <= 0:
+                return []
+            self.file.seek(self.head)
+            data = self.file.read(count * RECORD.size)
+            samples = []
+            for values in RECORD.iter_unpack(data):
+                windows = []
+                for i in range(1, len(values), 2):
+                    window_id, seconds = values[i], values[i + 1]
+                    if seconds:
+                        window = self.windows[window_id] if window_id < len(self.windows) else ""
+                        windows.append((window, seconds))
+                samples.append((values[0], windows))
+            return samples
+
+    def ack(self, count):
+        """Mark the oldest `count` records as delivered"""
+        with self.lock:
+            self.head = min(self.end, self.head + count * RECORD.size)
+            self._write_head()
+            self._maybe_compact()
+
+    def _maybe_compact(self):
+        if self.head == self.end:
+            # Fully drained: shrink to the bare header and forget old names
+            self.file.truncate(HEADER.size)
+            self.head = self.end = HEADER.size
+            self._write_head()
+            self._reset_windows()
+        elif self.head - HEADER.size >= self.compact_threshold:
+            self._compact()
+
+    def _compact(self):
+        """Rewrite the journal without its consumed prefix"""
+        self.file.seek(self.head)
+        remaining = self.file.read(self.end - self.head)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(SPOOL_MAGIC, SPOOL_VERSION, RECORD.size, HEADER.size))
+            f.write(remaining)
+            f.flush()
+            os.fsync(f.fileno())
+        self.file.close()
+        os.replace(tmp_path, self.path)
+        self.file = open(self.path, 'r+b')
+        self.head = HEADER.size
+        self.end = HEADER.size + len(remaining)
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+class MemorySpool:
+    """In-memory stand-in with the ActivitySpool interface, for tools that
+    simulate many clients and must not keep a file open per client"""
+
+    def __init__(self, max_records=60 * 24 * 31):
+        self.max_records = max_records
+        self.records = []
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        with self.lock:
+            return len(self.records)
+
+    def append(self, timestamp, windows):
+        with self.lock:
+            self.records.append((int(timestamp), list(windows[:RECORD_WINDOWS])))
+            del self.records[:-self.max_records]
+
+    def peek(self, limit):
+        with self.lock:
+            return self.records[:limit]
+
+    def ack(self, count):
+        with self.lock:
+            del self.records[:count]
+
+    def close(self):
+        pass
@@ -0,0 +1,134 @@
+"""Summarize files written by profiler.py.
+
+Reports the hottest functions across all profile files: self samples,
+where the function was the innermost frame, and total samples, where it
+was anywhere on the stack. It also reports samples per thread and the
+sampler's own overhead. From the heap-diff files it reports the
+allocation sites that grew most, and in how many snapshots they grew.
+`--folded` also writes the merged stacks in the folded format that
+flame graph tools read.
+
+    python analyze_profile.py %LOCALAPPDATA%\\TeamMonitor\\profiles --top 20
+"""
+import os
+import sys
+import json
+import argparse
+from collections import Counter, defaultdict
+
+from profiler import PROFILE_PREFIX, HEAP_PREFIX
+
+
+def load_files(directory, prefix):
+    """Parsed JSON files with `prefix`, oldest first"""
+    names = sorted(name for name in os.listdir(directory)
+                   if name.startswith(prefix) and name.endswith('.json'))
+    files = []
+    for name in names:
+        try:
+            with open(os.path.join(directory, name)) as f:
+                files.append(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"Skipping {name}: {str(e)}")
+    return files
+
+
+def summarize_profiles(profiles):
+    stacks = Counter()
+    for profile in profiles:
+        stacks.update(profile.get('stacks', {}))
+
+    own = Counter()
+    total = Counter()
+    threads = Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(';')
+        threads[frames[0]] += count
+        functions = frames[1:]
+        if functions:
+            own[functions[-1]] += count
+        for function in set(functions):
+            total[function] += count
+
+    return {
+        'files': len(profiles),
+        'samples': sum(profile.get('samples', 0) for profile in profiles),
+        'seconds': round(sum(profile.get('duration', 0) for profile in profiles), 1),
+        'profiler_cpu': round(sum(profile.get('profiler_cpu', 0) for profile in profiles), 3),
+        'stacks': stacks,
+        'own': own,
+        'total': total,
+        'threads': threads,
+    }
+
+
+def summarize_heap(diffs):
+    """Per allocation site (innermost frame): summed growth and the number
+    of snapshots in which it grew"""
+    sites = defaultdict(lambda: {'size_diff': 0, 'count_diff': 0, 'grew': 0, 'size': 0})
+    for diff in diffs:
+        changes = defaultdict(lambda: [0, 0, 0])
+        for stat in diff.get('top', []):
+            site = stat['traceback'][0] if stat.get('traceback') else '<unknown>'
+            change = changes[site]
+            change[0] += stat['size_diff']
+            change[1] += stat['count_diff']
+            change[2] += stat['size']
+        for site, (size_diff, count_diff, size) in changes.items():
+            entry = sites[site]
+            entry['size_diff'] += size_diff
+            entry['count_diff'] += count_diff
+            entry['size'] = size
+            if size_diff > 0:
+                entry['grew'] += 1
+    return sites
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('directory', help='profiles directory in the app data dir')
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--folded', help='write merged stacks in folded format to this file')
+    args = parser.parse_args(argv)
+
+    profiles = load_files(args.directory, PROFILE_PREFIX)
+    diffs = load_files(args.directory, HEAP_PREFIX)
+    if not profiles and not diffs:
+        print(f"No profile or heap files in {args.directory}")
+        return 1
+
+    if profiles:
+        summary = summarize_profiles(profiles)
+        # One sample is taken per thread per tick
+        thread_samples = sum(summary['threads'].values()) or 1
+        print(f"{summary['files']} profile files, {summary['samples']} ticks over "
+              f"{summary['seconds']}s, sampler CPU {summary['profiler_cpu']}s")
+        print("\nSamples per thread:")
+        for thread, count in summary['threads'].most_common():
+            print(f"  {count:8d}  {100.0 * count / thread_samples:5.1f}%  {thread}")
+        print("\nHot functions (self):")
+        for function, count in summary['own'].most_common(args.top):
+            print(f"  {count:8d}  {100.0 * count / thread_samples:5.1f}%  {function}")
+        print("\nHot functions (total):")
+        for function, count in summary['total'].most_common(args.top):
+            print(f"  {count:8d}  {100.0 * count / thread_samples:5.1f}%  {function}")
+        if args.folded:
+            with open(args.folded, 'w') as f:
+                for stack, count in summary['stacks'].most_common():
+                    f.write(f"{stack} {count}\n")
+            print(f"\nFolded stacks written to {args.folded}")
+
+    if diffs:
+        sites = summarize_heap(diffs)
+        growing = sorted(((site, entry) for site, entry in sites.items() if entry['size_diff'] > 0),
+                         key=lambda item: -item[1]['size_diff'])
+        print(f"\nGrowing allocation sites ({len(diffs)} heap diffs, "
+              f"traced now {diffs[-1].get('traced_current', 0) / 1024:.0f} KiB):")
+        for site, entry in growing[:args.top]:
+            print(f"  {entry['size_diff'] / 1024:+10.1f} KiB  {entry['count_diff']:+8d} blocks  "
+                  f"grew in {entry['grew']}/{len(diffs)}  {site}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
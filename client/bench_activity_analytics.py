@@ -0,0 +1,132 @@
+"""Speed of activity_analytics.py on a synthetic team-year.
+
+Builds the columns for --users seats over --days days directly with
+NumPy (weekday working hours, some idle minutes, a share of minutes
+split between two windows, a few relax apps). Then it times the local
+time conversion, the hour/day/week work/relax grouping and the top
+windows. It also times export parsing (ColumnBuilder) on --parse-events
+NDJSON lines and extrapolates that to the whole data set.
+
+    python bench_activity_analytics.py --users 300 --days 365
+"""
+import io
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+import activity_analytics as analytics
+
+WINDOWS = [
+    'chrome.exe', 'msedge.exe', 'Code.exe', 'devenv.exe', 'OUTLOOK.EXE', 'Teams.exe',
+    'slack.exe', 'EXCEL.EXE', 'WINWORD.EXE', 'explorer.exe', 'idea64.exe', 'Postman.exe',
+    'dota2.exe', 'hl.exe', 'fifa.exe',
+]
+# 2024-01-01 00:00 UTC in epoch minutes
+START_MINUTE = 28401120
+
+
+def synthetic_columns(users, days, hours, seed=1):
+    """(ActivityColumns, number of minutes) of `users` seats working
+    `hours` a weekday"""
+    rng = np.random.default_rng(seed)
+    day_minutes = np.arange(int(hours * 60))
+    weekdays = [d for d in range(days) if d % 7 < 5]  # 2024-01-01 was a Monday
+    user_parts = []
+    events = 0
+    for user in range(users):
+        minute = (START_MINUTE + 60 + np.asarray(weekdays)[:, None] * 1440
+                  + day_minutes[None, :]).ravel()
+        minute = minute[rng.random(len(minute)) >= 0.15]  # idle minutes
+        events += len(minute)
+        # Mostly work apps, a relax app now and then
+        weights = np.where(np.arange(len(WINDOWS)) >= 12, 0.02, 1.0)
+        window = rng.choice(len(WINDOWS), len(minute), p=weights / weights.sum())
+        split = rng.random(len(minute)) < 0.3
+        share = rng.integers(5, 40, len(minute)) / 60
+        first_weight = np.where(split, 1 - share, 1.0)
+        user_parts.append((
+            np.concatenate([minute, minute[split]]),
+            np.concatenate([window, rng.choice(len(WINDOWS), int(split.sum()))]),
+            np.concatenate([first_weight, share[split]]),
+        ))
+    columns = analytics.ActivityColumns(
+        [f"user{user:03d}" for user in range(users)], list(WINDOWS),
+        np.concatenate([np.full(len(parts[0]), user, dtype=np.int32)
+                        for user, parts in enumerate(user_parts)]),
+        np.concatenate([parts[0] for parts in user_parts]).astype(np.int64),
+        np.concatenate([parts[1] for parts in user_parts]).astype(np.int32),
+        np.concatenate([parts[2] for parts in user_parts]).astype(np.float32),
+    )
+    return columns, events
+
+
+def timed(label, function, results):
+    started = time.perf_counter()
+    value = function()
+    results.append((label, time.perf_counter() - started))
+    return value
+
+
+def export_lines(columns, count):
+    """The first `count` parts as exported NDJSON events"""
+    lines = []
+    for i in range(min(count, len(columns))):
+        dt = time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime(int(columns.minute[i]) * 60))
+        window = columns.windows[int(columns.window[i])]
+        lines.append(json.dumps({
+            'cursor': 'x', 'username': columns.users[int(columns.user[i])], 'dt': dt,
+            'window': window, 'windows': [{'window': window, 'seconds': 60}],
+        }))
+    return '\n'.join(lines) + '\n'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=300)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--hours', type=float, default=8, help='working hours per weekday')
+    parser.add_argument('--tz', default='Asia/Taipei')
+    parser.add_argument('--parse-events', type=int, default=200000)
+    args = parser.parse_args(argv)
+
+    results = []
+    columns, events = timed(
+        'generate', lambda: synthetic_columns(args.users, args.days, args.hours), results)
+    size = sum(a.nbytes for a in (columns.user, columns.minute, columns.window, columns.weight))
+    print(f"{args.users} users x {args.days} days: {events} minutes, "
+          f"{len(columns)} window parts, {size / 2**20:.0f} MiB")
+
+    local = timed('local time', lambda: analytics.local_minutes(columns, args.tz), results)
+    relax = timed('relax weights', columns.relax_weight, results)
+    for granularity in analytics.GRANULARITIES:
+        _, _, work, relaxed = timed(
+            granularity,
+            lambda: analytics.work_relax(columns, granularity, local=local, relax=relax),
+            results)
+    timed('top windows', lambda: analytics.top_windows(columns), results)
+
+    # Sanity check: every part is counted once in each grouping
+    assert abs((work.sum() + relaxed.sum()) - columns.weight.sum(dtype=np.float64)) < 1
+
+    text = export_lines(columns, args.parse_events)
+    builder = analytics.ColumnBuilder()
+    timed('parse export',
+          lambda: analytics.load_columns_from(io.StringIO(text), 'ndjson', builder), results)
+
+    analysis = sum(seconds for label, seconds in results
+                   if label not in ('generate', 'parse export'))
+    for label, seconds in results:
+        print(f"  {label:14s} {seconds:8.3f}s")
+    print(f"Analysis total {analysis:.2f}s, "
+          f"{len(columns) / max(analysis, 1e-9) / 1e6:.1f}M parts/s")
+    parse_seconds = results[-1][1]
+    print(f"Export parsing {builder.events / parse_seconds:,.0f} events/s, "
+          f"about {events / (builder.events / parse_seconds):.0f}s for this data set")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
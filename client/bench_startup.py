@@ -0,0 +1,114 @@
+"""Startup cost of the client: import time and resident memory.
+
+Each case runs in a fresh interpreter, which imports a set of modules
+and reports how long that took and its peak RSS. "eager-gui" is what
+team_monitor.py used to load at startup: the engine plus the GUI
+toolkits. "engine" and "tray-app" are the current monitor_core.py and
+team_monitor.py, whose GUI toolkits load on first use.
+
+Modules that are not installed are skipped, both the listed ones and
+any the client tries to import on its own, and every case lists them.
+Where eager-gui skips GUI modules (PIL, pystray, pynput, win32 off
+Windows), its numbers and the savings shown are lower bounds.
+
+    python bench_startup.py --runs 5
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+CLIENT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+CASES = {
+    'baseline': [],
+    'eager-gui': ['tkinter', 'tkinter.messagebox', 'PIL.Image', 'pystray',
+                  'pynput', 'win32api', 'win32gui', 'win32process', 'winreg',
+                  'psutil', 'requests', 'monitor_core'],
+    'engine': ['monitor_core'],
+    'tray-app': ['team_monitor'],
+}
+
+PROBE = r'''
+import sys, json, time, importlib
+sys.path.insert(0, sys.argv[1])
+
+class Skipped:
+    """Last meta path finder: records imports no other finder could resolve
+    when they come from a client module (optional extras of libraries
+    such as requests are left out)"""
+    names = []
+
+    @classmethod
+    def find_spec(cls, name, path=None, target=None):
+        frame = sys._getframe(1)
+        while frame is not None and frame.f_code.co_filename.startswith("<frozen"):
+            frame = frame.f_back
+        if frame is not None and frame.f_code.co_filename.startswith(sys.argv[1]):
+            cls.names.append(name)
+        return None
+
+sys.meta_path.append(Skipped)
+started = time.perf_counter()
+for name in sys.argv[2:]:
+    try:
+        importlib.import_module(name)
+    except Exception:
+        Skipped.names.append(name)
+missing = sorted(set(Skipped.names))
+elapsed = time.perf_counter() - started
+try:
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss = rss if sys.platform == "darwin" else rss * 1024
+except ImportError:
+    import psutil
+    rss = psutil.Process().memory_info().peak_wset
+print(json.dumps({"seconds": elapsed, "rss": rss, "missing": missing,
+                  "modules": len(sys.modules)}))
+'''
+
+
+def run_case(modules):
+    output = subprocess.check_output(
+        [sys.executable, '-c', PROBE, CLIENT_DIR] + modules)
+    return json.loads(output)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args(argv)
+
+    report = {}
+    for name, modules in CASES.items():
+        results = [run_case(modules) for _ in range(args.runs)]
+        report[name] = {
+            'import_ms': round(statistics.median(r['seconds'] for r in results) * 1000, 1),
+            'peak_rss_mb': round(statistics.median(r['rss'] for r in results) / (1024 * 1024), 1),
+            'modules_loaded': results[0]['modules'],
+            'missing': results[0]['missing'],
+        }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for name, row in report.items():
+            missing = f"  (skipped: {', '.join(row['missing'])})" if row['missing'] else ""
+            print(f"{name:>10}: {row['import_ms']:8.1f} ms  {row['peak_rss_mb']:6.1f} MB  "
+                  f"{row['modules_loaded']:5d} modules{missing}")
+        eager, engine = report['eager-gui'], report['engine']
+        print(f"engine saves {eager['import_ms'] - engine['import_ms']:.1f} ms, "
+              f"{eager['peak_rss_mb'] - engine['peak_rss_mb']:.1f} MB and "
+              f"{eager['modules_loaded'] - engine['modules_loaded']} modules over eager-gui")
+        gui_skipped = sorted(set(eager['missing']) - set(engine['missing']))
+        if gui_skipped:
+            print(f"eager-gui skipped {', '.join(gui_skipped)}; "
+                  "on Windows the savings are larger")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
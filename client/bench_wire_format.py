@@ -0,0 +1,129 @@
+"""Upload payload size per seat-day for each wire format.
+
+Simulates one working day of journaled minutes (a few windows per minute
+drawn from a per-seat pool, with dwell histograms like window_dwell.py
+produces) and encodes it the way Uploader sends it: one query-string GET
+per minute, plain JSON batches and compact gzip batches
+(wire_format.py). Only request bodies / query strings are counted,
+headers are the same for every format.
+
+    python bench_wire_format.py --seats 50 --hours 8 --batch-size 10
+"""
+import sys
+import json
+import random
+import argparse
+import statistics
+from urllib.parse import urlencode
+
+import wire_format
+
+WINDOW_POOL = [
+    'chrome.exe', 'msedge.exe', 'firefox.exe', 'Code.exe', 'devenv.exe',
+    'OUTLOOK.EXE', 'Teams.exe', 'slack.exe', 'EXCEL.EXE', 'WINWORD.EXE',
+    'explorer.exe', 'WindowsTerminal.exe', 'idea64.exe', 'Postman.exe',
+    'Spotify.exe', 'Discord.exe', 'zoom.exe', 'notepad++.exe',
+]
+
+
+def seat_day(rng, hours, start=1700000000.0):
+    """Journaled (timestamp, [(window, seconds), ...]) minutes of one seat"""
+    apps = rng.sample(WINDOW_POOL, 8)
+    samples = []
+    current = apps[0]
+    for minute in range(int(hours * 60)):
+        if rng.random() < 0.15:
+            continue  # Idle minute, nothing journaled
+        if rng.random() < 0.3:
+            current = rng.choice(apps)
+        windows = {current: 60}
+        if rng.random() < 0.4:
+            other = rng.choice(apps)
+            seconds = rng.randint(5, 40)
+            windows[current] -= seconds
+            windows[other] = windows.get(other, 0) + seconds
+        samples.append((start + minute * 60, sorted(
+            windows.items(), key=lambda item: -item[1])))
+    return samples
+
+
+def dwell_payload(windows):
+    return [{"window": window, "seconds": seconds} for window, seconds in windows]
+
+
+def get_bytes(username, samples):
+    return sum(len(urlencode({
+        "username": username,
+        "window": windows[0][0] if windows else "",
+        "windows": json.dumps(dwell_payload(windows)),
+        "dt": int(timestamp * 1000),
+    })) for timestamp, windows in samples)
+
+
+def json_bytes(username, batch):
+    # requests encodes json= with the default separators
+    return len(json.dumps({
+        "username": username,
+        "samples": [
+            {
+                "dt": int(timestamp * 1000),
+                "window": windows[0][0] if windows else "",
+                "windows": dwell_payload(windows)
+            }
+            for timestamp, windows in batch
+        ]
+    }).encode())
+
+
+def compact_bytes(username, batch):
+    return len(wire_format.encode_request(username, batch)[0])
+
+
+def batches(samples, size):
+    return [samples[i:i + size] for i in range(0, len(samples), size)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seats', type=int, default=50)
+    parser.add_argument('--hours', type=float, default=8, help='working hours per seat-day')
+    parser.add_argument('--batch-size', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    sizes = {'get': [], 'json': [], 'compact': []}
+    requests = {'get': [], 'json': [], 'compact': []}
+    for seat in range(args.seats):
+        username = f"seat{seat:04d}.user"
+        samples = seat_day(rng, args.hours)
+        day_batches = batches(samples, args.batch_size)
+        sizes['get'].append(get_bytes(username, samples))
+        sizes['json'].append(sum(json_bytes(username, b) for b in day_batches))
+        sizes['compact'].append(sum(compact_bytes(username, b) for b in day_batches))
+        requests['get'].append(len(samples))
+        requests['json'].append(len(day_batches))
+        requests['compact'].append(len(day_batches))
+
+    baseline = statistics.mean(sizes['json'])
+    report = {
+        name: {
+            'bytes_per_seat_day': round(statistics.mean(values)),
+            'requests_per_seat_day': round(statistics.mean(requests[name])),
+            'vs_json': round(statistics.mean(values) / baseline, 3),
+        }
+        for name, values in sizes.items()
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for name, row in report.items():
+            print(f"{name:>8}: {row['bytes_per_seat_day']:8d} B/seat-day  "
+                  f"{row['requests_per_seat_day']:4d} requests  "
+                  f"{row['vs_json']:6.3f}x json")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,6 +6,12 @@ from cx_Freeze import setup, Executable
 # Get the absolute path to the icon file
 icon_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'icon.ico')
 
+# `python build.py build --engine` freezes only the headless engine
+# (monitor_core.py), without the GUI toolkits, into build/engine
+engine_only = "--engine" in sys.argv
+if engine_only:
+    sys.argv.remove("--engine")
+
 # Dependencies are automatically detected, but it might need fine tuning.
 build_exe_options = {
     "packages": [
@@ -28,6 +34,34 @@ if sys.platform == "win32":
 # Get the directory of the script
 script_dir = os.path.dirname(os.path.abspath(__file__))
 
+engine_build_exe_options = {
+    "packages": [
+        "os", "sys", "json", "requests", "threading", "idna",
+        "win32gui", "win32process", "psutil"
+    ],
+    # Keep the GUI toolkits (and what they drag in) out of the engine build
+    "excludes": ["tkinter", "PIL", "pystray", "pynput", "unittest", "pydoc"],
+    "build_exe": os.path.join("build", "engine"),
+    "include_msvcr": True
+}
+
+if engine_only:
+    setup(
+        name="Team Activity Monitor Engine",
+        version="1.0",
+        description="Team Activity Monitor headless engine",
+        options={"build_exe": engine_build_exe_options},
+        executables=[
+            Executable(
+                os.path.join(script_dir, "monitor_core.py"),
+                base=None,
+                target_name="TeamActivityMonitorEngine.exe",
+                icon=icon_path
+            )
+        ]
+    )
+    sys.exit(0)
+
 setup(
     name="Team Activity Monitor",
     version="1.0",
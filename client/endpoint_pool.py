@@ -0,0 +1,275 @@
+"""Several server endpoints behind one transport, with health-based failover.
+
+EndpointPool wraps a Transport and is used in its place. Callers keep
+building URLs from the primary endpoint, and each request is rewritten to
+the endpoint that is currently healthiest. For every endpoint the pool
+keeps an EWMA of latency and error rate. An endpoint that keeps failing
+is marked down and probed in the background with GET /test-connection,
+and once a probe succeeds it becomes eligible again. Endpoints are
+preferred in the configured order while their latency is comparable, so
+traffic moves back to the primary once it has recovered.
+
+Only idempotent requests are resent after a read timeout or a 504, as the
+server may still have processed them. Requests that record activity (POST,
+and the write paths such as GET /events) fail over only when nothing reached
+a server (connection refused or connect timeout) or on 502/503; anything
+else is left to the uploader's backoff so minutes are not counted twice.
+"""
+import time
+import threading
+
+import requests
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+# Statuses after which an idempotent request is retried on the next endpoint
+FAILOVER_STATUSES = (502, 503, 504)
+# Statuses after which any request is retried; the server did not process it
+UNPROCESSED_STATUSES = (502, 503)
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+# GET /events records a minute (see uploader.send_event)
+WRITE_PATHS = ('/events',)
+
+
+def never_sent(error):
+    """Whether a request failed before any of it reached a server"""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    if not isinstance(error, requests.ConnectionError):
+        return False
+    reason = error.args[0] if error.args else None
+    if isinstance(reason, MaxRetryError):
+        reason = reason.reason
+    return isinstance(reason, NewConnectionError)
+
+
+def parse_urls(value):
+    """Endpoint list from a URL, a comma/whitespace separated string or a list"""
+    if isinstance(value, str):
+        value = value.replace(',', ' ').split()
+    urls = []
+    for url in value or []:
+        url = url.strip().rstrip('/')
+        if url and url not in urls:
+            urls.append(url)
+    return urls
+
+
+class Endpoint:
+    def __init__(self, url):
+        self.url = url
+        self.latency = None  # EWMA of request latency, seconds
+        self.error_rate = 0.0  # EWMA of failures, 0..1
+        self.consecutive_failures = 0
+        self.healthy = True
+        self.next_probe_at = 0
+        self.probe_failures = 0
+        self.requests = 0
+        self.errors = 0
+
+    def score(self, error_weight):
+        """Expected cost of a request, lower is better"""
+        return (self.latency or 0.0) * (1 + error_weight * self.error_rate)
+
+    def stats(self):
+        return {
+            'healthy': self.healthy,
+            'latency_ms': round(self.latency * 1000, 1) if self.latency is not None else None,
+            'error_rate': round(self.error_rate, 3),
+            'requests': self.requests,
+            'errors': self.errors,
+        }
+
+
+class EndpointPool:
+    """Transport that routes each request to the healthiest endpoint"""
+
+    def __init__(self, transport, urls=(), alpha=0.2, error_weight=4,
+                 max_error_rate=0.5, fail_after=3, latency_slack=0.5,
+                 latency_floor=0.05, probe_path='/test-connection', probe_interval=15,
+                 probe_cap=300, write_paths=WRITE_PATHS, clock=time.monotonic):
+        self.transport = transport
+        self.alpha = alpha  # Weight of the newest sample in the EWMAs
+        self.error_weight = error_weight
+        self.max_error_rate = max_error_rate
+        self.fail_after = fail_after  # Consecutive failures that mark an endpoint down
+        # Earlier endpoints win while within this factor (plus floor) of the best
+        self.latency_slack = latency_slack
+        self.latency_floor = latency_floor
+        self.probe_path = probe_path
+        self.probe_interval = probe_interval
+        self.probe_cap = probe_cap
+        self.write_paths = write_paths
+        self.clock = clock
+
+        self.lock = threading.Lock()
+        self.endpoints = []
+        self.failovers = 0
+        self.stop_event = threading.Event()
+        self.probe_thread = None
+        self.set_urls(urls)
+
+    def set_urls(self, urls):
+        """Replace the endpoint list, keeping stats of endpoints that stay"""
+        urls = parse_urls(urls)
+        with self.lock:
+            known = {endpoint.url: endpoint for endpoint in self.endpoints}
+            self.endpoints = [known.get(url) or Endpoint(url) for url in urls]
+
+    @property
+    def primary(self):
+        """Base URL callers build request URLs from"""
+        with self.lock:
+            return self.endpoints[0].url if self.endpoints else ''
+
+    def ranked(self):
+        """Endpoints to try, best first; down endpoints only as a last resort"""
+        with self.lock:
+            healthy = [e for e in self.endpoints if e.healthy]
+            down = sorted((e for e in self.endpoints if not e.healthy),
+                          key=lambda e: e.next_probe_at)
+            if not healthy:
+                return down
+            best = min(e.score(self.error_weight) for e in healthy)
+            limit = best * (1 + self.latency_slack) + self.latency_floor
+            preferred = [e for e in healthy if e.score(self.error_weight) <= limit]
+            rest = sorted((e for e in healthy if e not in preferred),
+                          key=lambda e: e.score(self.error_weight))
+            return preferred + rest + down
+
+    def current(self):
+        ranked = self.ranked()
+        return ranked[0].url if ranked else None
+
+    def split(self, url):
+        """(endpoint, path) for a URL under one of the endpoints"""
+        with self.lock:
+            for endpoint in self.endpoints:
+                if url == endpoint.url or url.startswith(endpoint.url + '/'):
+                    return endpoint, url[len(endpoint.url):]
+        return None, url
+
+    def record(self, endpoint, latency, ok):
+        with self.lock:
+            endpoint.requests += 1
+            if endpoint.latency is None:
+                endpoint.latency = latency
+            else:
+                endpoint.latency += self.alpha * (latency - endpoint.latency)
+            endpoint.error_rate += self.alpha * ((0.0 if ok else 1.0) - endpoint.error_rate)
+            if ok:
+                endpoint.consecutive_failures = 0
+                # Tried as a last resort and answered
+                endpoint.healthy = True
+                return
+            endpoint.errors += 1
+            endpoint.consecutive_failures += 1
+            if endpoint.healthy and (endpoint.consecutive_failures >= self.fail_after
+                                     or endpoint.error_rate > self.max_error_rate):
+                endpoint.healthy = False
+                endpoint.probe_failures = 0
+                endpoint.next_probe_at = self.clock() + self.probe_interval
+                print(f"Endpoint {endpoint.url} marked down")
+
+    def idempotent(self, method, path):
+        """Whether the request may be sent again after a server got it"""
+        return (method.upper() in IDEMPOTENT_METHODS
+                and path.split('?')[0] not in self.write_paths)
+
+    def request(self, method, url, **kwargs):
+        endpoint, path = self.split(url)
+        if endpoint is None:
+            return self.transport.request(method, url, **kwargs)
+
+        idempotent = self.idempotent(method, path)
+        failover_statuses = FAILOVER_STATUSES if idempotent else UNPROCESSED_STATUSES
+        candidates = self.ranked()
+        last_error = None
+        for attempt, endpoint in enumerate(candidates):
+            if attempt:
+                with self.lock:
+                    self.failovers += 1
+            started = self.clock()
+            try:
+                response = self.transport.request(method, endpoint.url + path, **kwargs)
+            except requests.RequestException as e:
+                self.record(endpoint, self.clock() - started, False)
+                if not (idempotent or never_sent(e)):
+                    raise
+                last_error = e
+                continue
+            failed = response.status_code in FAILOVER_STATUSES
+            self.record(endpoint, self.clock() - started, not failed)
+            if (response.status_code not in failover_statuses
+                    or attempt == len(candidates) - 1):
+                return response
+        raise last_error
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def probe(self, endpoint):
+        """Check a down endpoint, marking it healthy again if it answers"""
+        started = self.clock()
+        try:
+            response = self.transport.request('GET', endpoint.url + self.probe_path)
+            ok = response.status_code == 200
+        except requests.RequestException:
+            ok = False
+        latency = self.clock() - started
+        with self.lock:
+            if ok:
+                endpoint.healthy = True
+                endpoint.consecutive_failures = 0
+                endpoint.error_rate = self.max_error_rate / 2
+                endpoint.latency = latency
+                print(f"Endpoint {endpoint.url} is back")
+            else:
+                endpoint.probe_failures += 1
+                delay = min(self.probe_cap, self.probe_interval * (2 ** endpoint.probe_failures))
+                endpoint.next_probe_at = self.clock() + delay
+        return ok
+
+    def probe_due(self):
+        """Probe every down endpoint whose next probe time has come"""
+        now = self.clock()
+        with self.lock:
+            due = [e for e in self.endpoints if not e.healthy and e.next_probe_at <= now]
+        for endpoint in due:
+            self.probe(endpoint)
+        return len(due)
+
+    def start(self):
+        """Probe down endpoints from a background thread"""
+        if self.probe_thread is not None:
+            return self
+        self.stop_event.clear()
+        self.probe_thread = threading.Thread(target=self.run_probes, name='endpoint-probe')
+        self.probe_thread.daemon = True
+        self.probe_thread.start()
+        return self
+
+    def run_probes(self):
+        # Poll often enough to honour probe_interval, probes themselves are
+        # bounded by the transport's timeouts
+        while not self.stop_event.wait(min(5, self.probe_interval)):
+            try:
+                self.probe_due()
+            except Exception as e:
+                print(f"Error probing endpoints: {str(e)}")
+
+    def stats(self):
+        with self.lock:
+            return {
+                'failovers': self.failovers,
+                'endpoints': {e.url: e.stats() for e in self.endpoints},
+            }
+
+    def close(self):
+        self.stop_event.set()
+        if self.probe_thread is not None:
+            self.probe_thread.join(5)
+            self.probe_thread = None
+        self.transport.close()
@@ -0,0 +1,25 @@
+"""Heartbeat lines the monitor prints for supervisor.py.
+
+Kept free of other imports so the headless engine can send heartbeats
+without loading the supervisor (argparse, subprocess, ...).
+"""
+import json
+
+HEARTBEAT_PREFIX = "HEARTBEAT "
+HEARTBEAT_ENV = "TEAMMONITOR_HEARTBEAT"
+
+
+def format_heartbeat(status=None):
+    """Heartbeat line for the child to print (and flush) on stdout"""
+    return HEARTBEAT_PREFIX + json.dumps(status or {}, separators=(',', ':'))
+
+
+def parse_heartbeat(line):
+    """Status dict of a heartbeat line, or None for ordinary output"""
+    if not line.startswith(HEARTBEAT_PREFIX):
+        return None
+    try:
+        status = json.loads(line[len(HEARTBEAT_PREFIX):])
+    except ValueError:
+        status = {}
+    return status if isinstance(status, dict) else {}
@@ -4,9 +4,10 @@ import win32event
 import servicemanager
 import socket
 import sys
-import os
 import subprocess
 
+from supervisor import Supervisor, engine_command
+
 class TeamMonitorService(win32serviceutil.ServiceFramework):
     _svc_name_ = "TeamMonitor"
     _svc_display_name_ = "Team Monitor Service"
@@ -16,12 +17,13 @@ class TeamMonitorService(win32serviceutil.ServiceFramework):
         win32serviceutil.ServiceFramework.__init__(self, args)
         self.hWaitStop = win32event.CreateEvent(None, 0, 0, None)
         socket.setdefaulttimeout(60)
-        self.is_alive = True
+        self.supervisor = None
 
     def SvcStop(self):
         self.ReportServiceStatus(win32service.SERVICE_STOP_PENDING)
         win32event.SetEvent(self.hWaitStop)
-        self.is_alive = False
+        if self.supervisor:
+            self.supervisor.stop()
 
     def SvcDoRun(self):
         servicemanager.LogMsg(
@@ -32,24 +34,19 @@ class TeamMonitorService(win32serviceutil.ServiceFramework):
         self.main()
 
     def main(self):
-        # Get the path to the executable
-        exe_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dist', 'TeamMonitor.exe')
-        
-        # Start the application in service mode
-        process = subprocess.Popen([exe_path, '--service'], 
-                                 creationflags=subprocess.CREATE_NO_WINDOW)
-        
-        # Wait for the stop event
-        while self.is_alive:
-            if process.poll() is not None:
-                # If the process died, restart it
-                process = subprocess.Popen([exe_path, '--service'], 
-                                        creationflags=subprocess.CREATE_NO_WINDOW)
-            win32event.WaitForSingleObject(self.hWaitStop, 1000)
-        
-        # Cleanup
-        process.terminate()
-        process.wait()
+        # Restarts, backoff, heartbeats and watchdog limits live in supervisor.py.
+        # The child is the headless engine, the tray app exits in service mode.
+        self.supervisor = Supervisor(
+            engine_command(),
+            popen_kwargs={'creationflags': subprocess.CREATE_NO_WINDOW},
+            log=servicemanager.LogInfoMsg,
+            forward_output=False)
+        try:
+            self.supervisor.run()
+        except Exception as e:
+            servicemanager.LogErrorMsg(f"Supervisor error: {str(e)}")
+        finally:
+            self.supervisor.stop_child()
 
 if __name__ == '__main__':
     if len(sys.argv) == 1:
@@ -57,4 +54,4 @@ if __name__ == '__main__':
         servicemanager.PrepareToHostSingle(TeamMonitorService)
         servicemanager.StartServiceCtrlDispatcher()
     else:
-        win32serviceutil.HandleCommandLine(TeamMonitorService) 
\ No newline at end of file
+        win32serviceutil.HandleCommandLine(TeamMonitorService)
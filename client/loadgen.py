@@ -0,0 +1,299 @@
+"""Fleet load generator for the activity ingest API.
+
+Simulates many TeamMonitor seats on the headless upload path (Uploader
+over an in-memory spool): each seat logs in, samples synthetic input
+every interval at its own random phase, uploads through the real
+batching/backoff logic and survives scheduled outages. Reports ingest
+throughput and upload latency percentiles.
+
+    python loadgen.py --stand-in --clients 2000 --interval 1 --duration 60
+    python loadgen.py --base-url http://localhost:3000/api --clients 500
+    python loadgen.py --stand-in --stand-in-endpoints 2 --endpoint-outage 15:20
+"""
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from activity_source import SyntheticActivitySource
+from activity_spool import MemorySpool
+from endpoint_pool import EndpointPool
+from metrics import MetricsRegistry
+from scheduler import Scheduler
+from token_manager import TokenManager
+from transport import Transport, phase_offset
+from uploader import Uploader
+
+# Geometric latency buckets from 1 ms to ~60 s, ~12% apart
+FINE_LATENCY_BUCKETS = tuple(0.001 * 1.25 ** i for i in range(50))
+
+WINDOWS = ["chrome.exe", "Code.exe", "slack.exe", "explorer.exe", "dota2.exe"]
+
+
+class Outages:
+    """Periodic outage windows: down for `duration` seconds every `every`"""
+
+    def __init__(self, every=0, duration=0, start=None):
+        self.every = every
+        self.duration = duration
+        self.start = time.monotonic() if start is None else start
+
+    def is_down(self):
+        if not self.every or not self.duration:
+            return False
+        return (time.monotonic() - self.start) % self.every >= self.every - self.duration
+
+
+class OutageTransport:
+    """Transport wrapper that fails every request during an outage"""
+
+    def __init__(self, transport, outages):
+        self.transport = transport
+        self.outages = outages
+
+    def request(self, method, url, **kwargs):
+        if self.outages.is_down():
+            raise requests.ConnectionError("Simulated outage")
+        return self.transport.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def close(self):
+        self.transport.close()
+
+
+class SimulatedClient:
+    """One headless seat: synthetic input, in-memory spool, real uploader"""
+
+    def __init__(self, index, base_url, transport, metrics, args):
+        self.username = f"loadgen-{index:05d}"
+        self.base_url = base_url
+        self.transport = transport
+        self.metrics = metrics
+        self.tokens = TokenManager(
+            transport, lambda: (self.base_url, self.username, "loadgen"),
+            metrics=metrics, verbose=False)
+        self.tokens.backoff.base = args.backoff_base
+        self.tokens.backoff.cap = args.backoff_cap
+        self.busy = False
+        self.retry_job = None
+        self.source = SyntheticActivitySource(args.input_probability, seed=index)
+        self.spool = MemorySpool()
+        self.uploader = Uploader(
+            self.spool, transport, metrics,
+            credentials=lambda: (self.base_url, self.username, self.tokens.token),
+            on_unauthorized=self.tokens.reauthenticate, verbose=False)
+        self.uploader.batch_upload = args.batch_size > 1
+        self.uploader.batch_max_size = args.batch_size
+        self.uploader.batch_max_age = args.batch_max_age
+        self.uploader.backoff.base = args.backoff_base
+        self.uploader.backoff.cap = args.backoff_cap
+
+    def login(self):
+        started = time.monotonic()
+        self.tokens.login(force=False)
+        self.metrics.histogram('login_latency_seconds', FINE_LATENCY_BUCKETS).observe(
+            time.monotonic() - started)
+        return self.tokens.token is not None
+
+    def sample(self):
+        if self.source.has_input_since(0):
+            window = WINDOWS[self.source.random.randrange(len(WINDOWS))]
+            self.spool.append(time.time(), [(window, 60)])
+            self.metrics.counter('samples_journaled').inc()
+
+
+class LoadGenerator:
+    def __init__(self, base_url, args):
+        self.args = args
+        self.base_url = base_url
+        self.metrics = MetricsRegistry()
+        self.metrics.histogram('upload_latency_seconds', FINE_LATENCY_BUCKETS)
+        self.scheduler = Scheduler()
+        self.executor = ThreadPoolExecutor(max_workers=args.workers)
+        self.outages = Outages(args.outage_every, args.outage_duration)
+        self.transport = Transport(args.connect_timeout, args.read_timeout, pool_size=args.workers)
+        # One endpoint pool for all seats, so failover is seen fleet-wide
+        self.endpoints = EndpointPool(
+            OutageTransport(self.transport, self.outages), base_url,
+            probe_interval=args.probe_interval)
+        self.clients = [
+            SimulatedClient(i, self.endpoints.primary, self.endpoints, self.metrics, args)
+            for i in range(args.clients)
+        ]
+        self.lock = threading.Lock()
+
+    def submit(self, client, func):
+        """Run `func(client)` on the worker pool unless the client is busy"""
+        with self.lock:
+            if client.busy:
+                return
+            client.busy = True
+
+        def work():
+            try:
+                func(client)
+            finally:
+                with self.lock:
+                    client.busy = False
+
+        self.executor.submit(work)
+
+    def upload(self, client):
+        if client.tokens.is_refresh_due():
+            # Login when there is no token yet, cheap refresh otherwise
+            if client.tokens.token is None:
+                client.login()
+            else:
+                client.tokens.refresh()
+        if client.tokens.token is None:
+            delay = max(client.tokens.next_refresh_delay(), 1)
+        else:
+            delay = client.uploader.run_once()
+        if delay is not None:
+            client.retry_job = self.scheduler.call_later(
+                delay, lambda: self.submit(client, self.upload), name='retry')
+        else:
+            client.retry_job = None
+
+    def flush(self, client):
+        client.sample()
+        if client.retry_job is None:
+            self.submit(client, self.upload)
+
+    def run(self):
+        args = self.args
+        for i, client in enumerate(self.clients):
+            # Logins are spread across the ramp-up, flushes across the interval
+            self.scheduler.call_later(
+                args.ramp * i / max(1, len(self.clients)),
+                lambda client=client: self.submit(client, SimulatedClient.login),
+                name='login')
+            self.scheduler.call_every(
+                args.interval, lambda client=client: self.flush(client),
+                first_delay=args.ramp + phase_offset(args.interval), name='flush')
+
+        started = time.monotonic()
+        self.endpoints.start()
+        self.scheduler.call_later(args.ramp + args.duration, self.scheduler.stop)
+        try:
+            self.scheduler.run()
+        except KeyboardInterrupt:
+            self.scheduler.stop()
+        elapsed = time.monotonic() - started
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        self.endpoints.close()
+        return self.report(elapsed)
+
+    def report(self, elapsed):
+        snapshot = self.metrics.snapshot()
+        measured = max(1e-9, elapsed - self.args.ramp)
+        latency = snapshot.get('upload_latency_seconds', {})
+        login_latency = snapshot.get('login_latency_seconds', {})
+        return {
+            'clients': len(self.clients),
+            'elapsed_seconds': round(elapsed, 1),
+            'logins_succeeded': snapshot.get('logins_succeeded', 0),
+            'logins_failed': snapshot.get('logins_failed', 0),
+            'token_refreshes': snapshot.get('token_refreshes', 0),
+            'samples_journaled': snapshot.get('samples_journaled', 0),
+            'samples_uploaded': snapshot.get('samples_uploaded', 0),
+            'uploads_succeeded': snapshot.get('uploads_succeeded', 0),
+            'uploads_failed': snapshot.get('uploads_failed', 0),
+            'backlog': sum(len(client.spool) for client in self.clients),
+            'samples_per_second': round(snapshot.get('samples_uploaded', 0) / measured, 1),
+            'requests_per_second': round(snapshot.get('uploads_succeeded', 0) / measured, 1),
+            'upload_latency_p50_ms': ms(latency.get('p50')),
+            'upload_latency_p99_ms': ms(latency.get('p99')),
+            'upload_latency_max_ms': ms(latency.get('max')),
+            'login_latency_p99_ms': ms(login_latency.get('p99')),
+            'endpoints': self.endpoints.stats(),
+        }
+
+
+def ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--base-url', default='http://127.0.0.1:3000/api',
+                        help='server API URL, or several separated by commas for failover')
+    target.add_argument('--stand-in', action='store_true',
+                        help='start a local stand-in API server and target it')
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=64, help='concurrent in-flight requests')
+    parser.add_argument('--duration', type=float, default=60, help='seconds measured after ramp-up')
+    parser.add_argument('--ramp', type=float, default=10, help='seconds over which clients log in')
+    parser.add_argument('--interval', type=float, default=60, help='seconds between samples per client')
+    parser.add_argument('--input-probability', type=float, default=0.8)
+    parser.add_argument('--batch-size', type=int, default=10, help='1 uploads one minute per request')
+    parser.add_argument('--batch-max-age', type=float, default=300)
+    parser.add_argument('--backoff-base', type=float, default=2)
+    parser.add_argument('--backoff-cap', type=float, default=600)
+    parser.add_argument('--outage-every', type=float, default=0, help='seconds between outage starts')
+    parser.add_argument('--outage-duration', type=float, default=0)
+    parser.add_argument('--connect-timeout', type=float, default=5)
+    parser.add_argument('--read-timeout', type=float, default=15)
+    parser.add_argument('--stand-in-delay-ms', type=float, default=0)
+    parser.add_argument('--stand-in-token-ttl', type=float, default=7 * 24 * 3600,
+                        help='token lifetime issued by the stand-in, to exercise refreshes')
+    parser.add_argument('--stand-in-endpoints', type=int, default=1,
+                        help='number of stand-in servers, clients fail over between them')
+    parser.add_argument('--endpoint-outage', default='',
+                        help='START:DURATION seconds during which the first stand-in answers 503')
+    parser.add_argument('--probe-interval', type=float, default=15,
+                        help='seconds before a down endpoint is probed')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args(argv)
+
+    servers = []
+    timers = []
+    base_url = args.base_url
+    if args.stand_in:
+        from stand_in_server import StandInServer
+        servers = [StandInServer(delay=args.stand_in_delay_ms / 1000.0,
+                                 token_ttl=args.stand_in_token_ttl).start()
+                   for _ in range(max(1, args.stand_in_endpoints))]
+        base_url = ",".join(server.url for server in servers)
+        if args.endpoint_outage:
+            start, duration = (float(part) for part in args.endpoint_outage.split(':'))
+
+            def set_available(available):
+                servers[0].available = available
+
+            timers = [threading.Timer(start, set_available, (False,)),
+                      threading.Timer(start + duration, set_available, (True,))]
+            for timer in timers:
+                timer.daemon = True
+                timer.start()
+
+    try:
+        report = LoadGenerator(base_url, args).run()
+    finally:
+        for timer in timers:
+            timer.cancel()
+        report_servers = [server.stats() for server in servers]
+        for server in servers:
+            server.stop()
+    if servers:
+        report['server'] = report_servers[0] if len(servers) == 1 else report_servers
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for key, value in report.items():
+            print(f"{key:>24}: {value}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+import os
+import json
+import time
+import bisect
+import threading
+
+# Upper bounds in seconds for request latency histograms
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+
+class Gauge:
+    """Last set value, or the result of `func` when read"""
+
+    def __init__(self, func=None):
+        self.func = func
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def snapshot(self):
+        if self.func is not None:
+            try:
+                return self.func()
+            except Exception:
+                return None
+        return self.value
+
+
+class Histogram:
+    """Fixed-bucket histogram with approximate quantiles"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        with self.lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+            self.min = value if self.min is None else min(self.min, value)
+            self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th observation, clamped
+        to the observed min and max"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(max(bound, self.min), self.max)
+        return self.max
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'count': self.count,
+                'sum': round(self.sum, 6),
+                'min': round(self.min, 6) if self.min is not None else None,
+                'max': round(self.max, 6),
+                'p50': self.quantile(0.5),
+                'p99': self.quantile(0.99),
+                'buckets': dict(zip([str(b) for b in self.buckets] + ['+Inf'], self.counts)),
+            }
+
+
+class MetricsRegistry:
+    """Named counters, gauges and histograms for client diagnostics"""
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def _get(self, name, factory):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = factory()
+            return metric
+
+    def counter(self, name):
+        return self._get(name, Counter)
+
+    def gauge(self, name, func=None):
+        return self._get(name, lambda: Gauge(func))
+
+    def histogram(self, name, buckets=LATENCY_BUCKETS):
+        return self._get(name, lambda: Histogram(buckets))
+
+    def snapshot(self):
+        with self.lock:
+            metrics = list(self.metrics.items())
+        return {name: metric.snapshot() for name, metric in sorted(metrics)}
+
+
+def register_process_gauges(registry):
+    """RSS, CPU time and thread count of the current process"""
+    import psutil
+
+    process = psutil.Process()
+    registry.gauge('process_rss_bytes', lambda: process.memory_info().rss)
+    registry.gauge('process_cpu_seconds',
+                   lambda: round(sum(process.cpu_times()[:2]), 3))
+    registry.gauge('process_threads', threading.active_count)
+
+
+class MetricsFileWriter:
+    """Writes registry snapshots into `directory`.
+
+    `metrics.json` always holds the latest snapshot (replaced atomically);
+    `metrics.log` gets one JSON line per snapshot and is rotated by size,
+    keeping `backups` older files.
+    """
+
+    def __init__(self, registry, directory, max_bytes=256 * 1024, backups=3):
+        self.registry = registry
+        self.latest_path = os.path.join(directory, 'metrics.json')
+        self.log_path = os.path.join(directory, 'metrics.log')
+        self.max_bytes = max_bytes
+        self.backups = backups
+
+    def write(self):
+        snapshot = {'time': time.time(), 'metrics': self.registry.snapshot()}
+        data = json.dumps(snapshot, sort_keys=True)
+
+        tmp_path = self.latest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(data)
+        os.replace(tmp_path, self.latest_path)
+
+        self._rotate()
+        with open(self.log_path, 'a') as f:
+            f.write(data + "\n")
+        return snapshot
+
+    def _rotate(self):
+        try:
+            if os.path.getsize(self.log_path) < self.max_bytes:
+                return
+        except OSError:
+            return
+        for i in range(self.backups - 1, 0, -1):
+            older = f"{self.log_path}.{i}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.log_path}.{i + 1}")
+        os.replace(self.log_path, f"{self.log_path}.1")
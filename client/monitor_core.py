@@ -0,0 +1,424 @@
+"""GUI-free monitoring and upload engine.
+
+MonitorEngine samples input and foreground-window activity, journals it
+and uploads it, without importing tkinter, Pillow, pystray or pynput.
+TeamMonitor in team_monitor.py adds the tray icon and dialogs on top;
+this module can also run on its own as a headless engine:
+
+    python monitor_core.py
+"""
+import os
+import sys
+import json
+import time
+
+from activity_spool import ActivitySpool
+from transport import Transport, phase_offset
+from endpoint_pool import EndpointPool
+from activity_source import create_activity_source
+from scheduler import Scheduler
+from window_dwell import WindowDwell
+from process_cache import ProcessNameCache
+from metrics import MetricsRegistry, MetricsFileWriter, register_process_gauges
+from uploader import Uploader
+from token_manager import TokenManager
+from heartbeat import HEARTBEAT_ENV, format_heartbeat
+
+DEFAULT_SERVER_URL = "http://144.172.98.88:80/api"
+
+
+def default_app_data_dir():
+    base = os.getenv('LOCALAPPDATA') or os.path.join(
+        os.path.expanduser('~'), '.local', 'share')
+    return os.path.join(base, 'TeamMonitor')
+
+
+class MonitorEngine:
+    """Sampling, journaling and upload without any GUI"""
+
+    def __init__(self, service_mode=False, app_data_dir=None):
+        self.username = None
+        self.password = None
+        # One URL, or several separated by commas in order of preference
+        self.server_url = DEFAULT_SERVER_URL
+        self.is_running = False
+        self.service_mode = service_mode
+
+        # Single pooled, time-limited HTTP transport for all server calls,
+        # routed to the healthiest of the configured server endpoints
+        self.endpoints = EndpointPool(Transport(), self.server_url)
+        self.transport = self.endpoints
+
+        # Get application data directory
+        self.app_data_dir = app_data_dir or default_app_data_dir()
+        if not os.path.exists(self.app_data_dir):
+            try:
+                os.makedirs(self.app_data_dir)
+            except Exception as e:
+                print(
+                    f"Warning: Could not create app data directory: {str(e)}")
+                # Fallback to current directory
+                self.app_data_dir = os.path.dirname(os.path.abspath(__file__))
+
+        # Set up credentials file with anonymous name
+        self.credentials_file = os.path.join(
+            self.app_data_dir, 'win32_sys.dat')
+
+        # All periodic work (sampling, flushing, uploads, retries) runs on
+        # this scheduler from one thread, see run() (the tray app runs it
+        # on a thread of its own so the login dialog can use the main one)
+        self.scheduler = Scheduler()
+
+        # Activity tracking
+        self.has_activity = False
+        self.buffer_flush_interval = 60  # Check activity every 60 seconds
+        self.last_sample_time = time.monotonic()
+
+        # Foreground window dwell time per process within each interval
+        self.window_sample_interval = 5  # Seconds between foreground checks
+        self.window_dwell = WindowDwell()
+        self.process_names = ProcessNameCache()
+
+        # Diagnostics: counters, latencies and process stats written to
+        # metrics.json / metrics.log in app_data_dir
+        self.metrics = MetricsRegistry()
+        self.metrics_interval = 60  # Seconds between metrics snapshots
+        self.heartbeat_interval = 30  # Seconds between supervisor heartbeats
+        # Sampling profiler / heap diffs, off unless --profile or toggled
+        self.profiler = None
+        self.metrics_writer = MetricsFileWriter(self.metrics, self.app_data_dir)
+        self.last_scheduler_wakeups = 0
+
+        # API token, renewed ahead of expiry and re-obtained on 401s
+        self.tokens = TokenManager(
+            self.transport,
+            credentials=lambda: (self.endpoints.primary, self.username, self.password),
+            metrics=self.metrics)
+        self.token_check_interval = 3600  # Max seconds between token checks
+
+        # Sampled minutes are journaled locally and replayed by the upload job
+        self.spool = ActivitySpool(self.app_data_dir)
+        self.drain_retry_interval = 30  # Seconds between checks for due batches
+        self.uploader = Uploader(
+            self.spool, self.transport, self.metrics,
+            credentials=lambda: (self.endpoints.primary, self.username, self.token),
+            on_status=self.set_running,
+            on_unauthorized=self.tokens.reauthenticate)
+        self.register_metrics()
+
+        # Initialize monitoring components
+        self.activity_source = None
+        self.activity_source_kind = os.getenv('TEAMMONITOR_ACTIVITY_SOURCE', 'auto')
+
+        self.is_exit = False
+
+    @property
+    def token(self):
+        return self.tokens.token
+
+    def fallback_credentials_file(self):
+        return os.path.join(os.path.dirname(
+            os.path.abspath(__file__)), 'win32_sys.dat')
+
+    def is_first_run(self):
+        """Check if this is the first run of the application"""
+        # Check both primary and fallback locations
+        primary_exists = os.path.exists(self.credentials_file)
+        fallback_exists = os.path.exists(self.fallback_credentials_file())
+
+        return not (primary_exists or fallback_exists)
+
+    def save_credentials(self):
+        """Save credentials to file, raises if neither location is writable"""
+        # Create a dictionary with the credentials
+        credentials = {
+            'username': self.username,
+            'password': self.password,
+            'server_url': self.server_url
+        }
+
+        # Try primary location first
+        try:
+            with open(self.credentials_file, 'w') as f:
+                json.dump(credentials, f)
+        except (PermissionError, IOError):
+            # If permission denied, try current directory
+            fallback_file = self.fallback_credentials_file()
+            with open(fallback_file, 'w') as f:
+                json.dump(credentials, f)
+            self.credentials_file = fallback_file
+        return True
+
+    def load_credentials(self):
+        """Load credentials from file"""
+        try:
+            # Try primary location first
+            if os.path.exists(self.credentials_file):
+                with open(self.credentials_file, 'r') as f:
+                    credentials = json.load(f)
+            else:
+                # Try fallback location
+                fallback_file = self.fallback_credentials_file()
+                if os.path.exists(fallback_file):
+                    with open(fallback_file, 'r') as f:
+                        credentials = json.load(f)
+                    self.credentials_file = fallback_file
+                else:
+                    return False
+
+            if not all(key in credentials for key in ['username', 'password', 'server_url']):
+                return False
+
+            self.username = credentials['username']
+            self.password = credentials['password']
+            self.server_url = credentials['server_url']
+            self.endpoints.set_urls(self.server_url)
+
+            return True
+        except Exception as e:
+            print(f"Failed to load credentials: {str(e)}")
+            return False
+
+    def authenticate(self):
+        print(f"Authenticating as {self.username}")
+        # The dialogs may have changed the server URL(s)
+        self.endpoints.set_urls(self.server_url)
+        authenticated = self.tokens.login()
+        self.set_running(authenticated)
+        if getattr(self, 'token_job', None) is not None:
+            self.scheduler.reschedule(self.token_job, self.token_check_delay())
+        return authenticated
+
+    def token_check_delay(self):
+        if not self.username:
+            return self.token_check_interval
+        # Capped so a long sleep/resume cannot postpone the check for days
+        return min(self.tokens.next_refresh_delay(), self.token_check_interval)
+
+    def refresh_token(self):
+        """Renew the token once its randomized refresh time has come"""
+        if self.username and self.tokens.is_refresh_due():
+            self.set_running(self.tokens.refresh())
+        self.token_job.reschedule(self.token_check_delay())
+
+    def check_connection(self):
+        """Returns (ok, message) for the server's test-connection endpoint"""
+        try:
+            response = self.transport.get(f"{self.endpoints.primary}/test-connection")
+            if response.status_code == 200:
+                return True, "Connection to server successful"
+            return False, "Failed to connect to server"
+        except Exception as e:
+            return False, f"Failed to connect to server: {str(e)}"
+
+    def set_running(self, running):
+        self.is_running = running
+
+    def stop_all_processes(self):
+        """Stop all running processes and cleanup"""
+        # Stop the input activity source if it exists
+        if getattr(self, 'activity_source', None) is not None:
+            try:
+                self.activity_source.stop()
+            except Exception:
+                pass
+            self.activity_source = None
+
+    def get_active_window(self):
+        try:
+            import win32gui
+            import win32process
+
+            hwnd = win32gui.GetForegroundWindow()
+            _, pid = win32process.GetWindowThreadProcessId(hwnd)
+            return self.process_names.get_name(pid)
+        except Exception as e:
+            print(f"Error getting active window: {str(e)}")
+            return ""
+
+    def add_event_to_buffer(self, event_type):
+        self.has_activity = True
+
+    def sample_activity(self):
+        """Fold input seen since the previous sample into has_activity"""
+        now = time.monotonic()
+        source = self.activity_source
+        if source is not None:
+            try:
+                if source.has_input_since(self.last_sample_time):
+                    self.add_event_to_buffer("input")
+                source.rearm()
+            except Exception as e:
+                print(f"Error checking input activity: {str(e)}")
+        self.last_sample_time = now
+
+    def on_monitoring_started(self):
+        print("Monitoring started successfully")
+
+    def on_monitoring_failed(self, error):
+        print(f"Error starting monitoring: {str(error)}")
+
+    def start_monitoring(self):
+        def start_activity_source():
+            try:
+                # Start the input activity source, queried once per flush
+                self.activity_source = create_activity_source(
+                    self.activity_source_kind)
+                self.activity_source.start()
+
+                # Record initial activity
+                self.add_event_to_buffer("start")
+                self.on_monitoring_started()
+            except Exception as e:
+                self.stop_all_processes()
+                self.on_monitoring_failed(e)
+
+        self.scheduler.call_later(0, start_activity_source)
+        return True
+
+    def schedule_jobs(self):
+        """Register the periodic client work with the scheduler"""
+        # Down endpoints are probed on the pool's own thread, a probe can
+        # take up to the connect timeout
+        self.endpoints.start()
+        # First flush lands at a random phase so seats started together
+        # spread their uploads across the interval
+        self.flush_job = self.scheduler.call_every(
+            self.buffer_flush_interval, self.flush_event_buffer,
+            first_delay=phase_offset(self.buffer_flush_interval))
+        self.upload_job = self.scheduler.call_every(
+            self.drain_retry_interval, self.upload_due,
+            first_delay=self.drain_retry_interval)
+        self.window_job = self.scheduler.call_every(
+            self.window_sample_interval, self.sample_window)
+        self.metrics_job = self.scheduler.call_every(
+            self.metrics_interval, self.write_metrics)
+        self.token_job = self.scheduler.call_later(
+            self.token_check_delay(), self.refresh_token)
+        # Heartbeats for supervisor.py, sent from the scheduler thread so a
+        # job stuck in a call stops them
+        if os.getenv(HEARTBEAT_ENV) == '1':
+            self.heartbeat_job = self.scheduler.call_every(
+                self.heartbeat_interval, self.send_heartbeat, first_delay=0)
+
+    def register_metrics(self):
+        try:
+            register_process_gauges(self.metrics)
+        except Exception as e:
+            print(f"Process metrics unavailable: {str(e)}")
+        self.metrics.gauge('spool_backlog', lambda: len(self.spool))
+        self.metrics.gauge('process_name_cache', self.process_names.stats)
+        self.metrics.gauge(
+            'activity_source_wakeups',
+            lambda: self.activity_source.wakeups if self.activity_source else 0)
+        self.metrics.gauge('scheduler_wakeups_per_minute')
+        self.metrics.gauge('upload_backoff', lambda: self.uploader.in_backoff)
+        self.metrics.gauge('endpoints', self.endpoints.stats)
+
+    def write_metrics(self):
+        """Snapshot the registry to disk, returns the snapshot"""
+        wakeups = self.scheduler.wakeups
+        self.metrics.gauge('scheduler_wakeups_per_minute').set(
+            round((wakeups - self.last_scheduler_wakeups) * 60 / self.metrics_interval, 1))
+        self.last_scheduler_wakeups = wakeups
+        try:
+            return self.metrics_writer.write()
+        except Exception as e:
+            print(f"Error writing metrics: {str(e)}")
+            return {'metrics': self.metrics.snapshot()}
+
+    def send_heartbeat(self):
+        print(format_heartbeat({
+            'backlog': len(self.spool),
+            'running': self.is_running,
+            'backoff': self.uploader.in_backoff,
+        }), flush=True)
+
+    def sample_window(self):
+        self.window_dwell.observe(self.get_active_window())
+
+    def flush_event_buffer(self):
+        """Journal the elapsed minute and wake the drainer to upload it"""
+        self.sample_activity()
+        current_window = self.get_active_window()
+        windows = self.window_dwell.take(current_window)
+        if not self.has_activity:
+            return
+
+        try:
+            if not windows:
+                windows = [(current_window, self.buffer_flush_interval)]
+            self.spool.append(time.time(), windows)
+            self.metrics.counter('samples_journaled').inc()
+            self.has_activity = False
+            # New minutes must not cut a backoff short
+            if not self.uploader.in_backoff:
+                self.scheduler.wake(self.upload_job)
+        except Exception as e:
+            print(f"Error journaling activity: {str(e)}")
+
+    def upload_due(self):
+        """Replay the journal in order, one request per run, rate-limited"""
+        delay = self.uploader.run_once()
+        if delay is not None:
+            self.upload_job.reschedule(delay)
+
+    def start_profiler(self):
+        """Start writing profiles and heap diffs to app_data_dir/profiles"""
+        if self.profiler is not None:
+            return
+        from profiler import SamplingProfiler
+
+        try:
+            self.profiler = SamplingProfiler(
+                os.path.join(self.app_data_dir, 'profiles')).start()
+            print(f"Profiling to {self.profiler.directory}")
+        except Exception as e:
+            self.profiler = None
+            print(f"Error starting profiler: {str(e)}")
+
+    def stop_profiler(self):
+        if self.profiler is None:
+            return
+        try:
+            self.profiler.stop()
+        except Exception as e:
+            print(f"Error stopping profiler: {str(e)}")
+        self.profiler = None
+
+    def stop(self):
+        """Stop the scheduler; run() releases the journal and transport once
+        the job in progress (if any) has returned"""
+        self.stop_profiler()
+        self.stop_all_processes()
+        self.is_exit = True
+        self.scheduler.stop()
+
+    def run(self):
+        """Main loop to keep the process running"""
+        try:
+            self.scheduler.run()
+        finally:
+            self.spool.close()
+            self.transport.close()
+
+
+def main():
+    engine = MonitorEngine(service_mode=True)
+    if '--profile' in sys.argv[1:]:
+        engine.start_profiler()
+    if not engine.load_credentials():
+        print("No saved credentials, log in once with the tray application")
+        return 1
+    engine.authenticate()
+    engine.start_monitoring()
+    engine.schedule_jobs()
+    try:
+        engine.run()
+    except KeyboardInterrupt:
+        engine.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+import time
+import threading
+from collections import OrderedDict
+
+import psutil
+
+
+class ProcessNameCache:
+    """Bounded LRU of process names keyed by (pid, process create time).
+
+    The create time makes a recycled PID a different key, so a reused PID
+    never returns the previous owner's name. Processes whose name cannot be
+    read (access denied) are cached as "" so they are not retried on every
+    sample. Processes whose create time cannot be read are remembered by
+    PID alone for `denied_ttl` seconds, after which a recycled PID is
+    checked again.
+    """
+
+    def __init__(self, max_size=256, denied_ttl=60, clock=time.monotonic):
+        self.max_size = max_size
+        self.denied_ttl = denied_ttl
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.denied = {}  # pid -> time until which it is not queried again
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.evictions = 0
+
+    def get_name(self, pid):
+        now = self.clock()
+        with self.lock:
+            until = self.denied.get(pid)
+            if until is not None:
+                if now < until:
+                    self.hits += 1
+                    self.negative_hits += 1
+                    return ""
+                del self.denied[pid]
+
+        try:
+            process = psutil.Process(pid)
+            key = (pid, process.create_time())
+        except psutil.NoSuchProcess:
+            return ""
+        except psutil.AccessDenied:
+            # Without a create time the entry could outlive the PID's owner,
+            # so it only lasts denied_ttl
+            with self.lock:
+                self.misses += 1
+                self.denied[pid] = now + self.denied_ttl
+                if len(self.denied) > self.max_size:
+                    self.denied = {p: t for p, t in self.denied.items() if t > now}
+            return ""
+
+        with self.lock:
+            name = self.entries.get(key)
+            if name is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                if not name:
+                    self.negative_hits += 1
+                return name
+            self.misses += 1
+
+        try:
+            name = process.name()
+        except psutil.AccessDenied:
+            name = ""
+        except psutil.NoSuchProcess:
+            return ""
+
+        with self.lock:
+            self.entries[key] = name
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return name
+
+    def stats(self):
+        with self.lock:
+            return {
+                'size': len(self.entries),
+                'denied': len(self.denied),
+                'hits': self.hits,
+                'misses': self.misses,
+                'negative_hits': self.negative_hits,
+                'evictions': self.evictions,
+            }
@@ -0,0 +1,206 @@
+"""Low-overhead sampling profiler and tracemalloc heap diffs for the client.
+
+A background thread samples the stacks of all other threads (scheduler,
+tray, activity source, ...) through `sys._current_frames()` every
+`interval` seconds and counts identical stacks. Every `flush_interval`
+seconds the counts are written to `profile-<time>.json` and reset.
+When `heap_interval` is set, tracemalloc is also started, and every
+`heap_interval` seconds a snapshot is compared with the previous one.
+The allocation sites that grew most are written to `heap-<time>.json`.
+
+Files go to `directory`, which is pruned to `max_files` / `max_bytes`
+(oldest first). Use analyze_profile.py to summarize them.
+"""
+import os
+import sys
+import json
+import time
+import itertools
+import threading
+import tracemalloc
+from collections import Counter
+
+PROFILE_PREFIX = 'profile-'
+HEAP_PREFIX = 'heap-'
+
+
+def frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Stack sampler plus periodic heap diffs, see the module docstring"""
+
+    def __init__(self, directory, interval=0.02, flush_interval=60, heap_interval=300,
+                 heap_frames=8, heap_top=50, max_files=60, max_bytes=10 * 1024 * 1024):
+        self.directory = directory
+        self.interval = interval
+        self.flush_interval = flush_interval
+        self.heap_interval = heap_interval  # 0 disables tracemalloc
+        self.heap_frames = heap_frames
+        self.heap_top = heap_top
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+
+        self.stacks = Counter()
+        self.samples = 0
+        self.window_started = None
+        self.previous_snapshot = None
+        self.started_tracemalloc = False
+        self.sequence = itertools.count()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    @property
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self):
+        if self.is_running:
+            return self
+        os.makedirs(self.directory, exist_ok=True)
+        if self.heap_interval and not tracemalloc.is_tracing():
+            tracemalloc.start(self.heap_frames)
+            self.started_tracemalloc = True
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name='profiler')
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Stop sampling and write what was collected since the last file"""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(5)
+            self.thread = None
+        if self.started_tracemalloc:
+            tracemalloc.stop()
+            self.started_tracemalloc = False
+        self.previous_snapshot = None
+
+    def run(self):
+        own = threading.get_ident()
+        self.window_started = time.time()
+        cpu_started = time.thread_time()
+        next_flush = time.monotonic() + self.flush_interval
+        next_heap = time.monotonic() + self.heap_interval if self.heap_interval else None
+        if self.heap_interval:
+            self.previous_snapshot = self.take_snapshot()
+
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.sample(own)
+                now = time.monotonic()
+                if now >= next_flush:
+                    self.write_profile(time.thread_time() - cpu_started)
+                    cpu_started = time.thread_time()
+                    next_flush = now + self.flush_interval
+                if next_heap is not None and now >= next_heap:
+                    self.write_heap_diff()
+                    next_heap = now + self.heap_interval
+            except Exception as e:
+                print(f"Profiler error: {str(e)}")
+        try:
+            self.write_profile(time.thread_time() - cpu_started)
+        except Exception as e:
+            print(f"Error writing profile: {str(e)}")
+
+    def sample(self, own_ident):
+        """Count the current stack of every thread except the profiler"""
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame.f_code))
+                frame = frame.f_back
+            stack.append(names.get(ident, f"thread-{ident}"))
+            stack.reverse()
+            self.stacks[';'.join(stack)] += 1
+        self.samples += 1
+
+    def file_path(self, prefix):
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        return os.path.join(self.directory, f"{prefix}{stamp}-{next(self.sequence):04d}.json")
+
+    def write_json(self, prefix, data):
+        path = self.file_path(prefix)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+        self.prune()
+        return path
+
+    def write_profile(self, profiler_cpu):
+        """Write the stacks counted in this window and start a new one"""
+        if not self.samples:
+            return None
+        now = time.time()
+        data = {
+            'started': self.window_started,
+            'duration': round(now - self.window_started, 3),
+            'interval': self.interval,
+            'samples': self.samples,
+            # CPU seconds spent by the sampler itself in this window
+            'profiler_cpu': round(profiler_cpu, 4),
+            'stacks': dict(self.stacks.most_common()),
+        }
+        self.stacks = Counter()
+        self.samples = 0
+        self.window_started = now
+        return self.write_json(PROFILE_PREFIX, data)
+
+    def take_snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+
+    def write_heap_diff(self):
+        """Write the allocation sites that changed most since the last snapshot"""
+        snapshot = self.take_snapshot()
+        diff = snapshot.compare_to(self.previous_snapshot, 'traceback')
+        self.previous_snapshot = snapshot
+        current, peak = tracemalloc.get_traced_memory()
+        return self.write_json(HEAP_PREFIX, {
+            'time': time.time(),
+            'traced_current': current,
+            'traced_peak': peak,
+            'top': [
+                {
+                    'size': stat.size,
+                    'size_diff': stat.size_diff,
+                    'count': stat.count,
+                    'count_diff': stat.count_diff,
+                    # Innermost frame first
+                    'traceback': [f"{frame.filename}:{frame.lineno}"
+                                  for frame in reversed(stat.traceback)],
+                }
+                for stat in diff[:self.heap_top]
+            ],
+        })
+
+    def prune(self):
+        """Delete the oldest files beyond max_files or max_bytes"""
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.json') and name.startswith((PROFILE_PREFIX, HEAP_PREFIX)):
+                path = os.path.join(self.directory, name)
+                try:
+                    files.append((os.path.getmtime(path), path, os.path.getsize(path)))
+                except OSError:
+                    pass
+        files.sort()
+        total = sum(size for _, _, size in files)
+        while files and (len(files) > self.max_files or total > self.max_bytes):
+            _, path, size = files.pop(0)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
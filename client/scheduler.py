@@ -0,0 +1,126 @@
+import time
+import heapq
+import itertools
+import threading
+
+
+class Job:
+    """Handle for a scheduled callback, used to cancel or reschedule it"""
+
+    def __init__(self, scheduler, name, func, interval):
+        self.scheduler = scheduler
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.deadline = None
+        self.seq = None
+        self.cancelled = False
+
+    def cancel(self):
+        self.scheduler.cancel(self)
+
+    def reschedule(self, delay):
+        self.scheduler.reschedule(self, delay)
+
+
+class Scheduler:
+    """Single timer heap that runs all periodic client work on one thread.
+
+    Deadlines use `time.monotonic()` and the loop sleeps on a condition
+    until exactly the next deadline, so there is no polling. A periodic
+    job that falls behind (e.g. across sleep/resume) skips the missed runs
+    instead of firing them in a burst. Callbacks run on the scheduler
+    thread and must not block for longer than their own timeouts.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.condition = threading.Condition()
+        self.heap = []
+        self.counter = itertools.count()
+        self.stopped = False
+        self.wakeups = 0
+
+    def call_later(self, delay, func, name=None):
+        """Run `func` once after `delay` seconds"""
+        job = Job(self, name or func.__name__, func, None)
+        self._push(job, delay)
+        return job
+
+    def call_every(self, interval, func, first_delay=None, name=None):
+        """Run `func` every `interval` seconds, first after `first_delay`"""
+        job = Job(self, name or func.__name__, func, interval)
+        self._push(job, interval if first_delay is None else first_delay)
+        return job
+
+    def _push(self, job, delay):
+        with self.condition:
+            job.cancelled = False
+            self._enqueue(job, self.clock() + max(0, delay))
+            self.condition.notify()
+
+    def _enqueue(self, job, deadline):
+        # Only the most recent heap entry of a job is live
+        job.deadline = deadline
+        job.seq = next(self.counter)
+        heapq.heappush(self.heap, (deadline, job.seq, job))
+
+    def cancel(self, job):
+        with self.condition:
+            job.cancelled = True
+            self.condition.notify()
+
+    def reschedule(self, job, delay):
+        """Move a job's next run; the stale heap entry is skipped when popped"""
+        self._push(job, delay)
+
+    def wake(self, job):
+        """Run a job as soon as possible"""
+        self.reschedule(job, 0)
+
+    def _next_due(self):
+        """Pop the next due job, waiting until its deadline; None on stop"""
+        with self.condition:
+            while not self.stopped:
+                # Drop cancelled jobs and entries superseded by a reschedule
+                while self.heap and (self.heap[0][2].cancelled
+                                     or self.heap[0][1] != self.heap[0][2].seq):
+                    heapq.heappop(self.heap)
+                if not self.heap:
+                    self.condition.wait()
+                    self.wakeups += 1
+                    continue
+                deadline, _, job = self.heap[0]
+                now = self.clock()
+                if deadline > now:
+                    self.condition.wait(deadline - now)
+                    self.wakeups += 1
+                    continue
+                heapq.heappop(self.heap)
+                if job.interval is not None:
+                    # Keep the phase, skipping slots missed while asleep
+                    next_deadline = deadline + job.interval
+                    if next_deadline <= now:
+                        next_deadline += ((now - next_deadline) // job.interval + 1) * job.interval
+                    self._enqueue(job, next_deadline)
+                else:
+                    job.deadline = job.seq = None
+                return job
+            return None
+
+    def run(self):
+        """Run jobs on the calling thread until `stop()` is called"""
+        while True:
+            job = self._next_due()
+            if job is None:
+                return
+            try:
+                job.func()
+            except Exception as e:
+                print(f"Error in scheduled job {job.name}: {str(e)}")
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.heap.clear()
+            self.condition.notify_all()
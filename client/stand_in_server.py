@@ -0,0 +1,252 @@
+"""Lightweight local stand-in for the server's client-facing API.
+
+Implements the contract TeamMonitor talks to -- POST /api/login,
+POST /api/token/refresh, GET /api/events, POST /api/events/batch and
+GET /api/test-connection --
+without Mongo, including compact (wire_format) batches, so the client side can be exercised and benchmarked
+locally. Samples are counted, not stored.
+
+    python stand_in_server.py --port 3000 --delay-ms 20 --error-rate 0.01
+"""
+import sys
+import json
+import time
+import hmac
+import base64
+import random
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import wire_format
+
+
+def b64url(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def b64url_decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+class StandInServer:
+    """Threaded HTTP server with the client-facing API contract"""
+
+    def __init__(self, host='127.0.0.1', port=0, delay=0.0, error_rate=0.0,
+                 token_ttl=7 * 24 * 3600, secret='stand-in-secret', compact=True):
+        self.delay = delay
+        self.compact = compact
+        # False answers every request with 503, like a host that is down
+        self.available = True
+        self.error_rate = error_rate
+        self.token_ttl = token_ttl
+        self.secret = secret.encode()
+        self.lock = threading.Lock()
+        self.counters = {
+            'logins': 0,
+            'refreshes': 0,
+            'requests': 0,
+            'samples': 0,
+            'bytes_received': 0,
+            'errors': 0,
+            'unavailable': 0,
+            'unauthorized': 0,
+        }
+        self.httpd = ThreadingHTTPServer((host, port), StandInHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.app = self
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/api"
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters)
+
+    def issue_token(self, username):
+        """HS256 JWT shaped like the real server's, with an exp claim"""
+        now = int(time.time())
+        # Integer seconds like jsonwebtoken, at least one second of lifetime
+        ttl = max(1, int(self.token_ttl))
+        header = b64url(json.dumps({'alg': 'HS256', 'typ': 'JWT'}).encode())
+        payload = b64url(json.dumps({
+            'user': {'id': username, 'username': username, 'isAdmin': False},
+            'iat': now,
+            'exp': now + ttl,
+        }).encode())
+        signature = hmac.new(self.secret, f"{header}.{payload}".encode(), hashlib.sha256).digest()
+        return f"{header}.{payload}.{b64url(signature)}"
+
+    def verify_token(self, token):
+        """Return the token's claims, or None if it is invalid or expired"""
+        try:
+            header, payload, signature = token.split(".")
+            expected = hmac.new(self.secret, f"{header}.{payload}".encode(), hashlib.sha256).digest()
+            if not hmac.compare_digest(expected, b64url_decode(signature)):
+                return None
+            claims = json.loads(b64url_decode(payload))
+            if claims.get('exp', 0) < time.time():
+                return None
+            return claims
+        except Exception:
+            return None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='stand-in-server')
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real server
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def app(self):
+        return self.server.app
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        data = self.rfile.read(length)
+        self.app.count('bytes_received', length)
+        if self.headers.get('Content-Type') == wire_format.CONTENT_TYPE:
+            if not self.app.compact:
+                return None
+            return wire_format.decode_batch(data, self.headers.get('Content-Encoding'))
+        return json.loads(data)
+
+    def unavailable(self):
+        if self.app.available:
+            return False
+        self.app.count('unavailable')
+        self.send_json(503, {'error': 'Stand-in is down'})
+        return True
+
+    def simulate(self):
+        """Apply the configured latency and failure rate; False if failed"""
+        if self.unavailable():
+            return False
+        self.app.count('requests')
+        if self.app.delay:
+            time.sleep(self.app.delay)
+        if self.app.error_rate and random.random() < self.app.error_rate:
+            self.app.count('errors')
+            self.send_json(500, {'error': 'Injected failure'})
+            return False
+        return True
+
+    def authorized(self):
+        token = self.headers.get('x-auth-token')
+        if not token:
+            self.app.count('unauthorized')
+            self.send_json(401, {'msg': 'No token, authorization denied'})
+            return None
+        claims = self.app.verify_token(token)
+        if claims is None:
+            self.app.count('unauthorized')
+            self.send_json(401, {'msg': 'Token is not valid'})
+        return claims
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/api/test-connection':
+            if self.unavailable():
+                return
+            self.app.count('requests')
+            return self.send_json(200, {'msg': 'Connection successful'})
+        if url.path == '/api/events':
+            if not self.simulate() or not self.authorized():
+                return
+            query = parse_qs(url.query)
+            if not query.get('username'):
+                return self.send_json(400, {'error': 'Username is required'})
+            self.app.count('samples')
+            return self.send_json(200, {'message': 'Activity recorded'})
+        self.send_json(404, {'error': 'Not found'})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        try:
+            body = self.read_json()
+        except (ValueError, KeyError, TypeError, OSError):
+            return self.send_json(400, {'error': 'Invalid JSON'})
+        if body is None:
+            return self.send_json(415, {'error': 'Unsupported batch format'})
+
+        if url.path == '/api/login':
+            if not self.simulate():
+                return
+            if not body.get('username') or not body.get('password'):
+                return self.send_json(400, {'msg': 'Invalid credentials'})
+            self.app.count('logins')
+            return self.send_json(200, {'token': self.app.issue_token(body['username'])})
+        if url.path == '/api/token/refresh':
+            if not self.simulate():
+                return
+            claims = self.authorized()
+            if not claims:
+                return
+            self.app.count('refreshes')
+            return self.send_json(200, {'token': self.app.issue_token(claims['user']['username'])})
+        if url.path == '/api/events/batch':
+            if not self.simulate() or not self.authorized():
+                return
+            samples = body.get('samples')
+            if not body.get('username') or not isinstance(samples, list) or not samples:
+                return self.send_json(400, {'error': 'Samples are required'})
+            self.app.count('samples', len(samples))
+            return self.send_json(200, {'message': 'Activity recorded', 'count': len(samples)})
+        self.send_json(404, {'error': 'Not found'})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=3000)
+    parser.add_argument('--delay-ms', type=float, default=0, help='added latency per request')
+    parser.add_argument('--error-rate', type=float, default=0, help='fraction of requests failed with 500')
+    parser.add_argument('--token-ttl', type=float, default=7 * 24 * 3600, help='issued token lifetime in seconds')
+    parser.add_argument('--no-compact', action='store_true', help='answer compact batches with 415')
+    args = parser.parse_args(argv)
+
+    server = StandInServer(args.host, args.port, delay=args.delay_ms / 1000.0,
+                           error_rate=args.error_rate, token_ttl=args.token_ttl,
+                           compact=not args.no_compact)
+    print(f"Stand-in API listening on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+        print(json.dumps(server.stats()))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,388 @@
+"""Platform-independent supervisor for the monitor process.
+
+Runs a child command and restarts it when it exits, stops sending
+heartbeats (hung, e.g. blocked in a request) or exceeds the RSS or CPU
+watchdog limits. Restarts back off exponentially, and a child that keeps
+failing opens a circuit breaker that pauses restarts for a cooldown
+instead of respawning in a tight loop.
+
+The child reports health by printing heartbeat lines to stdout (see
+heartbeat.py, sent by MonitorEngine when TEAMMONITOR_HEARTBEAT=1);
+its other output is passed on to the supervisor's log. The Windows
+service in install_service.py is a thin shell around `Supervisor` running
+engine_command(), the headless engine (monitor_core.py, frozen as
+TeamActivityMonitorEngine.exe by `build.py --engine`). The tray app is
+not a valid child, it exits in service mode and never heartbeats. On any
+platform it can be run directly, e.g. with a fake child:
+
+    python supervisor.py --fake-child crash
+    python supervisor.py --engine
+    python supervisor.py -- python monitor_core.py
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import subprocess
+
+from heartbeat import HEARTBEAT_ENV, format_heartbeat, parse_heartbeat
+
+# Built by `python build.py --engine`
+ENGINE_EXE = 'TeamActivityMonitorEngine.exe'
+
+
+class CircuitBreaker:
+    """Opens after `max_failures` failures within `window` seconds and stays
+    open for `cooldown` seconds. Then one attempt is allowed (half-open),
+    and if that fails too the breaker opens again right away."""
+
+    def __init__(self, max_failures=5, window=600, cooldown=1800, clock=time.monotonic):
+        self.max_failures = max_failures
+        self.window = window
+        self.cooldown = cooldown
+        self.clock = clock
+        self.failures = []
+        self.opened_at = None
+        self.half_open = False
+
+    def record_failure(self):
+        now = self.clock()
+        self.failures = [t for t in self.failures if now - t < self.window]
+        self.failures.append(now)
+        if self.half_open or len(self.failures) >= self.max_failures:
+            self.opened_at = now
+            self.half_open = False
+
+    def remaining(self):
+        """Seconds until the breaker closes again, 0 if it is closed"""
+        if self.opened_at is None:
+            return 0
+        left = self.opened_at + self.cooldown - self.clock()
+        if left <= 0:
+            self.opened_at = None
+            self.failures = []
+            self.half_open = True
+            return 0
+        return left
+
+    def is_open(self):
+        return self.remaining() > 0
+
+    def reset(self):
+        self.failures = []
+        self.opened_at = None
+        self.half_open = False
+
+
+class Supervisor:
+    """Keeps one child process running, see the module docstring.
+
+    `popen` and `clock` can be replaced to drive the supervisor with a fake
+    child; `process_stats(pid)` returns (rss_bytes, cpu_percent) or None and
+    defaults to psutil when it is installed.
+    """
+
+    def __init__(self, command, heartbeat_timeout=180, startup_grace=120,
+                 stable_after=300, max_rss_mb=500, max_cpu_percent=90,
+                 cpu_window=300, check_interval=5, backoff_base=2, backoff_cap=600,
+                 terminate_timeout=10, breaker=None, popen=subprocess.Popen,
+                 popen_kwargs=None, process_stats=None, clock=time.monotonic, log=print,
+                 forward_output=True):
+        self.command = command
+        self.heartbeat_timeout = heartbeat_timeout  # 0 disables hang detection
+        self.startup_grace = startup_grace  # Seconds allowed before the first heartbeat
+        self.stable_after = stable_after  # Uptime that clears the failure history
+        self.max_rss = max_rss_mb * 1024 * 1024 if max_rss_mb else 0
+        self.max_cpu_percent = max_cpu_percent
+        self.cpu_window = cpu_window  # Seconds CPU must stay above the limit
+        self.check_interval = check_interval
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.terminate_timeout = terminate_timeout
+        self.breaker = breaker or CircuitBreaker(clock=clock)
+        self.popen = popen
+        self.popen_kwargs = popen_kwargs or {}
+        self.process_stats = process_stats or psutil_stats()
+        self.clock = clock
+        self.log = log
+        self.forward_output = forward_output  # Pass non-heartbeat output to log
+
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.child = None
+        self.started_at = None
+        self.last_heartbeat = None
+        self.last_status = {}
+        self.cpu_high_since = None
+        self.failures = 0
+        self.stats = {
+            'starts': 0,
+            'exits': 0,
+            'hangs': 0,
+            'watchdog_restarts': 0,
+            'circuit_opens': 0,
+        }
+
+    def restart_delay(self):
+        """Exponential backoff with jitter, never below half the step"""
+        delay = min(self.backoff_cap, self.backoff_base * (2 ** self.failures))
+        self.failures += 1
+        return random.uniform(delay / 2, delay)
+
+    def start_child(self):
+        env = dict(os.environ, **{HEARTBEAT_ENV: '1', 'PYTHONUNBUFFERED': '1'})
+        child = self.popen(
+            self.command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            stdin=subprocess.DEVNULL, env=env, text=True, bufsize=1,
+            **self.popen_kwargs)
+        with self.lock:
+            self.child = child
+            self.started_at = self.clock()
+            self.last_heartbeat = None
+            self.cpu_high_since = None
+        self.stats['starts'] += 1
+        reader = threading.Thread(target=self.read_output, args=(child,), name='supervisor-output')
+        reader.daemon = True
+        reader.start()
+        self.log(f"Started child (pid {child.pid})")
+
+    def read_output(self, child):
+        """Record heartbeats and pass other output on to the log"""
+        try:
+            for line in child.stdout:
+                line = line.rstrip('\r\n')
+                status = parse_heartbeat(line)
+                if status is None:
+                    if line and self.forward_output:
+                        self.log(f"[child] {line}")
+                    continue
+                with self.lock:
+                    if child is self.child:
+                        self.last_heartbeat = self.clock()
+                        self.last_status = status
+        except Exception as e:
+            self.log(f"Error reading child output: {str(e)}")
+
+    def check_child(self):
+        """Reason the child must be restarted, or None if it is healthy"""
+        code = self.child.poll()
+        if code is not None:
+            self.stats['exits'] += 1
+            return f"exited with code {code}"
+
+        now = self.clock()
+        if self.heartbeat_timeout:
+            with self.lock:
+                last = self.last_heartbeat
+            limit = self.heartbeat_timeout if last is not None else self.startup_grace
+            silent = now - (last if last is not None else self.started_at)
+            if silent > limit:
+                self.stats['hangs'] += 1
+                return f"no heartbeat for {silent:.0f}s"
+
+        usage = self.process_stats(self.child.pid) if self.process_stats else None
+        if usage:
+            rss, cpu = usage
+            if self.max_rss and rss > self.max_rss:
+                self.stats['watchdog_restarts'] += 1
+                return f"RSS {rss / (1024 * 1024):.0f} MB over limit"
+            if self.max_cpu_percent and cpu > self.max_cpu_percent:
+                if self.cpu_high_since is None:
+                    self.cpu_high_since = now
+                elif now - self.cpu_high_since >= self.cpu_window:
+                    self.stats['watchdog_restarts'] += 1
+                    return f"CPU above {self.max_cpu_percent}% for {now - self.cpu_high_since:.0f}s"
+            else:
+                self.cpu_high_since = None
+        return None
+
+    def stop_child(self):
+        """Terminate the child, killing it if it does not exit in time"""
+        child = self.child
+        if child is None:
+            return
+        if child.poll() is None:
+            child.terminate()
+            try:
+                child.wait(self.terminate_timeout)
+            except subprocess.TimeoutExpired:
+                self.log("Child did not exit, killing it")
+                child.kill()
+                child.wait()
+        with self.lock:
+            self.child = None
+
+    def on_failure(self, reason):
+        """Restart bookkeeping after the child failed; returns the delay"""
+        uptime = self.clock() - self.started_at
+        if uptime >= self.stable_after:
+            # It ran fine for a while, start over with short delays
+            self.failures = 0
+            self.breaker.reset()
+        self.breaker.record_failure()
+        if self.breaker.is_open():
+            self.stats['circuit_opens'] += 1
+            delay = self.breaker.remaining()
+            self.log(f"Child failed after {uptime:.0f}s ({reason}), "
+                     f"too many failures, pausing restarts for {delay:.0f}s")
+            return delay
+        delay = self.restart_delay()
+        self.log(f"Child failed after {uptime:.0f}s ({reason}), restarting in {delay:.1f}s")
+        return delay
+
+    def run(self):
+        """Supervise until stop() is called"""
+        while not self.stop_event.is_set():
+            if self.child is None:
+                try:
+                    self.start_child()
+                except Exception as e:
+                    self.log(f"Error starting child: {str(e)}")
+                    self.started_at = self.clock()
+                    self.stop_event.wait(self.on_failure("failed to start"))
+                    continue
+
+            reason = self.check_child()
+            if reason is None:
+                self.stop_event.wait(self.check_interval)
+                continue
+            self.stop_child()
+            self.stop_event.wait(self.on_failure(reason))
+        self.stop_child()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def status(self):
+        with self.lock:
+            child = self.child
+            return {
+                **self.stats,
+                'pid': child.pid if child else None,
+                'uptime': round(self.clock() - self.started_at, 1) if child else 0,
+                'last_heartbeat_age': (round(self.clock() - self.last_heartbeat, 1)
+                                       if child and self.last_heartbeat is not None else None),
+                'child_status': dict(self.last_status),
+                'circuit_open': self.breaker.opened_at is not None,
+            }
+
+
+def psutil_stats():
+    """process_stats callback backed by psutil, None if it is not installed.
+    Children are included, a frozen onefile executable runs the client in
+    a child of the process that was started."""
+    try:
+        import psutil
+    except ImportError:
+        return None
+    processes = {}
+
+    def stats(pid):
+        try:
+            process = processes.get(pid)
+            if process is None:
+                # A new child, drop the processes of the previous one
+                processes.clear()
+                process = processes[pid] = psutil.Process(pid)
+                process.cpu_percent(None)  # First call only sets the baseline
+            rss = process.memory_info().rss
+            cpu = process.cpu_percent(None)
+            for child in process.children(recursive=True):
+                try:
+                    known = processes.setdefault(child.pid, child)
+                    rss += known.memory_info().rss
+                    cpu += known.cpu_percent(None)
+                except psutil.Error:
+                    pass
+            return rss, cpu
+        except psutil.Error:
+            return None
+
+    return stats
+
+
+def python_executable():
+    """Interpreter for child scripts; a service hosted by pywin32 runs in
+    pythonservice.exe, which cannot run a script"""
+    if os.path.basename(sys.executable).lower().startswith('pythonservice'):
+        return os.path.join(sys.exec_prefix, 'python.exe')
+    return sys.executable
+
+
+def engine_command():
+    """Command of the headless engine: the frozen engine next to a frozen
+    supervisor, a built engine next to this script, else monitor_core.py"""
+    if getattr(sys, 'frozen', False):
+        return [os.path.join(os.path.dirname(sys.executable), ENGINE_EXE)]
+    here = os.path.dirname(os.path.abspath(__file__))
+    for directory in (here, os.path.join(here, 'build', 'engine')):
+        path = os.path.join(directory, ENGINE_EXE)
+        if os.path.exists(path):
+            return [path]
+    return [python_executable(), os.path.join(here, 'monitor_core.py')]
+
+
+FAKE_CHILDREN = {
+    # Heartbeats for a while, then exits
+    'healthy': "import time\nfor _ in range(20):\n    print('{hb}', flush=True)\n    time.sleep(1)",
+    # Exits right away, like a client that fails on startup
+    'crash': "import sys\nprint('starting', flush=True)\nsys.exit(3)",
+    # Heartbeats twice, then blocks without exiting
+    'hang': "import time\nfor _ in range(2):\n    print('{hb}', flush=True)\n    time.sleep(1)\ntime.sleep(3600)",
+    # Keeps heartbeating while its memory grows
+    'leak': "import time\nblocks = []\nwhile True:\n    blocks.append(bytearray(20 * 1024 * 1024))\n"
+            "    print('{hb}', flush=True)\n    time.sleep(1)",
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--heartbeat-timeout', type=float, default=180)
+    parser.add_argument('--startup-grace', type=float, default=120)
+    parser.add_argument('--stable-after', type=float, default=300)
+    parser.add_argument('--max-rss-mb', type=float, default=500)
+    parser.add_argument('--max-cpu-percent', type=float, default=90)
+    parser.add_argument('--cpu-window', type=float, default=300)
+    parser.add_argument('--check-interval', type=float, default=5)
+    parser.add_argument('--backoff-base', type=float, default=2)
+    parser.add_argument('--backoff-cap', type=float, default=600)
+    parser.add_argument('--max-failures', type=int, default=5, help='failures that open the circuit')
+    parser.add_argument('--failure-window', type=float, default=600)
+    parser.add_argument('--cooldown', type=float, default=1800, help='seconds the circuit stays open')
+    parser.add_argument('--fake-child', choices=sorted(FAKE_CHILDREN),
+                        help='supervise a built-in fake child instead of a command')
+    parser.add_argument('--engine', action='store_true',
+                        help='supervise the headless engine (see engine_command)')
+    parser.add_argument('command', nargs=argparse.REMAINDER)
+    args = parser.parse_args(argv)
+
+    command = [part for part in args.command if part != '--']
+    if args.fake_child:
+        script = FAKE_CHILDREN[args.fake_child].replace('{hb}', format_heartbeat({'fake': True}))
+        command = [sys.executable, '-c', script]
+    elif args.engine:
+        command = engine_command()
+    if not command:
+        parser.error('a command, --engine or --fake-child is required')
+
+    supervisor = Supervisor(
+        command, heartbeat_timeout=args.heartbeat_timeout, startup_grace=args.startup_grace,
+        stable_after=args.stable_after, max_rss_mb=args.max_rss_mb,
+        max_cpu_percent=args.max_cpu_percent, cpu_window=args.cpu_window,
+        check_interval=args.check_interval, backoff_base=args.backoff_base,
+        backoff_cap=args.backoff_cap,
+        breaker=CircuitBreaker(args.max_failures, args.failure_window, args.cooldown))
+    try:
+        supervisor.run()
+    except KeyboardInterrupt:
+        supervisor.stop()
+        supervisor.stop_child()
+    print(json.dumps(supervisor.status()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,72 +1,38 @@
+"""Tray application: MonitorEngine plus the login/settings dialogs.
+
+tkinter, Pillow, pystray and winreg are imported where they are first
+used, so the engine is sampling before any GUI toolkit has been loaded
+and a session that never opens a dialog never loads tkinter at all.
+"""
+import os
 import sys
-import time
-import winreg
-import requests
 import threading
-from datetime import datetime
-import win32api
-import win32gui
-import win32process
-import psutil
-from pynput import keyboard
-from pystray import Icon, Menu, MenuItem
-from PIL import Image
-import tkinter as tk
-from tkinter import messagebox
-import os
-import json
+
+from monitor_core import MonitorEngine
 
 APP_NAME = "Team Activity Monitor"
 CREDENTIAL_TARGET = "TeamMonitor"
 
 
-class TeamMonitor:
-    def __init__(self, service_mode=False):
-        self.username = None
-        self.password = None
-        self.server_url = "http://144.172.98.88:80/api"
-        self.token = None
-        self.is_running = False
-        self.service_mode = service_mode
+class TeamMonitor(MonitorEngine):
+    def __init__(self, service_mode=False, profile=False):
+        super().__init__(service_mode=service_mode)
         self.startup_enabled = self.is_startup_enabled()  # Initialize startup state
-
-        # Get application data directory
-        self.app_data_dir = os.path.join(
-            os.getenv('LOCALAPPDATA'), 'TeamMonitor')
-        if not os.path.exists(self.app_data_dir):
-            try:
-                os.makedirs(self.app_data_dir)
-            except Exception as e:
-                print(
-                    f"Warning: Could not create app data directory: {str(e)}")
-                # Fallback to current directory
-                self.app_data_dir = os.path.dirname(os.path.abspath(__file__))
-
-        # Set up credentials file with anonymous name
-        self.credentials_file = os.path.join(
-            self.app_data_dir, 'win32_sys.dat')
-
-        # Activity tracking
-        self.has_activity = False
-        self.buffer_flush_interval = 60  # Check activity every 60 seconds
-        self.last_flush_time = datetime.now()
-        self.last_mouse_pos = win32api.GetCursorPos()
-
-        # Initialize monitoring components
-        self.keyboard_listener = None
-        self.mouse_thread = None
-
         self.settings_dialog_flag = False
-        self.is_exit = False
+        if profile:
+            self.start_profiler()
 
         self.init()
 
     def init(self):
         """Init function, check if there's credentials, if yes, run the app, if not, show login dialog"""
-        if service_mode:
+        if self.service_mode:
             sys.exit(1)
 
         self.start_monitoring()
+        self.schedule_jobs()
+        # Sample while the login dialog below holds the main thread
+        self.start_scheduler()
         self.create_tray_icon()
 
         # Check if not the first run
@@ -77,128 +43,63 @@ class TeamMonitor:
                     return
         self.show_login_dialog()
 
-    def is_first_run(self):
-        """Check if this is the first run of the application"""
-        # Check both primary and fallback locations
-        primary_exists = os.path.exists(self.credentials_file)
-        fallback_file = os.path.join(os.path.dirname(
-            os.path.abspath(__file__)), 'win32_sys.dat')
-        fallback_exists = os.path.exists(fallback_file)
+    def start_scheduler(self):
+        """Run the engine's scheduler loop (see MonitorEngine.run) on its own
+        thread; the main thread is needed for Tk dialogs"""
+        self.scheduler_thread = threading.Thread(
+            target=super().run, name='scheduler')
+        self.scheduler_thread.daemon = True
+        self.scheduler_thread.start()
 
-        return not (primary_exists or fallback_exists)
+    def run(self):
+        """Wait until exit_app() stops the scheduler"""
+        # join() with a timeout so Ctrl+C still reaches the main thread
+        while self.scheduler_thread.is_alive():
+            self.scheduler_thread.join(1)
 
     def save_credentials(self):
         """Save credentials to file"""
         try:
-            # Create a dictionary with the credentials
-            credentials = {
-                'username': self.username,
-                'password': self.password,
-                'server_url': self.server_url
-            }
-
-            # Try primary location first
-            try:
-                with open(self.credentials_file, 'w') as f:
-                    json.dump(credentials, f)
-            except (PermissionError, IOError):
-                # If permission denied, try current directory
-                fallback_file = os.path.join(os.path.dirname(
-                    os.path.abspath(__file__)), 'win32_sys.dat')
-                try:
-                    with open(fallback_file, 'w') as f:
-                        json.dump(credentials, f)
-                    self.credentials_file = fallback_file
-                except Exception as e:
-                    messagebox.showerror(
-                        "Error", f"Failed to save credentials: {str(e)}")
-                    return False
-
-            return True
+            return super().save_credentials()
         except Exception as e:
+            from tkinter import messagebox
+
             messagebox.showerror(
                 "Error", f"Failed to save credentials: {str(e)}")
             return False
 
-    def load_credentials(self):
-        """Load credentials from file"""
-        try:
-            # Try primary location first
-            if os.path.exists(self.credentials_file):
-                with open(self.credentials_file, 'r') as f:
-                    credentials = json.load(f)
-            else:
-                # Try fallback location
-                fallback_file = os.path.join(os.path.dirname(
-                    os.path.abspath(__file__)), 'win32_sys.dat')
-                if os.path.exists(fallback_file):
-                    with open(fallback_file, 'r') as f:
-                        credentials = json.load(f)
-                    self.credentials_file = fallback_file
-                else:
-                    return False
-
-            if not all(key in credentials for key in ['username', 'password', 'server_url']):
-                return False
-
-            self.username = credentials['username']
-            self.password = credentials['password']
-            self.server_url = credentials['server_url']
-
-            return True
-        except Exception as e:
-            print(f"Failed to load credentials: {str(e)}")
-            return False
+    def update_menu(self):
+        if getattr(self, 'icon', None) is not None:
+            self.icon.update_menu()
 
-    def authenticate(self):
-        print(f"name: {self.username}, password: {self.password}")
-        try:
-            response = requests.post(
-                f"{self.server_url}/login",
-                json={
-                    "username": self.username,
-                    "password": self.password
-                }
-            )
-            print(f"response: {response.status_code}")
-            if response.status_code == 200:
-                self.token = response.json().get('token')
-                if not self.is_running:
-                    self.is_running = True
-                    if hasattr(self, 'icon'):
-                        self.icon.update_menu()
-                return True
-        except Exception as e:
-            print(f"Failed to connect to server: {str(e)}")
-        if self.is_running:
-            self.is_running = False
-            if hasattr(self, 'icon'):
-                self.icon.update_menu()
-        return False
+    def set_running(self, running):
+        if self.is_running != running:
+            self.is_running = running
+            self.update_menu()
 
     def stop_all_processes(self):
         """Stop all running processes and cleanup"""
+        super().stop_all_processes()
         # Update the menu item
-        if hasattr(self, 'icon'):
-            self.icon.update_menu()
+        self.update_menu()
 
-        # Stop keyboard listener if it exists
-        if hasattr(self, 'keyboard_listener') and self.keyboard_listener is not None:
-            try:
-                self.keyboard_listener.stop()
-            except:
-                pass
-            self.keyboard_listener = None
+    def on_monitoring_started(self):
+        # Update the menu item
+        self.update_menu()
+        super().on_monitoring_started()
 
-        # Stop mouse thread if it exists
-        if hasattr(self, 'mouse_thread') and self.mouse_thread is not None:
-            try:
-                self.mouse_thread.join(timeout=1)
-            except:
-                pass
-            self.mouse_thread = None
+    def on_monitoring_failed(self, error):
+        super().on_monitoring_failed(error)
+        if not self.service_mode:
+            from tkinter import messagebox
+
+            messagebox.showerror(
+                "Error", f"Failed to start monitoring: {str(error)}")
 
     def show_login_dialog(self):
+        import tkinter as tk
+        from tkinter import messagebox
+
         def on_submit():
             nonlocal root
             self.username = username_entry.get()
@@ -255,7 +156,7 @@ class TeamMonitor:
         password_entry.grid(row=1, column=1, padx=10, pady=10, sticky="ew")
 
         # Server URL
-        tk.Label(main_frame, text="Server URL:", font=('Arial', 10)).grid(
+        tk.Label(main_frame, text="Server URL(s):", font=('Arial', 10)).grid(
             row=2, column=0, padx=10, pady=10, sticky="w")
         server_url_entry = tk.Entry(main_frame, width=50, font=('Arial', 10))
         server_url_entry.insert(0, self.server_url)
@@ -285,6 +186,8 @@ class TeamMonitor:
         root.mainloop()
 
     def is_startup_enabled(self):
+        import winreg
+
         try:
             key = winreg.OpenKey(
                 winreg.HKEY_CURRENT_USER,
@@ -304,6 +207,9 @@ class TeamMonitor:
 
     def set_startup(self, enable):
         """Set application to start with Windows"""
+        import winreg
+        from tkinter import messagebox
+
         try:
             key = winreg.OpenKey(
                 winreg.HKEY_CURRENT_USER,
@@ -347,6 +253,9 @@ class TeamMonitor:
 
         def tray_icon_thread():
             try:
+                from pystray import Icon, Menu, MenuItem
+                from PIL import Image
+
                 # Load icon from file
                 try:
                     # First try to load from the same directory as the executable
@@ -377,6 +286,9 @@ class TeamMonitor:
                              self.toggle_running_status),
                     MenuItem('Settings', self.show_settings_dialog),
                     MenuItem('Test Connection', self.test_connection),
+                    MenuItem('Diagnostics', self.show_diagnostics),
+                    MenuItem('Profiling', self.toggle_profiling,
+                             checked=lambda _: self.profiler is not None),
                     MenuItem('Start with Windows', self.toggle_startup,
                              checked=lambda _: self.startup_enabled),
                     MenuItem('Exit', self.exit_app)
@@ -389,26 +301,36 @@ class TeamMonitor:
                 print(f"Error in tray icon thread: {str(e)}")
 
         # Start the tray icon in a background thread
-        self.tray_thread = threading.Thread(target=tray_icon_thread)
+        self.tray_thread = threading.Thread(target=tray_icon_thread, name='tray')
         self.tray_thread.daemon = True
         self.tray_thread.start()
 
     def toggle_running_status(self):
         print("toggle_running_status")
 
+    def toggle_profiling(self):
+        """Start or stop the sampling profiler (files in app_data_dir/profiles)"""
+        if self.profiler is None:
+            self.start_profiler()
+        else:
+            self.stop_profiler()
+        self.update_menu()
+
     def toggle_startup(self):
         """Toggle startup state"""
         new_state = not self.startup_enabled
         if self.set_startup(new_state):
             self.startup_enabled = new_state
             # Update the menu item
-            if hasattr(self, 'icon'):
-                self.icon.update_menu()
+            self.update_menu()
 
     def show_settings_dialog(self):
         if self.settings_dialog_flag:
             return
 
+        import tkinter as tk
+        from tkinter import messagebox
+
         def on_save():
             self.username = username_entry.get()
             self.password = password_entry.get()
@@ -472,7 +394,7 @@ class TeamMonitor:
         password_entry.grid(row=1, column=1, padx=10, pady=10, sticky="ew")
 
         # Server URL
-        tk.Label(main_frame, text="Server URL:", font=('Arial', 10)).grid(
+        tk.Label(main_frame, text="Server URL(s):", font=('Arial', 10)).grid(
             row=2, column=0, padx=10, pady=10, sticky="w")
         server_url_entry = tk.Entry(main_frame, width=50, font=('Arial', 10))
         server_url_entry.insert(0, self.server_url)
@@ -512,138 +434,38 @@ class TeamMonitor:
         root.mainloop()
 
     def test_connection(self):
-        try:
-            response = requests.get(f"{self.server_url}/test-connection")
-            if response.status_code == 200:
-                messagebox.showinfo(
-                    "Success", "Connection to server successful")
-                return
-            else:
-                messagebox.showerror("Error", "Failed to connect to server")
-        except Exception as e:
-            messagebox.showerror(
-                "Error", f"Failed to connect to server: {str(e)}")
+        from tkinter import messagebox
 
-    def get_active_window(self):
-        try:
-            hwnd = win32gui.GetForegroundWindow()
-            _, pid = win32process.GetWindowThreadProcessId(hwnd)
-            process = psutil.Process(pid)
-            return process.name()
-        except Exception as e:
-            print(f"Error getting active window: {str(e)}")
-            return ""
+        ok, message = self.check_connection()
+        if ok:
+            messagebox.showinfo("Success", message)
+        else:
+            messagebox.showerror("Error", message)
 
-    def add_event_to_buffer(self, event_type):
-        self.has_activity = True
+    def show_diagnostics(self):
+        """Write a fresh metrics snapshot and summarize it"""
+        from tkinter import messagebox
 
-    def check_mouse_activity(self):
+        metrics = self.metrics.snapshot()
         try:
-            current_pos = win32api.GetCursorPos()
-            if current_pos != self.last_mouse_pos:
-                self.last_mouse_pos = current_pos
-                self.add_event_to_buffer("mouse_activity")
+            self.metrics_writer.write()
         except Exception as e:
-            print(f"Error checking mouse activity: {str(e)}")
-
-    def on_key_press(self, key):
-        self.add_event_to_buffer("key_press")
-
-    def start_monitoring(self):
-        try:
-            # Start monitoring in a background thread
-            def monitoring_thread():
-                try:
-                    # Start keyboard listener
-                    self.keyboard_listener = keyboard.Listener(
-                        on_press=self.on_key_press)
-                    self.keyboard_listener.start()
-
-                    # Start mouse monitoring thread
-                    self.mouse_thread = threading.Thread(
-                        target=self.mouse_monitor)
-                    self.mouse_thread.daemon = True
-                    self.mouse_thread.start()
-
-                    # Record initial activity
-                    self.add_event_to_buffer("start")
-
-                    # Update the menu item
-                    if hasattr(self, 'icon'):
-                        self.icon.update_menu()
-
-                    print("Monitoring started successfully")
-                except Exception as e:
-                    print(f"Error in monitoring thread: {str(e)}")
-                    self.stop_all_processes()
-                    if not self.service_mode:
-                        messagebox.showerror(
-                            "Error", f"Failed to start monitoring: {str(e)}")
-
-            # Start the monitoring thread
-            self.monitoring_thread = threading.Thread(target=monitoring_thread)
-            self.monitoring_thread.daemon = True
-            self.monitoring_thread.start()
-
-            return True
-        except Exception as e:
-            print(f"Error starting monitoring: {str(e)}")
-            self.stop_all_processes()
-            if not self.service_mode:
-                messagebox.showerror(
-                    "Error", f"Failed to start monitoring: {str(e)}")
-            return False
-
-    def mouse_monitor(self):
-        while True:
-            try:
-                self.check_mouse_activity()
-                time.sleep(0.1)
-            except Exception as e:
-                print(f"Error in mouse monitor: {str(e)}")
-                time.sleep(1)
-
-    def buffer_manager(self):
-        while True:
-            if self.is_exit:
-                break
-            try:
-                current_time = datetime.now()
-                if (current_time - self.last_flush_time).total_seconds() >= self.buffer_flush_interval:
-                    self.flush_event_buffer()
-                    self.last_flush_time = current_time
-                time.sleep(1)
-            except Exception as e:
-                print(f"Error in buffer manager: {str(e)}")
-
-    def flush_event_buffer(self):
-        if not self.has_activity:
-            return
-
-        try:
-            current_window = self.get_active_window()
-            headers = {'x-auth-token': self.token} if self.token else {}
-            response = requests.get(
-                f"{self.server_url}/events",
-                params={"username": self.username, "window": current_window},
-                headers=headers
-            )
-            if response.status_code == 200:
-                print("Activity recorded successfully")
-                self.has_activity = False
-                if not self.is_running:
-                    self.is_running = True
-                    if hasattr(self, 'icon'):
-                        self.icon.update_menu()
-                return
-            else:
-                print(f"Failed to record activity: {response.status_code}")
-        except Exception as e:
-            print(f"Error recording activity: {str(e)}")
-        if self.is_running:
-            self.is_running = False
-            if hasattr(self, 'icon'):
-                self.icon.update_menu()
+            print(f"Error writing metrics: {str(e)}")
+        latency = metrics.get('upload_latency_seconds', {})
+        rss = metrics.get('process_rss_bytes') or 0
+        lines = [
+            f"Status: {'Running' if self.is_running else 'Not Running'}",
+            f"Uploads: {metrics.get('uploads_succeeded', 0)} ok, "
+            f"{metrics.get('uploads_failed', 0)} failed",
+            f"Upload latency p50/p99: {latency.get('p50')}s / {latency.get('p99')}s",
+            f"Backlog: {metrics.get('spool_backlog')} minutes",
+            f"Threads: {metrics.get('process_threads')}",
+            f"Memory: {rss / (1024 * 1024):.1f} MB",
+            f"CPU time: {metrics.get('process_cpu_seconds')}s",
+            "",
+            f"Details: {self.metrics_writer.latest_path}",
+        ]
+        messagebox.showinfo(f"{APP_NAME} - Diagnostics", "\n".join(lines))
 
     def exit_app(self, icon=None, item=None):
         """Gracefully exit the application"""
@@ -657,8 +479,8 @@ class TeamMonitor:
                     pass
                 self.login_dialog = None
 
-            # Stop all processes
-            self.stop_all_processes()
+            # Stop monitoring and the scheduler
+            self.stop()
 
             # Stop tray icon if it exists
             if hasattr(self, 'icon') and self.icon is not None:
@@ -683,16 +505,13 @@ class TeamMonitor:
         except:
             pass
 
-    def run(self):
-        """Main loop to keep the process running"""
-        self.buffer_manager()
-
 
 if __name__ == "__main__":
     try:
         # Check if running as a service
         service_mode = len(sys.argv) > 1 and sys.argv[1] == "--service"
-        monitor = TeamMonitor(service_mode=service_mode)
+        monitor = TeamMonitor(service_mode=service_mode,
+                              profile="--profile" in sys.argv[1:])
         monitor.run()  # Start the main loop
     except Exception as e:
         print(f"Error: {str(e)}")
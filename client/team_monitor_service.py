@@ -4,8 +4,8 @@ import win32event
 import servicemanager
 import socket
 import sys
-import os
-from team_monitor import TeamMonitor
+import threading
+from monitor_core import MonitorEngine
 
 class TeamMonitorService(win32serviceutil.ServiceFramework):
     _svc_name_ = "TeamActivityMonitor"
@@ -22,7 +22,7 @@ class TeamMonitorService(win32serviceutil.ServiceFramework):
         self.ReportServiceStatus(win32service.SERVICE_STOP_PENDING)
         win32event.SetEvent(self.hWaitStop)
         if self.monitor:
-            self.monitor.exit_app()
+            self.monitor.stop()
 
     def SvcDoRun(self):
         servicemanager.LogMsg(
@@ -34,11 +34,22 @@ class TeamMonitorService(win32serviceutil.ServiceFramework):
 
     def main(self):
         try:
-            self.monitor = TeamMonitor()
-            # Keep the service running
-            while True:
-                if win32event.WaitForSingleObject(self.hWaitStop, 1000) == win32event.WAIT_OBJECT_0:
-                    break
+            # Headless engine: no tray, dialogs or GUI toolkits in the service
+            self.monitor = MonitorEngine(service_mode=True)
+            if not self.monitor.load_credentials():
+                servicemanager.LogErrorMsg(
+                    "No saved credentials, log in once with the tray application")
+            else:
+                self.monitor.authenticate()
+            self.monitor.start_monitoring()
+            self.monitor.schedule_jobs()
+            engine_thread = threading.Thread(target=self.monitor.run)
+            engine_thread.daemon = True
+            engine_thread.start()
+
+            # Block until SvcStop, which also stops the engine's scheduler
+            win32event.WaitForSingleObject(self.hWaitStop, win32event.INFINITE)
+            engine_thread.join(10)
         except Exception as e:
             servicemanager.LogErrorMsg(f"Service error: {str(e)}")
 
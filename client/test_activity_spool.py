@@ -0,0 +1,47 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import activity_spool
+from activity_spool import ActivitySpool
+
+
+class WindowTableTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_full_table_records_new_windows_as_unknown(self):
+        with mock.patch.object(activity_spool, 'MAX_WINDOW_ID', 3):
+            spool = ActivitySpool(self.directory)
+            for minute, window in enumerate(['a.exe', 'b.exe', 'c.exe', 'd.exe', 'e.exe']):
+                spool.append(1700000000 + minute * 60, [(window, 60)])
+            self.assertEqual(spool.windows, ['a.exe', 'b.exe', 'c.exe'])
+            self.assertEqual([windows for _, windows in spool.peek(10)],
+                             [[('a.exe', 60)], [('b.exe', 60)], [('c.exe', 60)],
+                              [('', 60)], [('', 60)]])
+            spool.close()
+
+    def test_full_table_uses_the_id_of_empty_window(self):
+        with mock.patch.object(activity_spool, 'MAX_WINDOW_ID', 2):
+            spool = ActivitySpool(self.directory)
+            spool.append(1700000000, [('', 60)])
+            spool.append(1700000060, [('a.exe', 60)])
+            spool.append(1700000120, [('b.exe', 30), ('c.exe', 30)])
+            self.assertEqual(spool.peek(10)[2][1], [('', 30), ('', 30)])
+            spool.close()
+
+            # Names survive a reopen, overflowed minutes still read as ""
+            spool = ActivitySpool(self.directory)
+            self.assertEqual([windows for _, windows in spool.peek(10)],
+                             [[('', 60)], [('a.exe', 60)], [('', 30), ('', 30)]])
+            self.assertTrue(os.path.exists(spool.windows_path))
+            spool.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import socket
+import unittest
+
+import requests
+
+from endpoint_pool import EndpointPool
+
+PRIMARY = 'http://primary/api'
+BACKUP = 'http://backup/api'
+
+
+class Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class ScriptedTransport:
+    """Answers per endpoint: a status code or an exception to raise"""
+
+    def __init__(self, outcomes):
+        self.outcomes = outcomes
+        self.sent = []
+
+    def request(self, method, url, **kwargs):
+        self.sent.append((method, url))
+        for base, outcome in self.outcomes.items():
+            if url.startswith(base + '/'):
+                if isinstance(outcome, Exception):
+                    raise outcome
+                return Response(outcome)
+        raise AssertionError(f"unexpected URL {url}")
+
+
+def refused_error():
+    """The ConnectionError requests raises when nothing listens on a port"""
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    try:
+        requests.post(f"http://127.0.0.1:{port}/api/events/batch", timeout=5)
+    except requests.ConnectionError as e:
+        return e
+    raise AssertionError("connection was not refused")
+
+
+class FailoverTest(unittest.TestCase):
+    def pool(self, primary_outcome, backup_outcome=200):
+        transport = ScriptedTransport({PRIMARY: primary_outcome, BACKUP: backup_outcome})
+        return EndpointPool(transport, [PRIMARY, BACKUP]), transport
+
+    def test_post_not_resent_after_read_timeout(self):
+        pool, transport = self.pool(requests.ReadTimeout('read timed out'))
+        with self.assertRaises(requests.ReadTimeout):
+            pool.post(PRIMARY + '/events/batch', data=b'x')
+        self.assertEqual(transport.sent, [('POST', PRIMARY + '/events/batch')])
+
+    def test_post_not_resent_after_504(self):
+        pool, transport = self.pool(504)
+        self.assertEqual(pool.post(PRIMARY + '/events/batch').status_code, 504)
+        self.assertEqual(len(transport.sent), 1)
+        self.assertEqual(pool.stats()['failovers'], 0)
+
+    def test_recording_get_not_resent_after_read_timeout(self):
+        pool, transport = self.pool(requests.ReadTimeout('read timed out'))
+        with self.assertRaises(requests.ReadTimeout):
+            pool.get(PRIMARY + '/events', params={'dt': 0})
+        self.assertEqual(len(transport.sent), 1)
+
+    def test_post_fails_over_when_never_sent(self):
+        for error in (refused_error(), requests.ConnectTimeout('connect timed out')):
+            pool, transport = self.pool(error)
+            self.assertEqual(pool.post(PRIMARY + '/events/batch').status_code, 200)
+            self.assertEqual(transport.sent[-1], ('POST', BACKUP + '/events/batch'))
+
+    def test_post_fails_over_on_unprocessed_statuses(self):
+        for status in (502, 503):
+            pool, transport = self.pool(status)
+            self.assertEqual(pool.post(PRIMARY + '/events/batch').status_code, 200)
+            self.assertEqual(len(transport.sent), 2)
+
+    def test_idempotent_get_fails_over_on_timeout_and_504(self):
+        for outcome in (requests.ReadTimeout('read timed out'), 504):
+            pool, transport = self.pool(outcome)
+            self.assertEqual(pool.get(PRIMARY + '/test-connection').status_code, 200)
+            self.assertEqual(transport.sent[-1], ('GET', BACKUP + '/test-connection'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+import unittest
+
+from metrics import Histogram
+
+
+class HistogramQuantileTest(unittest.TestCase):
+    def test_quantiles_stay_within_observed_values(self):
+        histogram = Histogram(buckets=(0.01, 0.05, 0.1))
+        for value in (0.052, 0.053, 0.0541):
+            histogram.observe(value)
+        # All in the (0.05, 0.1] bucket, whose bound was reported before
+        self.assertEqual(histogram.quantile(0.99), 0.0541)
+        self.assertEqual(histogram.quantile(0.5), 0.0541)
+        snapshot = histogram.snapshot()
+        self.assertEqual((snapshot['min'], snapshot['max']), (0.052, 0.0541))
+
+    def test_overflow_bucket_and_empty(self):
+        histogram = Histogram(buckets=(0.01, 0.05, 0.1))
+        histogram.observe(0.2)
+        histogram.observe(0.3)
+        self.assertEqual(histogram.quantile(0.5), 0.3)
+        self.assertIsNone(Histogram().quantile(0.5))
+
+    def test_bucket_bound_inside_range_is_kept(self):
+        histogram = Histogram(buckets=(0.01, 0.05, 0.1))
+        for value in (0.005, 0.02, 0.03, 0.09):
+            histogram.observe(value)
+        self.assertEqual(histogram.quantile(0.5), 0.05)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+from unittest import mock
+
+import psutil
+
+from process_cache import ProcessNameCache
+
+
+class DeniedProcess:
+    def __init__(self, pid):
+        self.pid = pid
+
+    def create_time(self):
+        raise psutil.AccessDenied(self.pid)
+
+
+class AccessDeniedTest(unittest.TestCase):
+    def test_create_time_denied_is_cached_for_ttl(self):
+        now = [0.0]
+        cache = ProcessNameCache(denied_ttl=60, clock=lambda: now[0])
+        with mock.patch('psutil.Process', side_effect=DeniedProcess) as process:
+            self.assertEqual(cache.get_name(4), "")
+            self.assertEqual(cache.get_name(4), "")
+            now[0] = 59
+            self.assertEqual(cache.get_name(4), "")
+            self.assertEqual(process.call_count, 1)
+
+            # Expired: the PID may belong to another process by now
+            now[0] = 61
+            self.assertEqual(cache.get_name(4), "")
+            self.assertEqual(process.call_count, 2)
+
+        stats = cache.stats()
+        self.assertEqual(stats['negative_hits'], 2)
+        self.assertEqual(stats['misses'], 2)
+        self.assertEqual(stats['denied'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import os
+import json
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from stand_in_server import StandInServer
+from supervisor import Supervisor, engine_command
+
+
+class EngineHeartbeatTest(unittest.TestCase):
+    """The service's child command must run the real engine and heartbeat"""
+
+    def setUp(self):
+        self.server = StandInServer(port=0)
+        self.server.start()
+        self.data_dir = tempfile.mkdtemp()
+        app_dir = os.path.join(self.data_dir, 'TeamMonitor')
+        os.makedirs(app_dir)
+        with open(os.path.join(app_dir, 'win32_sys.dat'), 'w') as f:
+            json.dump({'username': 'alice', 'password': 'secret',
+                       'server_url': self.server.url}, f)
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def test_engine_child_heartbeats(self):
+        lines = []
+        supervisor = Supervisor(engine_command(), check_interval=0.2, log=lines.append)
+        with mock.patch.dict(os.environ, {'LOCALAPPDATA': self.data_dir}):
+            runner = threading.Thread(target=supervisor.run)
+            runner.start()
+            try:
+                deadline = time.monotonic() + 60
+                while time.monotonic() < deadline:
+                    if supervisor.status()['last_heartbeat_age'] is not None:
+                        break
+                    time.sleep(0.2)
+                status = supervisor.status()
+            finally:
+                supervisor.stop()
+                runner.join(30)
+
+        self.assertIsNotNone(status['last_heartbeat_age'], '\n'.join(lines))
+        self.assertEqual(status['starts'], 1)
+        self.assertEqual(status['exits'], 0)
+        self.assertFalse(runner.is_alive())
+        self.assertGreaterEqual(self.server.stats()['logins'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
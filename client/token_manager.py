@@ -0,0 +1,156 @@
+import json
+import time
+import base64
+import random
+import threading
+
+from transport import Backoff
+
+
+def token_claims(token):
+    """Decode a JWT's payload without verifying it (the server does that)"""
+    try:
+        payload = token.split('.')[1]
+        return json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+    except Exception:
+        return {}
+
+
+class TokenManager:
+    """Holds the API token and renews it without login storms.
+
+    Logins cost the server a bcrypt comparison, so the token is renewed
+    through the cheap `/token/refresh` endpoint at a random point late in
+    its lifetime (`refresh_window`, as fractions of it) rather than all
+    seats at once. A 401 triggers one login no matter how many callers
+    hit it (single-flight); failed logins are retried with jittered
+    backoff. `credentials` returns the current (server_url, username,
+    password).
+    """
+
+    def __init__(self, transport, credentials, metrics=None,
+                 refresh_window=(0.75, 0.9), verbose=True):
+        self.transport = transport
+        self.credentials = credentials
+        self.metrics = metrics
+        self.refresh_window = refresh_window
+        self.verbose = verbose
+
+        self.token = None
+        self.expires_at = None  # Wall clock, from the token's exp claim
+        self.refresh_at = None  # Wall clock, randomized within refresh_window
+        self.lock = threading.Lock()
+        self.backoff = Backoff(base=5, cap=900)
+        self.retry_at = 0.0  # Monotonic, no attempts before this after a failure
+
+    def log(self, message):
+        if self.verbose:
+            print(message)
+
+    def count(self, name):
+        if self.metrics is not None:
+            self.metrics.counter(name).inc()
+
+    def set_token(self, token):
+        now = time.time()
+        claims = token_claims(token)
+        issued_at = claims.get('iat', now)
+        self.token = token
+        self.expires_at = claims.get('exp')
+        if self.expires_at is None:
+            self.refresh_at = None
+        else:
+            lifetime = max(0, self.expires_at - issued_at)
+            self.refresh_at = issued_at + lifetime * random.uniform(*self.refresh_window)
+
+    def clear(self):
+        self.token = self.expires_at = self.refresh_at = None
+
+    def failed(self):
+        self.retry_at = time.monotonic() + self.backoff.next_delay()
+
+    def succeeded(self, token):
+        self.set_token(token)
+        self.backoff.reset()
+        self.retry_at = 0.0
+
+    def login(self, force=True):
+        """Log in with the saved password; `force` ignores the retry backoff"""
+        with self.lock:
+            if not force and time.monotonic() < self.retry_at:
+                return False
+            return self._login()
+
+    def _login(self):
+        server_url, username, password = self.credentials()
+        try:
+            response = self.transport.post(
+                f"{server_url}/login",
+                json={"username": username, "password": password})
+            self.log(f"Login response: {response.status_code}")
+            if response.status_code == 200:
+                self.succeeded(response.json().get('token'))
+                self.count('logins_succeeded')
+                return True
+            if response.status_code == 400:
+                # Wrong credentials, the token is of no further use
+                self.clear()
+        except Exception as e:
+            self.log(f"Failed to connect to server: {str(e)}")
+        self.count('logins_failed')
+        self.failed()
+        return False
+
+    def is_refresh_due(self):
+        if time.monotonic() < self.retry_at:
+            return False
+        return self.token is None or (
+            self.refresh_at is not None and time.time() >= self.refresh_at)
+
+    def refresh(self):
+        """Swap the token for a fresh one, logging in only if it is rejected"""
+        with self.lock:
+            if self.token is None:
+                return self._login()
+            server_url = self.credentials()[0]
+            try:
+                response = self.transport.post(
+                    f"{server_url}/token/refresh",
+                    headers={'x-auth-token': self.token})
+                if response.status_code == 200:
+                    self.succeeded(response.json().get('token'))
+                    self.count('token_refreshes')
+                    return True
+                if response.status_code in (401, 404):
+                    # Token no longer accepted, or a server without refresh
+                    return self._login()
+                self.log(f"Token refresh failed: {response.status_code}")
+            except Exception as e:
+                self.log(f"Token refresh failed: {str(e)}")
+            self.failed()
+            return False
+
+    def reauthenticate(self, rejected_token):
+        """Called on a 401: True once a different token is available.
+
+        Callers that arrive while another one is logging in wait for it
+        and reuse its token instead of logging in again.
+        """
+        with self.lock:
+            if self.token is not None and self.token != rejected_token:
+                return True
+            if time.monotonic() < self.retry_at:
+                return False
+            self.log("Token rejected, logging in again")
+            return self._login()
+
+    def next_refresh_delay(self):
+        """Seconds until is_refresh_due() becomes true"""
+        now = time.monotonic()
+        if now < self.retry_at:
+            return self.retry_at - now
+        if self.token is None:
+            return 0
+        if self.refresh_at is None:
+            return float('inf')
+        return max(0, self.refresh_at - time.time())
@@ -0,0 +1,56 @@
+import random
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class Transport:
+    """Shared keep-alive HTTP session with strict connect and read timeouts.
+
+    All client network I/O goes through one instance so connections are
+    pooled and no request can block a thread indefinitely.
+    """
+
+    def __init__(self, connect_timeout=5, read_timeout=15, pool_size=4):
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        # Retries are handled by the caller's backoff, never inside a request
+        adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+class Backoff:
+    """Exponential backoff with full jitter: uniform(0, min(cap, base * 2^n))"""
+
+    def __init__(self, base=2, cap=600):
+        self.base = base
+        self.cap = cap
+        self.failures = 0
+
+    def next_delay(self):
+        delay = min(self.cap, self.base * (2 ** self.failures))
+        self.failures += 1
+        return random.uniform(0, delay)
+
+    def reset(self):
+        self.failures = 0
+
+
+def phase_offset(interval):
+    """Random per-client offset within one interval, so clients started
+    together do not all hit the server at the same second"""
+    return random.uniform(0, interval)
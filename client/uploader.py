@@ -0,0 +1,197 @@
+import json
+import time
+
+import wire_format
+from transport import Backoff
+
+
+class Uploader:
+    """Headless upload path: replays the activity spool to the server.
+
+    Holds no GUI or OS state, so the same code runs inside TeamMonitor and
+    in tools such as the load generator. `credentials` returns the current
+    (server_url, username, token); `on_status` is told whether the server
+    accepted the last request. `on_unauthorized(token)` is called when the
+    server rejects `token` and returns True once a new one is available,
+    in which case the request is retried once.
+    """
+
+    def __init__(self, spool, transport, metrics, credentials, on_status=None,
+                 on_unauthorized=None, verbose=True):
+        self.spool = spool
+        self.transport = transport
+        self.metrics = metrics
+        self.credentials = credentials
+        self.on_status = on_status
+        self.on_unauthorized = on_unauthorized
+        self.verbose = verbose
+
+        self.drain_rate = 5  # Max upload requests per second while replaying
+        self.backoff = Backoff()
+        self.in_backoff = False
+
+        # Batching mode: upload several minutes per request once enough have
+        # accumulated or the oldest one has waited long enough
+        self.batch_upload = True
+        self.batch_max_size = 10
+        self.batch_max_age = 300  # Seconds
+        # Send batches in the gzip compact wire format; switched off for
+        # good when the server does not understand it
+        self.compact_upload = True
+
+    def log(self, message):
+        if self.verbose:
+            print(message)
+
+    def run_once(self):
+        """Send one due request; returns the delay until the next run should
+        happen, or None to keep the regular schedule"""
+        try:
+            delivered = self.drain_spool()
+        except Exception as e:
+            self.log(f"Error draining activity spool: {str(e)}")
+            delivered = False
+
+        if not delivered:
+            self.in_backoff = True
+            delay = self.backoff.next_delay()
+            self.log(f"Upload failed, retrying in {delay:.0f}s")
+            return delay
+
+        self.in_backoff = False
+        self.backoff.reset()
+        if self.credentials()[1] and self.is_upload_due():
+            # More backlog is ready, send the next request after a short gap
+            return 1.0 / self.drain_rate
+        return None
+
+    def is_upload_due(self):
+        if self.batch_upload:
+            samples = self.spool.peek(self.batch_max_size)
+            return bool(samples) and self.is_batch_due(samples)
+        return len(self.spool) > 0
+
+    def is_batch_due(self, samples):
+        """A batch is sent when it is full or its oldest minute is too old"""
+        return (len(samples) >= self.batch_max_size
+                or time.time() - samples[0][0] >= self.batch_max_age)
+
+    def drain_spool(self):
+        """Send one due request, returns False if the server could not be reached"""
+        if not self.credentials()[1] or not self.is_upload_due():
+            return True
+        started = time.monotonic()
+        was_batch = self.batch_upload
+        if was_batch:
+            samples = self.spool.peek(self.batch_max_size)
+            sent = self.send_events(samples)
+        else:
+            samples = self.spool.peek(1)
+            sent = self.send_event(*samples[0])
+        self.metrics.histogram('upload_latency_seconds').observe(time.monotonic() - started)
+
+        if not sent:
+            self.metrics.counter('uploads_failed').inc()
+            # A batch refused by an older server without the batch endpoint
+            # is retried one minute at a time on the next run
+            return was_batch and not self.batch_upload
+        self.metrics.counter('uploads_succeeded').inc()
+        self.metrics.counter('samples_uploaded').inc(len(samples))
+        self.spool.ack(len(samples))
+        return True
+
+    def set_status(self, ok):
+        if self.on_status is not None:
+            self.on_status(ok)
+
+    def authorized_request(self, method, path, headers=None, **kwargs):
+        """Send a request with the current token, renewing it once on a 401"""
+        server_url, _, token = self.credentials()
+        headers = dict(headers or {})
+        if token:
+            headers['x-auth-token'] = token
+        response = self.transport.request(
+            method, f"{server_url}{path}", headers=headers, **kwargs)
+        if (response.status_code == 401 and self.on_unauthorized is not None
+                and self.on_unauthorized(token)):
+            server_url, _, token = self.credentials()
+            headers['x-auth-token'] = token
+            response = self.transport.request(
+                method, f"{server_url}{path}", headers=headers, **kwargs)
+        return response
+
+    def dwell_payload(self, windows):
+        return [{"window": window, "seconds": seconds} for window, seconds in windows]
+
+    def send_event(self, timestamp, windows):
+        """Upload one journaled minute, returns True once the server has it"""
+        username = self.credentials()[1]
+        try:
+            response = self.authorized_request(
+                'GET', "/events",
+                params={
+                    "username": username,
+                    "window": windows[0][0] if windows else "",
+                    "windows": json.dumps(self.dwell_payload(windows)),
+                    "dt": int(timestamp * 1000)
+                }
+            )
+            if response.status_code == 200:
+                self.log("Activity recorded successfully")
+                self.set_status(True)
+                return True
+            else:
+                self.log(f"Failed to record activity: {response.status_code}")
+        except Exception as e:
+            self.log(f"Error recording activity: {str(e)}")
+        self.set_status(False)
+        return False
+
+    def batch_request(self, username, samples):
+        """Request arguments for a batch in the current wire format"""
+        if self.compact_upload:
+            data, headers = wire_format.encode_request(username, samples)
+            return {"data": data, "headers": headers}
+        return {
+            "json": {
+                "username": username,
+                "samples": [
+                    {
+                        "dt": int(timestamp * 1000),
+                        "window": windows[0][0] if windows else "",
+                        "windows": self.dwell_payload(windows)
+                    }
+                    for timestamp, windows in samples
+                ]
+            }
+        }
+
+    def send_events(self, samples):
+        """Upload several journaled minutes in one request"""
+        username = self.credentials()[1]
+        try:
+            response = self.authorized_request(
+                'POST', "/events/batch", **self.batch_request(username, samples))
+            if self.compact_upload and response.status_code in (400, 415):
+                # Server without the compact format (older ones answer 400
+                # as they see an empty body), resend as plain JSON
+                self.log("Compact uploads not supported, using JSON")
+                self.compact_upload = False
+                self.metrics.counter('compact_fallbacks').inc()
+                response = self.authorized_request(
+                    'POST', "/events/batch", **self.batch_request(username, samples))
+            if response.status_code == 200:
+                self.log(f"Recorded {len(samples)} activity samples")
+                self.set_status(True)
+                return True
+            elif response.status_code == 404:
+                # Older server without the batch endpoint
+                self.log("Batch upload not supported, sending minutes one by one")
+                self.batch_upload = False
+                return False
+            else:
+                self.log(f"Failed to record activity: {response.status_code}")
+        except Exception as e:
+            self.log(f"Error recording activity: {str(e)}")
+        self.set_status(False)
+        return False
@@ -0,0 +1,34 @@
+import time
+
+
+class WindowDwell:
+    """Seconds spent in each foreground process during the current interval.
+
+    `observe()` is called with the focused process name on every cheap
+    sample; the time since the previous sample is credited to the window
+    that was focused then. `take()` closes the interval and returns the
+    histogram as (window, seconds) pairs, longest first.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.seconds = {}
+        self.current = None
+        self.since = clock()
+
+    def observe(self, window):
+        now = self.clock()
+        if self.current is not None:
+            self.seconds[self.current] = self.seconds.get(self.current, 0) + now - self.since
+        self.current = window
+        self.since = now
+
+    def take(self, window=None):
+        """Return the interval's histogram and start a new interval"""
+        self.observe(self.current if window is None else window)
+        histogram = sorted(
+            ((name, round(seconds)) for name, seconds in self.seconds.items()
+             if round(seconds) > 0),
+            key=lambda item: item[1], reverse=True)
+        self.seconds = {}
+        return histogram
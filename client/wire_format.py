@@ -0,0 +1,67 @@
+"""Compact encoding for activity batch uploads.
+
+A batch is sent as gzip-compressed JSON of the form
+
+    {"v": 1, "u": username, "w": [window names...],
+     "s": [[dt_delta_ms, [[window_index, seconds], ...]], ...]}
+
+Each window name appears once per batch in "w" and samples refer to it by
+index. The first delta is the epoch-ms timestamp of the first sample and
+each later one is relative to the sample before it, so a batch of
+consecutive minutes repeats "60000" instead of full timestamps. The
+server's `utils/wireFormat.js` decodes it back into the plain JSON
+batch shape.
+"""
+import gzip
+import json
+
+CONTENT_TYPE = 'application/vnd.teammonitor.batch+json'
+VERSION = 1
+
+
+def encode_batch(username, samples):
+    """Encode journaled (timestamp, [(window, seconds), ...]) samples"""
+    names = {}
+    encoded = []
+    previous = 0
+    for timestamp, windows in samples:
+        dt = int(timestamp * 1000)
+        parts = [[names.setdefault(window, len(names)), seconds]
+                 for window, seconds in windows]
+        encoded.append([dt - previous, parts])
+        previous = dt
+    body = {"v": VERSION, "u": username, "w": list(names), "s": encoded}
+    return json.dumps(body, separators=(',', ':')).encode()
+
+
+def compress(data):
+    # mtime=0 keeps the output stable for identical batches
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+
+def encode_request(username, samples):
+    """Body and headers for a compact POST /events/batch"""
+    headers = {'Content-Type': CONTENT_TYPE, 'Content-Encoding': 'gzip'}
+    return compress(encode_batch(username, samples)), headers
+
+
+def decode_batch(data, encoding=None):
+    """Decode a compact batch into the plain JSON batch shape"""
+    if encoding == 'gzip':
+        data = gzip.decompress(data)
+    body = json.loads(data)
+    if body.get("v") != VERSION:
+        raise ValueError(f"Unsupported batch version: {body.get('v')}")
+    names = body["w"]
+    samples = []
+    dt = 0
+    for delta, parts in body["s"]:
+        dt += delta
+        windows = [{"window": names[index], "seconds": seconds}
+                   for index, seconds in parts]
+        samples.append({
+            "dt": dt,
+            "window": windows[0]["window"] if windows else "",
+            "windows": windows
+        })
+    return {"username": body["u"], "samples": samples}
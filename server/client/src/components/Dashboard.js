@@ -3,6 +3,7 @@ import React, {
   useEffect,
   useMemo,
   useCallback,
+  useRef,
   Suspense,
   lazy,
 } from "react";
@@ -24,6 +25,11 @@ import { useAuth } from "../context/AuthContext";
 import { SERVER_API_PATH } from "../config";
 import "./Dashboard.css";
 import { BANNED_APPS, HIDDEN_APPS } from "../contants";
+import {
+  eventWindowMinutes,
+  eventWorkRelax,
+  mergeEvents,
+} from "../utils/activity";
 
 // Lazy load components
 const ActivityChart = lazy(() => import("./dashboard/ActivityChart"));
@@ -64,11 +70,18 @@ const Dashboard = () => {
     [selectedDate]
   );
 
+  // Sync cursor of the events shown, and the month they belong to
+  const sync = useRef({ month: null, cursor: null });
+
   const fetchEvents = useCallback(async () => {
     try {
       const res = await axios.get(
         `${SERVER_API_PATH}/events/${user.username}?year=${year}&month=${month}`
       );
+      sync.current = {
+        month: `${year}-${month}`,
+        cursor: res.headers["x-sync-cursor"],
+      };
       setEvents(res.data);
       // Only set today's events if we're looking at the current month/year
       const currentDate = new Date();
@@ -91,10 +104,42 @@ const Dashboard = () => {
     };
   }, [fetchEvents]);
 
+  // Polls only fetch the minutes written since the last response
+  const pollEvents = useCallback(async () => {
+    const key = `${year}-${month}`;
+    const { month: syncedMonth, cursor } = sync.current;
+    if (syncedMonth !== key || !cursor) {
+      fetchEvents();
+      return;
+    }
+    try {
+      const res = await axios.get(`${SERVER_API_PATH}/events/${user.username}`, {
+        params: { year, month, since: cursor },
+      });
+      // The month changed while this poll was running
+      if (sync.current.month !== key) return;
+      sync.current = {
+        month: key,
+        cursor: res.headers["x-sync-cursor"] || cursor,
+      };
+      if (res.data.length === 0) return;
+      setEvents((current) => mergeEvents(current, res.data, true));
+      const currentDate = new Date();
+      if (
+        year === currentDate.getFullYear() &&
+        month === currentDate.getMonth() + 1
+      ) {
+        setTodayEvents((current) => mergeEvents(current, res.data, true));
+      }
+    } catch (err) {
+      console.error(err);
+    }
+  }, [user.username, year, month, fetchEvents]);
+
   useEffect(() => {
-    const interval = setInterval(fetchEvents, 10 * 60 * 1000); // 10 minutes
+    const interval = setInterval(pollEvents, 60 * 1000);
     return () => clearInterval(interval);
-  }, [fetchEvents]);
+  }, [pollEvents]);
 
   // Memoized activity data calculation
   const chartData = useMemo(() => {
@@ -146,10 +191,16 @@ const Dashboard = () => {
     ) {
       // Process events
       const addDetails = (event) => {
-        if (event.window && !HIDDEN_APPS.includes(event.window)) {
-          activityDetails[event.window] =
-            (activityDetails[event.window] || 0) + 1;
-        }
+        eventWindowMinutes(event).forEach(({ window, minutes }) => {
+          if (window && !HIDDEN_APPS.includes(window)) {
+            activityDetails[window] = (activityDetails[window] || 0) + minutes;
+          }
+        });
+      };
+      const addWorkRelax = (event, index) => {
+        const { work, relax } = eventWorkRelax(event);
+        workingData[index] += work;
+        relaxData[index] += relax;
       };
 
       if (timeRange === "week") {
@@ -174,22 +225,14 @@ const Dashboard = () => {
           ) {
             const hour = eventDate.getHours();
             data[hour]++;
-            if (BANNED_APPS.includes(event.window)) {
-              relaxData[hour]++;
-            } else {
-              workingData[hour]++;
-            }
+            addWorkRelax(event, hour);
             addDetails(event);
           }
         } else if (timeRange === "week") {
           if (eventDate >= weekStart && eventDate <= weekEnd) {
             const day = eventDate.getDay();
             data[day]++;
-            if (BANNED_APPS.includes(event.window)) {
-              relaxData[day]++;
-            } else {
-              workingData[day]++;
-            }
+            addWorkRelax(event, day);
             addDetails(event);
           }
         } else if (timeRange === "month") {
@@ -197,11 +240,7 @@ const Dashboard = () => {
             const day = eventDate.getDate() - 1;
             if (day >= 0 && day < data.length) {
               data[day]++;
-              if (BANNED_APPS.includes(event.window)) {
-                relaxData[day]++;
-              } else {
-                workingData[day]++;
-              }
+              addWorkRelax(event, day);
               addDetails(event);
             }
           }
@@ -254,7 +293,7 @@ const Dashboard = () => {
     const activityDetailsArray = Object.entries(activityDetails)
       .map(([key, value]) => ({
         key,
-        value,
+        value: Math.round(value),
         type: BANNED_APPS.includes(key) ? "banned" : "normal",
       }))
       .sort((a, b) => b.value - a.value);
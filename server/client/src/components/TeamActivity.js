@@ -3,6 +3,7 @@ import React, {
   useEffect,
   useMemo,
   useCallback,
+  useRef,
   Suspense,
   lazy,
 } from "react";
@@ -43,8 +44,34 @@ const colors = [
   "rgb(153, 102, 255)",
 ];
 
+// Bucket boundaries follow the browser's timezone, like the labels
+const TIMEZONE = Intl.DateTimeFormat().resolvedOptions().timeZone;
+
+// Apply a ?since response: the buckets of each changed user from its first
+// changed bucket on are replaced by the recomputed ones
+const mergeBuckets = (current, delta) => {
+  const firstChanged = new Map(
+    delta.changes.map((change) => [
+      change.username,
+      new Date(change.from).getTime(),
+    ])
+  );
+  return current
+    .filter(
+      (bucket) =>
+        !firstChanged.has(bucket.username) ||
+        new Date(bucket.t).getTime() < firstChanged.get(bucket.username)
+    )
+    .concat(delta.buckets)
+    .sort(
+      (a, b) =>
+        new Date(a.t) - new Date(b.t) || a.username.localeCompare(b.username)
+    );
+};
+
 const TeamActivity = () => {
-  const [events, setEvents] = useState([]);
+  const [buckets, setBuckets] = useState([]);
+  const [windowTotals, setWindowTotals] = useState([]);
   const [timeRange, setTimeRange] = useState("day");
   const [selectedDate, setSelectedDate] = useState(new Date());
   const [isCollapsed, setIsCollapsed] = useState(true);
@@ -52,41 +79,110 @@ const TeamActivity = () => {
   const [currentActivities, setCurrentActivities] = useState([]);
   const [activityType, setActivityType] = useState(0);
 
-  const { year, month } = useMemo(
-    () => ({
-      year: selectedDate.getFullYear(),
-      month: selectedDate.getMonth() + 1,
-    }),
-    [selectedDate]
-  );
+  // Date range and bucket size of the selected period
+  const period = useMemo(() => {
+    const start = new Date(selectedDate);
+    start.setHours(0, 0, 0, 0);
+    if (timeRange === "week") {
+      start.setDate(start.getDate() - start.getDay());
+    } else if (timeRange === "month") {
+      start.setDate(1);
+    }
+    const end = new Date(start);
+    if (timeRange === "day") {
+      end.setDate(start.getDate() + 1);
+    } else if (timeRange === "week") {
+      end.setDate(start.getDate() + 7);
+    } else {
+      end.setMonth(start.getMonth() + 1);
+    }
+    return {
+      from: start.getTime(),
+      to: end.getTime(),
+      granularity: timeRange === "day" ? "hour" : "day",
+    };
+  }, [selectedDate, timeRange]);
+
+  // Sync cursor of the buckets shown, and the period they belong to
+  const sync = useRef({ period: null, cursor: null });
 
-  const fetchTeamEvents = useCallback(async () => {
+  // Per-user buckets are aggregated by the server, not built from raw events
+  const fetchTeamBuckets = useCallback(async () => {
     try {
-      const res = await axios.get(
-        `${SERVER_API_PATH}/events/team?year=${year}&month=${month}`
-      );
-      setEvents(res.data);
+      const res = await axios.get(`${SERVER_API_PATH}/events/team/buckets`, {
+        params: { ...period, tz: TIMEZONE },
+      });
+      sync.current = { period, cursor: res.headers["x-sync-cursor"] };
+      setBuckets(res.data.buckets);
+    } catch (err) {
+      console.error(err);
+    }
+  }, [period]);
+
+  const fetchWindowTotals = useCallback(async () => {
+    if (!selectedUser) {
+      setWindowTotals([]);
+      return;
+    }
+    try {
+      const res = await axios.get(`${SERVER_API_PATH}/events/team/buckets`, {
+        params: { ...period, tz: TIMEZONE, username: selectedUser, windows: 1 },
+      });
+      setWindowTotals(res.data.windows || []);
     } catch (err) {
       console.error(err);
     }
-  }, [year, month]);
+  }, [period, selectedUser]);
 
   useEffect(() => {
-    const timer = setTimeout(fetchTeamEvents, 500);
+    const timer = setTimeout(() => {
+      fetchTeamBuckets();
+      fetchWindowTotals();
+    }, 500);
     return () => {
       if (timer) clearTimeout(timer);
     };
-  }, [fetchTeamEvents]);
+  }, [fetchTeamBuckets, fetchWindowTotals]);
+
+  // Polls only ask for what changed since the last response, an unchanged
+  // poll is answered with 304 through the browser cache
+  const pollTeamBuckets = useCallback(async () => {
+    const { period: syncedPeriod, cursor } = sync.current;
+    if (syncedPeriod !== period || !cursor) {
+      fetchTeamBuckets();
+      fetchWindowTotals();
+      return;
+    }
+    try {
+      const res = await axios.get(`${SERVER_API_PATH}/events/team/buckets`, {
+        params: { ...period, tz: TIMEZONE, since: cursor },
+      });
+      // The period changed while this poll was running
+      if (sync.current.period !== period) return;
+      sync.current = {
+        period,
+        cursor: res.headers["x-sync-cursor"] || cursor,
+      };
+      if (res.data.changes.length === 0) return;
+      setBuckets((current) => mergeBuckets(current, res.data));
+      if (res.data.changes.some((change) => change.username === selectedUser)) {
+        fetchWindowTotals();
+      }
+    } catch (err) {
+      console.error(err);
+    }
+  }, [period, selectedUser, fetchTeamBuckets, fetchWindowTotals]);
 
   useEffect(() => {
-    const interval = setInterval(fetchTeamEvents, 10 * 60 * 1000);
+    const interval = setInterval(pollTeamBuckets, 60 * 1000);
     return () => clearInterval(interval);
-  }, [fetchTeamEvents]);
+  }, [pollTeamBuckets]);
 
   const users = useMemo(() => {
-    const uniqueUsers = new Set(events.map((event) => event.username));
+    const uniqueUsers = new Set(buckets.map((bucket) => bucket.username));
+    if (selectedUser) uniqueUsers.add(selectedUser);
     return Array.from(uniqueUsers).sort();
-  }, [events]);
+  }, [buckets, selectedUser]);
 
   const chartData = useMemo(() => {
     const now = new Date(selectedDate);
@@ -95,7 +191,6 @@ const TeamActivity = () => {
     let userTotals = {};
 
     let weekStart = null;
-    let weekEnd = null;
 
     if (timeRange === "day") {
       for (let i = 0; i < 24; i++) {
@@ -118,62 +213,29 @@ const TeamActivity = () => {
       }
     }
 
-    if (timeRange === "week") {
-      weekStart = new Date(now);
-      weekStart.setDate(now.getDate() - now.getDay());
-      weekStart.setHours(0);
-      weekStart.setMinutes(0);
-      weekStart.setSeconds(0);
-      weekEnd = new Date(weekStart);
-      weekEnd.setDate(weekStart.getDate() + 6);
-      weekEnd.setHours(23);
-      weekEnd.setMinutes(59);
-      weekEnd.setSeconds(59);
-    }
-
+    // Buckets only cover the selected period, see `period`
     const userEvents = {};
-    events.forEach((event) => {
-      if (!userEvents[event.username]) {
-        userEvents[event.username] = Array(labels.length).fill(0);
-        userTotals[event.username] = 0;
+    buckets.forEach((bucket) => {
+      if (!userEvents[bucket.username]) {
+        userEvents[bucket.username] = Array(labels.length).fill(0);
+        userTotals[bucket.username] = 0;
       }
 
-      const eventDate = new Date(event.dt);
+      const bucketDate = new Date(bucket.t);
       let index;
 
       if (timeRange === "day") {
-        if (
-          now.getDate() === eventDate.getDate() &&
-          now.getMonth() === eventDate.getMonth()
-        ) {
-          index = eventDate.getHours();
-        }
+        index = bucketDate.getHours();
       } else if (timeRange === "week") {
-        if (eventDate >= weekStart && eventDate <= weekEnd) {
-          index = eventDate.getDay();
-        } else {
-          return;
-        }
+        index = bucketDate.getDay();
       } else if (timeRange === "month") {
-        if (
-          now.getMonth() === eventDate.getMonth() &&
-          now.getFullYear() === eventDate.getFullYear()
-        ) {
-          index = eventDate.getDate() - 1;
-        }
+        index = bucketDate.getDate() - 1;
       }
 
       if (index >= 0 && index < labels.length) {
-        if (activityType === 0) {
-          userEvents[event.username][index]++;
-          userTotals[event.username]++;
-        } else if (activityType === 1 && !BANNED_APPS.includes(event.window)) {
-          userEvents[event.username][index]++;
-          userTotals[event.username]++;
-        } else if (activityType === 2 && BANNED_APPS.includes(event.window)) {
-          userEvents[event.username][index]++;
-          userTotals[event.username]++;
-        }
+        const minutes = [bucket.total, bucket.work, bucket.relax][activityType];
+        userEvents[bucket.username][index] += minutes;
+        userTotals[bucket.username] += minutes;
       }
     });
 
@@ -199,54 +261,19 @@ const TeamActivity = () => {
       datasets,
       userTotals,
     };
-  }, [events, timeRange, selectedDate, activityType]);
+  }, [buckets, timeRange, selectedDate, activityType]);
 
   const activityDetails = useMemo(() => {
     if (!selectedUser) return [];
 
-    const now = new Date(selectedDate);
-    const userEvents = events.filter((event) => {
-      if (event.username !== selectedUser) return false;
-
-      const eventDate = new Date(event.dt);
-
-      if (timeRange === "day") {
-        return (
-          now.getDate() === eventDate.getDate() &&
-          now.getMonth() === eventDate.getMonth() &&
-          now.getFullYear() === eventDate.getFullYear()
-        );
-      } else if (timeRange === "week") {
-        const weekStart = new Date(now);
-        weekStart.setDate(now.getDate() - now.getDay());
-        const weekEnd = new Date(weekStart);
-        weekEnd.setDate(weekStart.getDate() + 6);
-
-        return eventDate >= weekStart && eventDate <= weekEnd;
-      } else if (timeRange === "month") {
-        return (
-          now.getMonth() === eventDate.getMonth() &&
-          now.getFullYear() === eventDate.getFullYear()
-        );
-      }
-      return false;
-    });
-
-    const details = {};
-    userEvents.forEach((event) => {
-      if (event.window && !HIDDEN_APPS.includes(event.window)) {
-        details[event.window] = (details[event.window] || 0) + 1;
-      }
-    });
-
-    return Object.entries(details)
-      .map(([key, value]) => ({
-        key,
-        value,
-        type: BANNED_APPS.includes(key) ? "banned" : "normal",
-      }))
-      .sort((a, b) => b.value - a.value);
-  }, [events, selectedUser, selectedDate, timeRange]);
+    return windowTotals
+      .filter(({ window }) => window && !HIDDEN_APPS.includes(window))
+      .map(({ window, minutes }) => ({
+        key: window,
+        value: Math.round(minutes),
+        type: BANNED_APPS.includes(window) ? "banned" : "normal",
+      }));
+  }, [windowTotals, selectedUser]);
 
   const handlePrevPeriod = useCallback(() => {
     const newDate = new Date(selectedDate);
@@ -300,10 +327,47 @@ const TeamActivity = () => {
     }
   }, []);
 
+  // Presence changes are pushed over Server-Sent Events; polling is only
+  // used while the stream is down or unsupported
   useEffect(() => {
-    fetchCurrentActivities();
-    const interval = setInterval(fetchCurrentActivities, 3 * 60 * 1000);
-    return () => clearInterval(interval);
+    let interval = null;
+    const startPolling = () => {
+      if (interval) return;
+      fetchCurrentActivities();
+      interval = setInterval(fetchCurrentActivities, 3 * 60 * 1000);
+    };
+    const stopPolling = () => {
+      if (interval) clearInterval(interval);
+      interval = null;
+    };
+
+    const token = localStorage.getItem("token");
+    if (!window.EventSource || !token) {
+      startPolling();
+      return stopPolling;
+    }
+
+    const source = new EventSource(
+      `${SERVER_API_PATH}/events/team/stream?token=${encodeURIComponent(token)}`
+    );
+    source.addEventListener("snapshot", (e) => {
+      stopPolling();
+      setCurrentActivities(JSON.parse(e.data));
+    });
+    source.addEventListener("presence", (e) => {
+      const entry = JSON.parse(e.data);
+      setCurrentActivities((activities) =>
+        [...activities.filter((item) => item.username !== entry.username), entry]
+          .sort((a, b) => (a.username < b.username ? -1 : 1))
+      );
+    });
+    // EventSource reconnects by itself and gets a fresh snapshot
+    source.onerror = startPolling;
+
+    return () => {
+      source.close();
+      stopPolling();
+    };
   }, [fetchCurrentActivities]);
 
   const formatTimeDiff = useCallback((date) => {
@@ -404,7 +468,7 @@ const TeamActivity = () => {
                       style={{ color: colors[index] }}
                       title={username}
                     >
-                      {Math.floor(total / 60)}h {total % 60}m
+                      {Math.floor(total / 60)}h {Math.round(total % 60)}m
                     </div>
                   )
                 )}
@@ -0,0 +1,36 @@
+import { BANNED_APPS } from "../contants";
+
+// Split the minute an event stands for across the windows it was spent in.
+// Events without a dwell histogram count as one minute in `window`.
+export const eventWindowMinutes = (event) => {
+  const windows = event.windows || [];
+  const total = windows.reduce((sum, item) => sum + item.seconds, 0);
+  if (!total) return [{ window: event.window, minutes: 1 }];
+  return windows.map((item) => ({
+    window: item.window,
+    minutes: item.seconds / total,
+  }));
+};
+
+// Work and relax minutes of one event
+export const eventWorkRelax = (event) => {
+  let work = 0;
+  let relax = 0;
+  eventWindowMinutes(event).forEach(({ window, minutes }) => {
+    if (BANNED_APPS.includes(window)) relax += minutes;
+    else work += minutes;
+  });
+  return { work, relax };
+};
+
+// Apply the events of a ?since response: a changed minute replaces the
+// event with the same user and time
+export const mergeEvents = (current, changed, descending = false) => {
+  if (!changed.length) return current;
+  const key = (event) => `${event.username}\u0000${new Date(event.dt).getTime()}`;
+  const merged = new Map(current.map((event) => [key(event), event]));
+  changed.forEach((event) => merged.set(key(event), event));
+  return Array.from(merged.values()).sort((a, b) =>
+    descending ? new Date(b.dt) - new Date(a.dt) : new Date(a.dt) - new Date(b.dt)
+  );
+};
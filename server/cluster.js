@@ -0,0 +1,160 @@
+require("dotenv").config();
+const cluster = require("cluster");
+const os = require("os");
+const path = require("path");
+
+// Run server.js in several worker processes:
+//   CLUSTER_WORKERS         total workers (default: one per CPU)
+//   CLUSTER_INGEST_WORKERS  how many of them only serve client ingest on
+//                           INGEST_PORT (default 0: all workers serve
+//                           everything on PORT)
+// The rollup timer runs in one worker only (a JobState lease keeps runs
+// started elsewhere, e.g. by an admin, from overlapping). SIGHUP restarts the workers one
+// at a time, each replacement listening before the old one drains and
+// exits. Presence updates and ingest stats are relayed between workers
+// (services/clusterBus.js).
+
+const PORT = Number(process.env.PORT) || 3000;
+const INGEST_PORT = Number(process.env.INGEST_PORT) || PORT + 1;
+const WORKERS = Math.max(1, Number(process.env.CLUSTER_WORKERS) || os.cpus().length);
+const INGEST_WORKERS = Math.min(
+  Math.max(0, Number(process.env.CLUSTER_INGEST_WORKERS) || 0),
+  WORKERS - 1
+);
+// Whole-cluster ingest queue bound, split between the workers
+const QUEUE_MAX = Number(process.env.INGEST_QUEUE_MAX) || 50000;
+// Longest wait for a worker to drain its ingest queue and exit
+const STOP_TIMEOUT_MS = 30 * 1000;
+// Replacements for crashed workers back off up to this long
+const MAX_RESPAWN_DELAY_MS = 60 * 1000;
+// A worker that lived this long resets its slot's crash backoff
+const STABLE_MS = 60 * 1000;
+
+// setupMaster before Node 16
+(cluster.setupPrimary || cluster.setupMaster).call(cluster, {
+  exec: path.join(__dirname, "server.js"),
+});
+
+// One slot per configured worker: { role, port, jobs, worker, crashes }
+const slots = Array.from({ length: WORKERS }, (_, index) => {
+  const role = index < INGEST_WORKERS ? "ingest" : INGEST_WORKERS ? "query" : "all";
+  return {
+    index,
+    role,
+    port: role === "ingest" ? INGEST_PORT : PORT,
+    // Background jobs in the first worker that serves queries
+    jobs: index === INGEST_WORKERS,
+    worker: null,
+    crashes: 0,
+  };
+});
+let stopping = false;
+let restarting = false;
+
+const fork = (slot) => {
+  const worker = cluster.fork({
+    WORKER_ROLE: slot.role,
+    PORT: String(slot.port),
+    ROLLUP_DISABLED: slot.jobs ? process.env.ROLLUP_DISABLED || "" : "1",
+    INGEST_QUEUE_MAX: String(Math.ceil(QUEUE_MAX / WORKERS)),
+  });
+  worker.slot = slot;
+  worker.startedAt = Date.now();
+  slot.worker = worker;
+  return worker;
+};
+
+// Relay bus messages to every other worker
+cluster.on("message", (worker, message) => {
+  if (!message || !message.bus) return;
+  Object.values(cluster.workers).forEach((other) => {
+    if (other !== worker && other.isConnected()) other.send(message);
+  });
+});
+
+cluster.on("exit", (worker, code, signal) => {
+  const { slot } = worker;
+  if (stopping || worker.retired || slot.worker !== worker) return;
+  if (Date.now() - worker.startedAt >= STABLE_MS) slot.crashes = 0;
+  const delay = Math.min(MAX_RESPAWN_DELAY_MS, 1000 * 2 ** slot.crashes);
+  slot.crashes += 1;
+  console.error(
+    `Worker ${worker.id} (${slot.role}) exited with ${signal || code}, restarting in ${delay}ms`
+  );
+  slot.worker = null;
+  setTimeout(() => {
+    if (!stopping && !slot.worker) fork(slot);
+  }, delay);
+});
+
+const waitFor = (worker, event, timeoutMs) =>
+  new Promise((resolve) => {
+    const timer = setTimeout(() => resolve(false), timeoutMs);
+    worker.once(event, () => {
+      clearTimeout(timer);
+      resolve(true);
+    });
+  });
+
+// SIGTERM lets server.js drain its ingest queue; kill it if it hangs
+const stopWorker = async (worker) => {
+  worker.retired = true;
+  if (worker.isDead()) return;
+  const exited = waitFor(worker, "exit", STOP_TIMEOUT_MS);
+  worker.process.kill("SIGTERM");
+  if (!(await exited)) {
+    console.error(`Worker ${worker.id} did not exit, killing it`);
+    worker.process.kill("SIGKILL");
+  }
+};
+
+// Replace workers one at a time so the port is never left unserved. The
+// jobs worker is stopped before its replacement starts, unless it is the
+// only worker on its port (the rollup lease keeps the two runs apart).
+const rollingRestart = async () => {
+  if (restarting || stopping) return;
+  restarting = true;
+  console.log("Rolling restart started");
+  for (const slot of slots) {
+    if (stopping) break;
+    const old = slot.worker;
+    const stopFirst =
+      old && slot.jobs && slots.some((other) => other !== slot && other.port === slot.port);
+    if (old) old.retired = true;
+    if (stopFirst) await stopWorker(old);
+    const replacement = fork(slot);
+    if (!(await waitFor(replacement, "listening", STOP_TIMEOUT_MS))) {
+      console.error(`Worker ${replacement.id} did not start listening, stopping restart`);
+      if (old && !stopFirst) {
+        // Keep the old worker serving
+        await stopWorker(replacement);
+        old.retired = false;
+        slot.worker = old;
+      }
+      break;
+    }
+    if (old && !stopFirst) await stopWorker(old);
+  }
+  restarting = false;
+  console.log("Rolling restart finished");
+};
+
+const shutdown = async (signal) => {
+  if (stopping) return;
+  stopping = true;
+  console.log(`${signal} received, stopping workers`);
+  await Promise.all(Object.values(cluster.workers).map(stopWorker));
+  process.exit(0);
+};
+
+slots.forEach(fork);
+console.log(
+  `Cluster primary ${process.pid}: ${WORKERS} workers` +
+    (INGEST_WORKERS
+      ? ` (${INGEST_WORKERS} ingest on port ${INGEST_PORT}, ${WORKERS - INGEST_WORKERS} query on port ${PORT})`
+      : ` on port ${PORT}`)
+);
+
+process.on("SIGHUP", () => rollingRestart());
+process.once("SIGTERM", () => shutdown("SIGTERM"));
+process.once("SIGINT", () => shutdown("SIGINT"));
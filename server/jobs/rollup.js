@@ -0,0 +1,409 @@
+const os = require("os");
+const mongoose = require("mongoose");
+const Event = require("../models/Event");
+const EventDay = require("../models/EventDay");
+const Achieve = require("../models/Achieve");
+const JobState = require("../models/JobState");
+const { eventWindowMinutes, eventWorkRelax } = require("../utils/activity");
+const eventStore = require("../services/eventStore");
+const responseCache = require("../services/responseCache");
+
+const JOB_NAME = "achieve-rollup";
+
+// Raw events merged into Achieve per bulkWrite
+const CHUNK_SIZE = Number(process.env.ROLLUP_CHUNK_SIZE) || 5000;
+// Events younger than this are left for the next run, so inserts still in
+// flight when the run starts cannot end up behind the watermark
+const SETTLE_MS = 2 * 60 * 1000;
+const INTERVAL_MS = (Number(process.env.ROLLUP_INTERVAL_MINUTES) || 15) * 60 * 1000;
+// A run holds a lease on the job in JobState, renewed with every chunk, so
+// runs in different processes (the jobs worker's timer, POST
+// /api/achieve/rollup in any worker) never overlap; a crashed holder's
+// lease expires after this long
+const LEASE_MS = 10 * 60 * 1000;
+// Rolled-up raw events older than this many days are deleted, 0 keeps them
+const RETENTION_DAYS =
+  process.env.EVENT_RETENTION_DAYS !== undefined
+    ? Number(process.env.EVENT_RETENTION_DAYS)
+    : 90;
+
+const hourStart = (dt) => {
+  const date = new Date(dt);
+  date.setMinutes(0, 0, 0);
+  return date;
+};
+
+let leaseOwner = "";
+let runs = 0;
+
+// Take the lease if it is free or expired; false if another run holds it
+const acquireLease = async () => {
+  await JobState.updateOne(
+    { name: JOB_NAME },
+    { $setOnInsert: { name: JOB_NAME } },
+    { upsert: true }
+  );
+  runs += 1;
+  const owner = `${os.hostname()}:${process.pid}:${runs}`;
+  const now = new Date();
+  const state = await JobState.findOneAndUpdate(
+    {
+      name: JOB_NAME,
+      $or: [{ leaseUntil: null }, { leaseUntil: { $lte: now } }],
+    },
+    {
+      $set: {
+        leaseOwner: owner,
+        leaseUntil: new Date(now.getTime() + LEASE_MS),
+      },
+    },
+    { new: true }
+  );
+  if (!state) return null;
+  leaseOwner = owner;
+  return state;
+};
+
+// Extend the lease before each chunk; a run that lost it (e.g. stalled
+// past LEASE_MS) stops instead of writing alongside the new holder
+const renewLease = async () => {
+  const result = await JobState.updateOne(
+    { name: JOB_NAME, leaseOwner },
+    { $set: { leaseUntil: new Date(Date.now() + LEASE_MS) } }
+  );
+  if (result.matchedCount === 0) throw new Error("Rollup lease lost");
+};
+
+const releaseLease = async () => {
+  const owner = leaseOwner;
+  leaseOwner = "";
+  await JobState.updateOne(
+    { name: JOB_NAME, leaseOwner: owner },
+    { $set: { leaseOwner: "", leaseUntil: null } }
+  ).catch(() => {});
+};
+
+const groupKey = (username, dt) => `${username}\u0000${dt.getTime()}`;
+
+// Drop cached responses that read the Achieve hours of `groups`
+const invalidateHours = (groups) => {
+  const hours = [...groups].map((group) => group.dt.getTime());
+  if (hours.length === 0) return;
+  responseCache.invalidate(
+    "rollups",
+    Math.min(...hours),
+    Math.max(...hours) + 60 * 60 * 1000
+  );
+};
+
+// Totals per user and hour for one chunk of raw events
+const groupChunk = (events) => {
+  const groups = new Map();
+  events.forEach((event) => {
+    const dt = hourStart(event.dt);
+    const key = groupKey(event.username, dt);
+    let group = groups.get(key);
+    if (!group) {
+      group = {
+        username: event.username,
+        dt,
+        work: 0,
+        relax: 0,
+        windows: new Map(),
+      };
+      groups.set(key, group);
+    }
+    const { work, relax } = eventWorkRelax(event);
+    group.work += work;
+    group.relax += relax;
+    eventWindowMinutes(event).forEach(({ window, minutes }) => {
+      group.windows.set(window, (group.windows.get(window) || 0) + minutes);
+    });
+  });
+  return groups;
+};
+
+// Merge one chunk into Achieve. Rows already stamped with this chunk's
+// rollupId were written before a restart and are skipped, which makes
+// replaying a chunk after a crash harmless, as long as the replay covers
+// exactly the same events (see replayPending).
+const applyChunk = async (events, rollupId) => {
+  const groups = groupChunk(events);
+  const usernames = [...new Set(events.map((event) => event.username))];
+  const hours = [...groups.values()].map((group) => group.dt.getTime());
+
+  const existing = await Achieve.find({
+    username: { $in: usernames },
+    dt: { $gte: new Date(Math.min(...hours)), $lte: new Date(Math.max(...hours)) },
+  }).lean();
+  const rows = new Map(
+    existing.map((row) => [groupKey(row.username, row.dt), row])
+  );
+
+  const ops = [];
+  groups.forEach((group, key) => {
+    const row = rows.get(key);
+    if (row && row.rollupId === rollupId) return;
+
+    const windows = new Map(
+      ((row && row.windows) || []).map((item) => [item.window, item.total])
+    );
+    group.windows.forEach((minutes, window) => {
+      windows.set(window, (windows.get(window) || 0) + minutes);
+    });
+    ops.push({
+      updateOne: {
+        filter: { username: group.username, dt: group.dt },
+        update: {
+          $set: {
+            work: (row ? row.work : 0) + group.work,
+            relax: (row ? row.relax : 0) + group.relax,
+            windows: [...windows.entries()]
+              .sort((a, b) => b[1] - a[1])
+              .map(([window, total]) => ({ window, total })),
+            rollupId,
+          },
+        },
+        upsert: true,
+      },
+    });
+  });
+
+  if (ops.length > 0) {
+    await Achieve.bulkWrite(ops, { ordered: false });
+    invalidateHours(groups.values());
+  }
+  return ops.length;
+};
+
+// Rewrite the Achieve rows of whole EventDay documents. A day document
+// always holds the complete day, so its hours are replaced rather than
+// added to and re-reading a day after it changed is harmless.
+const applyDays = async (docs) => {
+  const ops = [];
+  const written = [];
+  docs.forEach((doc) => {
+    groupChunk(eventStore.dayToEvents(doc)).forEach((group) => {
+      written.push(group);
+      ops.push({
+        updateOne: {
+          filter: { username: group.username, dt: group.dt },
+          update: {
+            $set: {
+              work: group.work,
+              relax: group.relax,
+              windows: [...group.windows.entries()]
+                .sort((a, b) => b[1] - a[1])
+                .map(([window, total]) => ({ window, total })),
+              rollupId: "day",
+            },
+          },
+          upsert: true,
+        },
+      });
+    });
+  });
+
+  if (ops.length > 0) {
+    await Achieve.bulkWrite(ops, { ordered: false });
+    invalidateHours(written);
+  }
+  return ops.length;
+};
+
+const EVENT_FIELDS = "username dt window windows";
+
+// Persist the end of a chunk before merging it, so a crash between the
+// Achieve writes and the watermark update can be replayed exactly; a
+// chunk re-read after a crash could hold more events and so get another
+// rollupId, adding hours that were already written a second time.
+const mergeChunk = async (
+  events,
+  stats,
+  last = events[events.length - 1]._id
+) => {
+  await renewLease();
+  await JobState.updateOne({ name: JOB_NAME }, { $set: { pendingTo: last } });
+  stats.rows += await applyChunk(events, String(last));
+  await JobState.updateOne(
+    { name: JOB_NAME },
+    { $set: { watermark: last, pendingTo: null } }
+  );
+  stats.events += events.length;
+  stats.chunks += 1;
+  return last;
+};
+
+// Finish the chunk a crashed run left pending: the events after the
+// watermark up to its recorded end, with its original rollupId
+const replayPending = async (state, stats) => {
+  const range = { $lte: state.pendingTo };
+  if (state.watermark) range.$gt = state.watermark;
+  const events = await Event.find({ _id: range })
+    .sort({ _id: 1 })
+    .select(EVENT_FIELDS)
+    .lean();
+  if (events.length === 0) {
+    await JobState.updateOne(
+      { name: JOB_NAME },
+      { $set: { watermark: state.pendingTo, pendingTo: null } }
+    );
+    return state.pendingTo;
+  }
+  // Keyed by the recorded end, so the rollupId of the interrupted merge
+  return mergeChunk(events, stats, state.pendingTo);
+};
+
+const retentionCutoff = () =>
+  new Date(Date.now() - RETENTION_DAYS * 24 * 60 * 60 * 1000);
+
+// Delete raw events that are both rolled up and past the retention period
+const applyRetention = async (watermark) => {
+  if (!RETENTION_DAYS || !watermark) return 0;
+  const cutoff = retentionCutoff();
+  const result = await Event.deleteMany({
+    _id: { $lte: watermark },
+    dt: { $lt: cutoff },
+  });
+  if (result.deletedCount) responseCache.invalidate("events", 0, cutoff);
+  return result.deletedCount;
+};
+
+// Delete day documents that ended before the retention period, once
+// their last change is rolled up (or, while both layouts are written,
+// once the minute events are)
+const applyDayRetention = async (watermarkAt) => {
+  if (!RETENTION_DAYS || !eventStore.writesDays) return 0;
+  const cutoff = eventStore.dayStart(retentionCutoff());
+  const filter = { day: { $lt: cutoff } };
+  if (eventStore.readsDays) {
+    if (!watermarkAt) return 0;
+    filter.updatedAt = { $lte: watermarkAt };
+  }
+  const result = await EventDay.deleteMany(filter);
+  if (result.deletedCount) responseCache.invalidate("events", 0, cutoff);
+  return result.deletedCount;
+};
+
+// Roll up EventDay documents changed since the watermark, in updatedAt
+// order; returns the new watermark
+const rollupDays = async (watermarkAt, stats) => {
+  const range = { $lt: new Date(Date.now() - SETTLE_MS) };
+  if (watermarkAt) range.$gt = watermarkAt;
+
+  const cursor = EventDay.find({ updatedAt: range })
+    .sort({ updatedAt: 1 })
+    .lean()
+    .cursor({ batchSize: 100 });
+
+  let chunk = [];
+  let minutes = 0;
+  const flush = async () => {
+    await renewLease();
+    stats.rows += await applyDays(chunk);
+    watermarkAt = chunk[chunk.length - 1].updatedAt;
+    await JobState.updateOne({ name: JOB_NAME }, { $set: { watermarkAt } });
+    stats.events += minutes;
+    stats.chunks += 1;
+    chunk = [];
+    minutes = 0;
+  };
+
+  for await (const doc of cursor) {
+    chunk.push(doc);
+    minutes += eventStore.countMinutes(doc);
+    if (minutes >= CHUNK_SIZE) await flush();
+  }
+  if (chunk.length > 0) await flush();
+  return watermarkAt;
+};
+
+const finishRun = async (stats) => {
+  await JobState.updateOne(
+    { name: JOB_NAME },
+    { $set: { lastRunAt: new Date(), lastError: "", stats } }
+  );
+  if (stats.events || stats.deleted) {
+    console.log("Rollup finished:", stats);
+  }
+  return stats;
+};
+
+let running = false;
+
+// Fold raw events inserted since the watermark into hourly Achieve rows,
+// streaming them in insertion order (or, with EVENT_STORAGE=day, the day
+// documents changed since then), then apply the retention policy.
+// Returns the run's stats, or null if a run is already in progress (here
+// or in another process) or failed.
+const runRollup = async () => {
+  if (running) return null;
+  running = true;
+  const stats = { events: 0, chunks: 0, rows: 0, deleted: 0 };
+  try {
+    // Upserts rely on the unique Achieve index; if it could not be built
+    // (an old database, see scripts/migrateAchieveIndex.js) this throws
+    await Achieve.init();
+    const state = await acquireLease();
+    if (!state) return null;
+    if (eventStore.readsDays) {
+      const watermarkAt = await rollupDays(state.watermarkAt, stats);
+      stats.deleted = await applyDayRetention(watermarkAt);
+      return await finishRun(stats);
+    }
+    let watermark = state.watermark;
+    if (state.pendingTo) watermark = await replayPending(state, stats);
+
+    const settled = mongoose.Types.ObjectId.createFromTime(
+      Math.floor((Date.now() - SETTLE_MS) / 1000)
+    );
+    const range = { $lt: settled };
+    if (watermark) range.$gt = watermark;
+
+    const cursor = Event.find({ _id: range })
+      .sort({ _id: 1 })
+      .select(EVENT_FIELDS)
+      .lean()
+      .cursor({ batchSize: 1000 });
+
+    let chunk = [];
+    const flush = async () => {
+      watermark = await mergeChunk(chunk, stats);
+      chunk = [];
+    };
+
+    for await (const event of cursor) {
+      chunk.push(event);
+      if (chunk.length >= CHUNK_SIZE) await flush();
+    }
+    if (chunk.length > 0) await flush();
+
+    stats.deleted = await applyRetention(watermark);
+    stats.deleted += await applyDayRetention(null);
+    return await finishRun(stats);
+  } catch (err) {
+    console.error("Rollup error:", err);
+    await JobState.updateOne(
+      { name: JOB_NAME },
+      { $set: { lastRunAt: new Date(), lastError: err.message } }
+    ).catch(() => {});
+    return null;
+  } finally {
+    if (leaseOwner) await releaseLease();
+    running = false;
+  }
+};
+
+// Run once now and then every ROLLUP_INTERVAL_MINUTES
+const startRollup = () => {
+  runRollup();
+  return setInterval(runRollup, INTERVAL_MS);
+};
+
+module.exports = {
+  RETENTION_DAYS,
+  runRollup,
+  startRollup,
+  groupChunk,
+  hourStart,
+};
@@ -17,6 +17,14 @@ const auth = (req, res, next) => {
   }
 };
 
+// EventSource cannot send headers, so streams may pass the token as ?token=
+const streamAuth = (req, res, next) => {
+  if (!req.header("x-auth-token") && req.query.token) {
+    req.headers["x-auth-token"] = String(req.query.token);
+  }
+  auth(req, res, next);
+};
+
 const isAdmin = (req, res, next) => {
   if (req.user) {
     if (req.user.isAdmin) {
@@ -29,4 +37,4 @@ const isAdmin = (req, res, next) => {
   }
 };
 
-module.exports = { auth, isAdmin };
+module.exports = { auth, streamAuth, isAdmin };
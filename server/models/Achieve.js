@@ -15,14 +15,25 @@ const achieveSchema = new mongoose.Schema({
     default: 0,
   },
   windows: { type: Array, default: [] }, //  {window:"", total:0}
+  // Start of the hour this row totals
   dt: {
     type: Date,
     required: true,
     default: Date.now,
   },
+  // Last rollup chunk merged into this row, so a replayed chunk is skipped
+  rollupId: {
+    type: String,
+    default: "",
+  },
 });
 
-// Create index for efficient querying
-achieveSchema.index({ username: 1, dt: -1 });
+// One row per user and hour. Named, because it replaces the non-unique
+// index on the same keys that older databases have; drop that one with
+// npm run migrate:achieve-index.
+achieveSchema.index(
+  { username: 1, dt: -1 },
+  { unique: true, name: "username_dt_unique" }
+);
 
 module.exports = mongoose.model("Achieve", achieveSchema);
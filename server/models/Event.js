@@ -14,6 +14,12 @@ const eventSchema = new mongoose.Schema({
     type: String,
     default: "",
   },
+  // Seconds per foreground process within the minute, longest first;
+  // `window` holds the longest one
+  windows: {
+    type: [{ window: String, seconds: Number, _id: false }],
+    default: undefined,
+  },
   dt: {
     type: Date,
     required: true,
@@ -0,0 +1,42 @@
+const mongoose = require("mongoose");
+
+// One document per user per local day, instead of one Event per minute.
+// Written with the raw driver (see services/eventStore.js) so that
+// occupancy stays int32 for $bit.
+const eventDaySchema = new mongoose.Schema({
+  username: {
+    type: String,
+    required: true,
+  },
+  // Local midnight of the day
+  day: {
+    type: Date,
+    required: true,
+  },
+  // 1440-bit minute occupancy as 45 int32 words, bit (m % 32) of word
+  // floor(m / 32) is minute m
+  occupancy: {
+    type: [Number],
+    default: undefined,
+  },
+  // Window names of the day; slots refer to them by index
+  windows: {
+    type: [String],
+    default: [],
+  },
+  // Minute of the day -> [[window index, seconds], ...], longest first
+  slots: {
+    type: Object,
+    default: {},
+  },
+  // Last write, used by the rollup to find changed days
+  updatedAt: {
+    type: Date,
+    default: Date.now,
+  },
+});
+
+eventDaySchema.index({ username: 1, day: -1 }, { unique: true });
+eventDaySchema.index({ updatedAt: 1 });
+
+module.exports = mongoose.model("EventDay", eventDaySchema);
@@ -0,0 +1,49 @@
+const mongoose = require("mongoose");
+
+// Persisted progress of a background job, one document per job name
+const jobStateSchema = new mongoose.Schema({
+  name: {
+    type: String,
+    required: true,
+    unique: true,
+  },
+  // Last raw event (by _id) folded into the rollup
+  watermark: {
+    type: mongoose.Schema.Types.ObjectId,
+    default: null,
+  },
+  // Last raw event of the chunk being merged, set before its Achieve
+  // writes and cleared with the watermark; a run that finds it set
+  // replays exactly that chunk
+  pendingTo: {
+    type: mongoose.Schema.Types.ObjectId,
+    default: null,
+  },
+  // Last EventDay change (by updatedAt) folded into the rollup
+  watermarkAt: {
+    type: Date,
+    default: null,
+  },
+  // Process running the job and until when, see jobs/rollup.js
+  leaseOwner: {
+    type: String,
+    default: "",
+  },
+  leaseUntil: {
+    type: Date,
+    default: null,
+  },
+  lastRunAt: {
+    type: Date,
+  },
+  lastError: {
+    type: String,
+    default: "",
+  },
+  stats: {
+    type: Object,
+    default: {},
+  },
+});
+
+module.exports = mongoose.model("JobState", jobStateSchema);
@@ -1,98 +1,38 @@
 const express = require("express");
 const { auth, isAdmin } = require("../middleware/auth");
-const { BANNED_APPS } = require("../contants");
-const Event = require("../models/Event");
 const Achieve = require("../models/Achieve");
+const { runRollup } = require("../jobs/rollup");
 const router = express.Router();
 
-/** achieve events - only last months - admin */
-router.get("/", async (req, res) => {  //  , auth, isAdmin
+/** hourly rollups - admin; ?year&month (1-based) or ?from&to, optional ?username */
+router.get("/", auth, isAdmin, async (req, res) => {
   try {
-    const startDate = new Date(
-      new Date().getFullYear(),
-      new Date().getMonth(),
-      1
-    );
+    const { year, month, from, to, username } = req.query;
 
-    const events = await Event.find({ dt: { $lt: startDate } })
-      .sort({ dt: 1 })
-      .select("username dt window -_id");
+    let startDate;
+    let endDate;
+    if (year && month) {
+      startDate = new Date(year, month - 1, 1);
+      endDate = new Date(year, month, 1);
+    } else {
+      // Defaults to everything before the current month
+      startDate = from ? new Date(from) : new Date(0);
+      endDate = to
+        ? new Date(to)
+        : new Date(new Date().getFullYear(), new Date().getMonth(), 1);
+    }
+    if (isNaN(startDate.getTime()) || isNaN(endDate.getTime())) {
+      return res.status(400).json({ error: "Invalid date range" });
+    }
 
-    let data = [];
+    const filter = { dt: { $gte: startDate, $lt: endDate } };
+    if (username) filter.username = username;
+
+    const data = await Achieve.find(filter)
+      .sort({ dt: 1 })
+      .select("username dt work relax windows -_id")
+      .lean();
 
-    let _y = 0;
-    let _m = 0;
-    let _d = 0;
-    let _h = 0;
-    let y = 0;
-    let m = 0;
-    let d = 0;
-    let h = 0;
-    let defaultData = {
-      y: 0,
-      m: 0,
-      d: 0,
-      h: 0,
-      username: "",
-      work: 0,
-      relax: 0,
-      windows: [],
-    };
-    let _data = null;
-    let _windows = {};
-    events.forEach((event) => {
-      const eventDate = new Date(event.dt);
-      y = eventDate.getFullYear();
-      m = eventDate.getMonth();
-      d = eventDate.getDate();
-      h = eventDate.getHours();
-      const isBannedApp = BANNED_APPS.includes(event.window);
-      if (y === _y && m === _m && d === _d && h === _h) {
-        _data.work = _data.work + (isBannedApp ? 0 : 1);
-        _data.relax = _data.relax + (isBannedApp ? 1 : 0);
-        if (_windows[event.window]) _windows[event.window] += 1;
-        else _windows[event.window] = 1;
-      } else {
-        if (_data && Object.entries(_windows).length > 0) {
-          data.push({
-            ..._data,
-            windows: Object.entries(_windows).map(([window, total]) => ({
-              window,
-              total,
-            })),
-            dt: new Date(y, m, d, h),
-          });
-        }
-        _y = y;
-        _m = m;
-        _d = d;
-        _h = h;
-        _data = {
-          ...defaultData,
-          y,
-          m,
-          d,
-          h,
-          username: event.username,
-          work: isBannedApp ? 0 : 1,
-          relax: isBannedApp ? 1 : 0,
-        };
-        _windows = {};
-        _windows[event.window] = 1;
-      }
-    });
-    if (_data && Object.entries(_windows).length > 0) {
-      data.push({
-        ..._data,
-        windows: Object.entries(_windows).map(([window, total]) => ({
-          window,
-          total,
-        })),
-        dt: new Date(y, m, d, h),
-      });
-    }
-    // await Achieve.insertMany(data);
-    // await Event.deleteMany({ dt: { $lt: startDate } });
     res.send({ data });
   } catch (error) {
     console.log(error);
@@ -100,6 +40,18 @@ router.get("/", async (req, res) => {  //  , auth, isAdmin
   }
 });
 
+/** run the rollup now - admin; any worker may serve this, the rollup's
+ * JobState lease refuses it while a run is in progress in another one */
+router.post("/rollup", auth, isAdmin, async (req, res) => {
+  const stats = await runRollup();
+  if (!stats) {
+    return res
+      .status(409)
+      .json({ error: "Rollup already running or failed, see server log" });
+  }
+  res.json({ stats });
+});
+
 /** get achieved events for team */
 router.get("/teams", auth, async (req, res) => {
   res.send({ msg: "ok" });
@@ -1,91 +1,438 @@
+const crypto = require("crypto");
 const express = require("express");
 const router = express.Router();
 const Event = require("../models/Event");
-const { auth } = require("../middleware/auth");
+const { auth, streamAuth, isAdmin } = require("../middleware/auth");
+const Achieve = require("../models/Achieve");
+const EventDay = require("../models/EventDay");
+const { parseDwell } = require("../utils/activity");
+const {
+  GRANULARITIES,
+  MAX_RANGE_MS,
+  teamBucketsPipeline,
+  teamWindowsPipeline,
+  changedBucketsPipeline,
+} = require("../utils/buckets");
+const { RETENTION_DAYS } = require("../jobs/rollup");
+const presence = require("../services/presence");
+const eventStore = require("../services/eventStore");
+const ingestQueue = require("../services/ingestQueue");
+const clusterBus = require("../services/clusterBus");
+const responseCache = require("../services/responseCache");
+const { COMPACT_TYPE, decodeCompactBatch } = require("../utils/wireFormat");
+
+// Largest number of samples accepted in one batch upload
+const MAX_BATCH_SAMPLES = 1000;
+
+// Accept client timestamps up to this far ahead of the server clock
+const MAX_CLOCK_SKEW_MS = 5 * 60 * 1000;
+
+// Date from epoch ms or an ISO string, null if invalid
+const parseDate = (value) => {
+  if (!value) return null;
+  const date = new Date(/^\d+$/.test(value) ? Number(value) : value);
+  return isNaN(date.getTime()) ? null : date;
+};
+
+// Read routes return a sync cursor (epoch ms of the latest write the
+// response covers) in this header; passing it back as ?since= returns
+// only what was written after it
+const SYNC_CURSOR_HEADER = "X-Sync-Cursor";
+
+// JSON with a content-hash ETag and the sync cursor; a poll that finds
+// nothing new matches the client's If-None-Match and gets a 304
+const sendSynced = (req, res, body, cursor) => {
+  const json = JSON.stringify(body);
+  res.set({
+    ETag: `"${crypto.createHash("sha1").update(json).digest("base64")}"`,
+    "Cache-Control": "no-cache",
+    [SYNC_CURSOR_HEADER]: String(cursor),
+  });
+  if (req.fresh) return res.status(304).end();
+  res.type("json").send(json);
+};
+
+// Browsers may reuse a closed period for a day without asking; not
+// immutable, since late uploads and retention can still change it
+const CLOSED_CACHE_CONTROL = "private, max-age=86400";
+
+// Send the response for the period [from, to): built by `load` every
+// time while the period is open, from the response cache once it closed.
+// `sources` are the collections it reads, "events" and/or "rollups".
+const sendPeriod = async (req, res, { key, from, to, sources }, load) => {
+  const cursor = Date.now();
+  if (!responseCache.isClosed(to)) {
+    return sendSynced(req, res, await load(), cursor);
+  }
+  let entry = responseCache.get(key);
+  if (!entry) {
+    const startedAt = responseCache.generation();
+    const body = JSON.stringify(await load());
+    entry = responseCache.set(key, body, { from, to, sources, startedAt });
+  }
+  res.set({
+    ETag: entry.etag,
+    "Cache-Control": CLOSED_CACHE_CONTROL,
+    [SYNC_CURSOR_HEADER]: String(cursor),
+  });
+  if (req.fresh) return res.status(304).end();
+  res.type("json").send(entry.body);
+};
+
+// Resolve the sample time sent by the client (epoch ms), falling back to now
+const parseSampleTime = (value) => {
+  const now = Date.now();
+  const ms = Number(value);
+  if (!value || !Number.isFinite(ms) || ms <= 0 || ms > now + MAX_CLOCK_SKEW_MS) {
+    return new Date(now);
+  }
+  return new Date(ms);
+};
+
+// 503 with Retry-After when the ingest queue is full, clients back off
+const sendIngestError = (res, error, message) => {
+  if (error instanceof ingestQueue.QueueFullError) {
+    res.set("Retry-After", String(error.retryAfter));
+    return res.status(503).json({ error: error.message });
+  }
+  console.error(`${message}:`, error);
+  res.status(500).json({ error: "Failed to record activity" });
+};
 
 // Record activity when signal is received
 router.get("/", auth, async (req, res) => {
   try {
-    const { username = "", window = "" } = req.query;
+    const { username = "", window = "", windows, dt } = req.query;
 
     if (!username) {
       return res.status(400).json({ error: "Username is required" });
     }
 
-    // Save a single activity event
-    const event = new Event({
+    // Queue a single activity event, replayed minutes carry their own time
+    const dwell = parseDwell(windows);
+    const event = {
       username,
-      window,
+      window: typeof window === "string" ? window : "",
+      ...(dwell.length ? { windows: dwell } : {}),
       // eventType: "activity",
-      dt: new Date(),
-    });
+      dt: parseSampleTime(dt),
+    };
 
-    await event.save();
+    await ingestQueue.enqueue([event]);
+    presence.record(event.username, event.window, event.dt);
     res.status(200).json({ message: "Activity recorded" });
   } catch (error) {
-    console.error("Error recording activity:", error);
-    res.status(500).json({ error: "Failed to record activity" });
+    sendIngestError(res, error, "Error recording activity");
+  }
+});
+
+// Buffers compact batch bodies, leaves JSON ones to express.json
+const compactBody = express.raw({ type: COMPACT_TYPE, limit: "1mb" });
+
+// Body of a batch upload: plain JSON, or the compact format (gzip is
+// inflated by express.raw); null with a 4xx already sent otherwise
+const batchBody = (req, res) => {
+  if (Buffer.isBuffer(req.body)) {
+    try {
+      return decodeCompactBatch(req.body);
+    } catch (error) {
+      res.status(400).json({ error: "Invalid compact batch" });
+      return null;
+    }
+  }
+  if (!req.is("application/json")) {
+    res.status(415).json({ error: "Unsupported batch format" });
+    return null;
+  }
+  return req.body || {};
+};
+
+// Record many timestamped samples from one client through the ingest queue
+router.post("/batch", auth, compactBody, async (req, res) => {
+  try {
+    const body = batchBody(req, res);
+    if (!body) return;
+    const { username = "", samples } = body;
+
+    if (!username) {
+      return res.status(400).json({ error: "Username is required" });
+    }
+    if (!Array.isArray(samples) || samples.length === 0) {
+      return res.status(400).json({ error: "Samples are required" });
+    }
+    if (samples.length > MAX_BATCH_SAMPLES) {
+      return res
+        .status(413)
+        .json({ error: `At most ${MAX_BATCH_SAMPLES} samples per batch` });
+    }
+
+    const events = samples.map((sample) => {
+      const dwell = parseDwell(sample.windows);
+      return {
+        username,
+        window: typeof sample.window === "string" ? sample.window : "",
+        ...(dwell.length ? { windows: dwell } : {}),
+        dt: parseSampleTime(sample.dt),
+      };
+    });
+
+    await ingestQueue.enqueue(events);
+    presence.recordEvents(events);
+    res.status(200).json({ message: "Activity recorded", count: events.length });
+  } catch (error) {
+    sendIngestError(res, error, "Error recording activity batch");
+  }
+});
+
+// Ingest queue depth, throughput and flush latency (admin only); in
+// cluster mode also the latest stats of the other workers by worker id
+router.get("/ingest/stats", auth, isAdmin, (req, res) => {
+  const stats = ingestQueue.getStats();
+  if (clusterBus.inCluster) {
+    stats.worker = clusterBus.workerId;
+    stats.workers = clusterBus.sharedState("ingest");
   }
+  res.json(stats);
 });
 
-// Get team activities
+// Response cache size and hit rates (admin only)
+router.get("/cache/stats", auth, isAdmin, (req, res) => {
+  res.json(responseCache.getStats());
+});
+
+// Get team activities; with ?since only the events written after that
+// cursor (every minute of a changed day in EVENT_STORAGE=day mode)
 router.get("/team", auth, async (req, res) => {
   try {
     const { year, month } = req.query;
+    const since = parseDate(req.query.since);
 
     if (!year || !month) {
       return res.status(400).json({ error: "Year and month are required" });
     }
+    if (req.query.since && !since) {
+      return res.status(400).json({ error: "Invalid since cursor" });
+    }
 
     // Create date range for the selected month
     const startDate = new Date(year, month - 1, -7); // month is 1-based in query
-    const endDate = new Date(year, month, 7, 23, 59, 59); // last day of the month
+    const endDate = new Date(year, month, 8); // 7 days after the month
+
+    if (since) {
+      const { events, changedAt } = await eventStore.findChangedEvents({
+        from: startDate,
+        to: endDate,
+        since: since.getTime(),
+      });
+      return sendSynced(req, res, events, Math.max(since.getTime(), changedAt));
+    }
 
     // Get all events for all users in the specified month
-    const events = await Event.find({
-      dt: {
-        $gte: startDate,
-        $lte: endDate,
+    await sendPeriod(
+      req,
+      res,
+      {
+        key: `team:${startDate.getTime()}`,
+        from: startDate,
+        to: endDate,
+        sources: ["events"],
       },
-    })
-      .sort({ dt: 1 })
-      .select("username dt window -_id");
-
-    res.json(events);
+      () => eventStore.findEvents({ from: startDate, to: endDate })
+    );
   } catch (error) {
     console.error("Error fetching team events:", error);
     res.status(500).json({ error: "Failed to fetch team events" });
   }
 });
 
-// Get last event for each user (admin only)
-router.get("/team/current", auth, async (req, res) => {
+const isValidTimezone = (timezone) => {
   try {
-    // Get all unique users
-    const users = await Event.distinct("username");
-
-    // Get last event for each user within last 10 minutes
-    const tenMinutesAgo = new Date(Date.now() - 10 * 60 * 1000);
-    const currentActivities = await Promise.all(
-      users.map(async (username) => {
-        const lastEvent = await Event.findOne({
+    new Intl.DateTimeFormat("en-US", { timeZone: timezone });
+    return true;
+  } catch (err) {
+    return false;
+  }
+};
+
+// Per-user activity minutes per hour, day or week, aggregated in MongoDB.
+// ?from&to (epoch ms or ISO), ?granularity=hour|day|week, optional
+// ?username, ?windows=1 for per-window minutes and ?tz (IANA name) for
+// bucket boundaries, defaulting to the server's timezone. The range may
+// span at most 31 days for hours and 366 days for days or weeks.
+//
+// With ?since=<cursor> only the users whose activity changed are
+// returned: `changes` lists each of them with the first bucket that
+// changed, and `buckets` holds their recomputed buckets from there on,
+// which replace the client's. ?windows is ignored in that mode.
+router.get("/team/buckets", auth, async (req, res) => {
+  try {
+    const { granularity = "day", username, windows } = req.query;
+    const from = parseDate(req.query.from);
+    const to = parseDate(req.query.to);
+    const since = parseDate(req.query.since);
+    const timezone = req.query.tz || process.env.TZ || "UTC";
+
+    if (!from || !to || from >= to) {
+      return res.status(400).json({ error: "Valid from and to are required" });
+    }
+    if (!GRANULARITIES.includes(granularity)) {
+      return res.status(400).json({ error: "Invalid granularity" });
+    }
+    if (to - from > MAX_RANGE_MS[granularity]) {
+      return res.status(400).json({ error: "Date range is too long" });
+    }
+    if (!isValidTimezone(timezone)) {
+      return res.status(400).json({ error: "Invalid timezone" });
+    }
+    if (req.query.since && !since) {
+      return res.status(400).json({ error: "Invalid since cursor" });
+    }
+
+    // Raw events before the retention cutoff may already be deleted, their
+    // hours are read from the Achieve rollup instead
+    let rolledUpBefore = null;
+    if (RETENTION_DAYS) {
+      rolledUpBefore = new Date(Date.now() - RETENTION_DAYS * 24 * 60 * 60 * 1000);
+      rolledUpBefore.setMinutes(0, 0, 0);
+    }
+
+    const Source = eventStore.readsDays ? EventDay : Event;
+    const source = eventStore.readsDays ? "day" : "minute";
+    // Buckets come back as a cursor of plain documents, not one $facet
+    // document that would be capped at 16 MB
+    const aggregate = (pipeline, options) =>
+      Source.aggregate(
+        pipeline({
+          source,
+          to,
+          granularity,
+          timezone,
+          rolledUpBefore,
+          achieveCollection: Achieve.collection.name,
+          ...options,
+        })
+      ).allowDiskUse(true);
+
+    if (since) {
+      const changes = await Source.aggregate(
+        changedBucketsPipeline({
+          source,
+          changed: eventStore.changedSince(since.getTime()),
+          from,
+          to,
+          granularity,
+          timezone,
           username,
-          dt: { $gte: tenMinutesAgo },
         })
-          .sort({ dt: -1 })
-          .select("username window dt -_id");
+      );
+      let buckets = [];
+      if (changes.length > 0) {
+        // Recompute the changed users from their first changed bucket on
+        const firstChanged = new Map(
+          changes.map((change) => [change.username, change.from.getTime()])
+        );
+        const changed = await aggregate(teamBucketsPipeline, {
+          from: new Date(Math.max(from, Math.min(...firstChanged.values()))),
+          username: changes.map((change) => change.username),
+        });
+        buckets = changed.filter(
+          (bucket) => bucket.t.getTime() >= firstChanged.get(bucket.username)
+        );
+      }
+      const cursor = Math.max(
+        since.getTime(),
+        ...changes.map((change) => change.changedAt.getTime())
+      );
+      return sendSynced(
+        req,
+        res,
+        {
+          granularity,
+          from,
+          to,
+          changes: changes.map((change) => ({
+            username: change.username,
+            from: change.from,
+          })),
+          buckets,
+        },
+        cursor
+      );
+    }
 
-        return lastEvent || { username, window: null, dt: null };
-      })
+    const withWindows = windows === "1";
+    await sendPeriod(
+      req,
+      res,
+      {
+        key: [
+          "buckets",
+          granularity,
+          timezone,
+          from.getTime(),
+          to.getTime(),
+          username || "",
+          withWindows ? "windows" : "",
+        ].join(":"),
+        from,
+        to,
+        sources: ["events", "rollups"],
+      },
+      async () => {
+        const [buckets, windowTotals] = await Promise.all([
+          aggregate(teamBucketsPipeline, { from, username }),
+          withWindows ? aggregate(teamWindowsPipeline, { from, username }) : null,
+        ]);
+        return {
+          granularity,
+          from,
+          to,
+          buckets,
+          ...(windowTotals ? { windows: windowTotals } : {}),
+        };
+      }
     );
+  } catch (error) {
+    console.error("Error fetching team buckets:", error);
+    res.status(500).json({ error: "Failed to fetch team buckets" });
+  }
+});
 
-    res.json(currentActivities);
+// Get last event for each user, served from the in-memory presence table
+router.get("/team/current", auth, async (req, res) => {
+  try {
+    res.json(presence.current());
   } catch (error) {
     console.error("Error fetching current activities:", error);
     res.status(500).json({ error: "Failed to fetch current activities" });
   }
 });
 
+// Server-Sent Events: a "snapshot" of /team/current, then one "presence"
+// event per user whose last activity changes
+router.get("/team/stream", streamAuth, (req, res) => {
+  res.set({
+    "Content-Type": "text/event-stream",
+    "Cache-Control": "no-cache",
+    Connection: "keep-alive",
+    "X-Accel-Buffering": "no",
+  });
+  res.flushHeaders();
+
+  const send = (type, data) =>
+    res.write(`event: ${type}\ndata: ${JSON.stringify(data)}\n\n`);
+  res.write("retry: 5000\n\n");
+  send("snapshot", presence.current());
+
+  const unsubscribe = presence.subscribe((entry) => send("presence", entry));
+  // Comment lines keep proxies from closing an idle stream
+  const keepAlive = setInterval(() => res.write(": ping\n\n"), 25 * 1000);
+  req.on("close", () => {
+    clearInterval(keepAlive);
+    unsubscribe();
+  });
+});
+
 // Get events for a specific user (requires authentication)
 router.get("/:username", auth, async (req, res) => {
   try {
@@ -103,21 +450,43 @@ router.get("/:username", auth, async (req, res) => {
         .json({ error: "Not authorized to view these events" });
     }
 
+    const since = parseDate(req.query.since);
+    if (req.query.since && !since) {
+      return res.status(400).json({ error: "Invalid since cursor" });
+    }
+
     // Create date range for the selected month
     const startDate = new Date(year, month - 1, -7); // month is 1-based in query
-    const endDate = new Date(year, month, 7, 23, 59, 59); // last day of the month
+    const endDate = new Date(year, month, 8); // 7 days after the month
 
-    const events = await Event.find({
-      username,
-      dt: {
-        $gte: startDate,
-        $lte: endDate,
-      },
-    })
-      .sort({ dt: -1 })
-      .select("dt window -_id");
+    if (since) {
+      const { events, changedAt } = await eventStore.findChangedEvents({
+        username,
+        from: startDate,
+        to: endDate,
+        since: since.getTime(),
+        descending: true,
+      });
+      return sendSynced(req, res, events, Math.max(since.getTime(), changedAt));
+    }
 
-    res.json(events);
+    await sendPeriod(
+      req,
+      res,
+      {
+        key: `user:${username}:${startDate.getTime()}`,
+        from: startDate,
+        to: endDate,
+        sources: ["events"],
+      },
+      () =>
+        eventStore.findEvents({
+          username,
+          from: startDate,
+          to: endDate,
+          descending: true,
+        })
+    );
   } catch (error) {
     console.error("Error fetching events:", error);
     res.status(500).json({ error: "Failed to fetch events" });
@@ -0,0 +1,206 @@
+const express = require("express");
+const { once } = require("events");
+const { auth, isAdmin } = require("../middleware/auth");
+const Achieve = require("../models/Achieve");
+const eventStore = require("../services/eventStore");
+const router = express.Router();
+
+// Streamed exports for admins: GET /api/export/events and
+// GET /api/export/rollups with ?from&to (or ?year&month), optional
+// ?username, ?format=ndjson|csv, ?limit and ?cursor.
+//
+// Rows are read user by user in dt order from database cursors, which the
+// {username, dt} indexes serve without sorting, and written as they
+// arrive, waiting for "drain" whenever the client is slower than the
+// database. Every row carries a cursor; passing the last one received
+// resumes the export right after that row.
+
+// Bytes collected before a write to the response
+const CHUNK_BYTES = 64 * 1024;
+
+const FORMATS = {
+  ndjson: { type: "application/x-ndjson", extension: "ndjson" },
+  csv: { type: "text/csv; charset=utf-8", extension: "csv" },
+};
+
+// Per-row cursor: username, dt and how many rows with that username and
+// dt were already sent (events may repeat a minute)
+const encodeCursor = (username, dt, count) =>
+  Buffer.from(JSON.stringify([username, dt.getTime(), count])).toString("base64");
+
+const decodeCursor = (value) => {
+  try {
+    const [username, time, count] = JSON.parse(Buffer.from(value, "base64").toString());
+    if (typeof username !== "string" || !Number.isFinite(time) || !(count >= 1)) {
+      return null;
+    }
+    return { username, dt: new Date(time), count };
+  } catch (err) {
+    return null;
+  }
+};
+
+const csvCell = (value) => {
+  const text = value === undefined || value === null ? "" : String(value);
+  return /[",\r\n]/.test(text) ? `"${text.replace(/"/g, '""')}"` : text;
+};
+
+const EXPORTS = {
+  events: {
+    columns: ["cursor", "username", "dt", "window", "windows"],
+    usernames: () => eventStore.usernames(),
+    rows: (username, from, to) => eventStore.streamUserEvents(username, from, to),
+    row: (event) => ({
+      username: event.username,
+      dt: event.dt,
+      window: event.window,
+      windows: event.windows || [],
+    }),
+  },
+  rollups: {
+    columns: ["cursor", "username", "dt", "work", "relax", "windows"],
+    usernames: async () => (await Achieve.distinct("username")).sort(),
+    rows: async function* (username, from, to) {
+      const cursor = Achieve.find({ username, dt: { $gte: from, $lt: to } })
+        .sort({ dt: 1 })
+        .select("username dt work relax windows -_id")
+        .lean()
+        .cursor({ batchSize: 1000 });
+      try {
+        yield* cursor;
+      } finally {
+        await cursor.close();
+      }
+    },
+    row: (achieve) => ({
+      username: achieve.username,
+      dt: achieve.dt,
+      work: achieve.work,
+      relax: achieve.relax,
+      windows: achieve.windows || [],
+    }),
+  },
+};
+
+const parseRange = ({ year, month, from, to }) => {
+  if (year && month) {
+    return [new Date(year, month - 1, 1), new Date(year, month, 1)];
+  }
+  return [from ? new Date(from) : new Date(0), to ? new Date(to) : new Date()];
+};
+
+router.get("/:kind(events|rollups)", auth, isAdmin, async (req, res) => {
+  const spec = EXPORTS[req.params.kind];
+  const format = req.query.format || "ndjson";
+  const [from, to] = parseRange(req.query);
+  const limit = req.query.limit ? Number(req.query.limit) : Infinity;
+  const resume = req.query.cursor ? decodeCursor(req.query.cursor) : null;
+
+  if (!FORMATS[format]) {
+    return res.status(400).json({ error: "format must be ndjson or csv" });
+  }
+  if (isNaN(from.getTime()) || isNaN(to.getTime())) {
+    return res.status(400).json({ error: "Invalid date range" });
+  }
+  if (!(limit > 0)) {
+    return res.status(400).json({ error: "Invalid limit" });
+  }
+  if (req.query.cursor && !resume) {
+    return res.status(400).json({ error: "Invalid cursor" });
+  }
+
+  let closed = false;
+  res.on("close", () => {
+    closed = true;
+  });
+  let pending = "";
+  const flush = async () => {
+    if (!pending || closed) return;
+    const chunk = pending;
+    pending = "";
+    if (!res.write(chunk)) {
+      await Promise.race([once(res, "drain"), once(res, "close")]);
+    }
+  };
+
+  const encode =
+    format === "csv"
+      ? (cursor, row) =>
+          spec.columns
+            .map((column) => {
+              if (column === "cursor") return csvCell(cursor);
+              if (column === "dt") return row.dt.toISOString();
+              if (column === "windows") return csvCell(JSON.stringify(row.windows));
+              return csvCell(row[column]);
+            })
+            .join(",") + "\n"
+      : (cursor, row) => JSON.stringify({ cursor, ...row }) + "\n";
+
+  let sent = 0;
+  try {
+    let usernames = req.query.username
+      ? [req.query.username]
+      : await spec.usernames();
+    if (resume) usernames = usernames.filter((name) => name >= resume.username);
+
+    const stamp = from.toISOString().slice(0, 10);
+    res.status(200);
+    res.set({
+      "Content-Type": FORMATS[format].type,
+      "Content-Disposition": `attachment; filename="${req.params.kind}-${stamp}.${FORMATS[format].extension}"`,
+      "Cache-Control": "no-store",
+    });
+    if (format === "csv") pending = spec.columns.join(",") + "\n";
+
+    for (const username of usernames) {
+      if (closed || sent >= limit) break;
+      const resuming = resume && username === resume.username;
+      let skip = resuming ? resume.count : 0;
+      const start = resuming && resume.dt > from ? resume.dt : from;
+      let lastTime = null;
+      let sameTime = 0;
+
+      const rows = spec.rows(username, start, to);
+      try {
+        for await (const doc of rows) {
+          const time = doc.dt.getTime();
+          if (skip > 0 && time === resume.dt.getTime()) {
+            skip -= 1;
+            lastTime = time;
+            sameTime += 1;
+            continue;
+          }
+          skip = 0;
+          sameTime = time === lastTime ? sameTime + 1 : 1;
+          lastTime = time;
+
+          const row = spec.row(doc);
+          pending += encode(encodeCursor(username, row.dt, sameTime), row);
+          sent += 1;
+          if (pending.length >= CHUNK_BYTES) await flush();
+          if (closed || sent >= limit) break;
+        }
+      } finally {
+        // Stops the generator, which closes its database cursor
+        await rows.return();
+      }
+    }
+    await flush();
+    res.end();
+  } catch (error) {
+    console.log(error);
+    if (!res.headersSent) {
+      res.removeHeader("Content-Disposition");
+      return res.status(500).json({ error: "Failed to export" });
+    }
+    // Headers are gone; mark the stream as incomplete for the reader
+    pending +=
+      format === "csv"
+        ? "# error: export failed, resume from the last cursor\n"
+        : JSON.stringify({ error: "Export failed, resume from the last cursor" }) + "\n";
+    await flush();
+    res.end();
+  }
+});
+
+module.exports = router;
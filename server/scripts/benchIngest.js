@@ -0,0 +1,175 @@
+// Ingest throughput of cluster.js for different worker counts.
+//
+// For each count it starts the cluster on a scratch database, keeps
+// --connections keep-alive connections busy with POST /api/events/batch for
+// --duration seconds and reports requests and samples per second and the
+// p50/p99 latency, then stops the cluster.
+//
+//   node scripts/benchIngest.js --workers 1,2,4 --duration 15 --connections 64
+//
+// MONGODB_URI defaults to a separate team_monitor_bench database; the
+// events written there are not cleaned up.
+require("dotenv").config();
+const http = require("http");
+const path = require("path");
+const { spawn } = require("child_process");
+const jwt = require("jsonwebtoken");
+
+const option = (name, fallback) => {
+  const index = process.argv.indexOf(`--${name}`);
+  return index > 0 && process.argv[index + 1] ? process.argv[index + 1] : fallback;
+};
+
+const WORKER_COUNTS = option("workers", "1,2,4").split(",").map(Number);
+const DURATION_MS = Number(option("duration", "15")) * 1000;
+const CONNECTIONS = Number(option("connections", "64"));
+const BATCH = Number(option("batch", "10"));
+const USERS = Number(option("users", "500"));
+const PORT = Number(option("port", "3950"));
+const MONGODB_URI =
+  process.env.BENCH_MONGODB_URI || "mongodb://127.0.0.1:27017/team_monitor_bench";
+
+const token = jwt.sign(
+  { user: { id: "bench", username: "bench", isAdmin: false } },
+  process.env.JWT_SECRET || "your-secret-key",
+  { expiresIn: "1h" }
+);
+const agent = new http.Agent({ keepAlive: true, maxSockets: CONNECTIONS });
+
+const request = (method, urlPath, body) =>
+  new Promise((resolve, reject) => {
+    const data = body ? JSON.stringify(body) : null;
+    const req = http.request(
+      {
+        host: "127.0.0.1",
+        port: PORT,
+        method,
+        path: urlPath,
+        agent,
+        headers: {
+          "x-auth-token": token,
+          ...(data
+            ? { "Content-Type": "application/json", "Content-Length": Buffer.byteLength(data) }
+            : {}),
+        },
+      },
+      (res) => {
+        res.resume();
+        res.on("end", () => resolve(res.statusCode));
+      }
+    );
+    req.on("error", reject);
+    if (data) req.write(data);
+    req.end();
+  });
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+const startCluster = async (workers) => {
+  const child = spawn(process.execPath, [path.join(__dirname, "..", "cluster.js")], {
+    env: {
+      ...process.env,
+      PORT: String(PORT),
+      CLUSTER_WORKERS: String(workers),
+      CLUSTER_INGEST_WORKERS: "0",
+      MONGODB_URI,
+      ROLLUP_DISABLED: "1",
+    },
+    stdio: ["ignore", "ignore", "inherit"],
+  });
+  // Ready once every worker can answer; probe until one round succeeds
+  for (let i = 0; i < 100; i += 1) {
+    await sleep(200);
+    try {
+      if ((await request("GET", "/api/test-connection")) === 200) {
+        await sleep(1000);
+        return child;
+      }
+    } catch (err) {
+      // Not listening yet
+    }
+  }
+  child.kill("SIGTERM");
+  throw new Error(`Cluster with ${workers} workers did not start`);
+};
+
+const stopCluster = (child) =>
+  new Promise((resolve) => {
+    child.once("exit", resolve);
+    child.kill("SIGTERM");
+  });
+
+const percentile = (sorted, p) =>
+  sorted.length ? sorted[Math.min(sorted.length - 1, Math.floor(sorted.length * p))] : null;
+
+const runLoad = async () => {
+  const latencies = [];
+  let errors = 0;
+  let next = 0;
+  const deadline = Date.now() + DURATION_MS;
+
+  const connection = async () => {
+    while (Date.now() < deadline) {
+      next += 1;
+      const now = Date.now();
+      const body = {
+        username: `bench-${next % USERS}`,
+        samples: Array.from({ length: BATCH }, (_, i) => ({
+          dt: now - (BATCH - i) * 60 * 1000,
+          window: "bench.exe",
+          windows: [{ window: "bench.exe", seconds: 60 }],
+        })),
+      };
+      const started = process.hrtime.bigint();
+      try {
+        const status = await request("POST", "/api/events/batch", body);
+        if (status === 200) {
+          latencies.push(Number(process.hrtime.bigint() - started) / 1e6);
+        } else {
+          errors += 1;
+        }
+      } catch (err) {
+        errors += 1;
+      }
+    }
+  };
+
+  const started = Date.now();
+  await Promise.all(Array.from({ length: CONNECTIONS }, connection));
+  const seconds = (Date.now() - started) / 1000;
+  latencies.sort((a, b) => a - b);
+  return {
+    requestsPerSecond: Math.round(latencies.length / seconds),
+    samplesPerSecond: Math.round((latencies.length * BATCH) / seconds),
+    p50Ms: Math.round(percentile(latencies, 0.5) * 10) / 10,
+    p99Ms: Math.round(percentile(latencies, 0.99) * 10) / 10,
+    errors,
+  };
+};
+
+const main = async () => {
+  const results = [];
+  for (const workers of WORKER_COUNTS) {
+    const child = await startCluster(workers);
+    try {
+      const result = { workers, ...(await runLoad()) };
+      console.log(JSON.stringify(result));
+      results.push(result);
+    } finally {
+      await stopCluster(child);
+    }
+  }
+  const base = results[0] && results[0].samplesPerSecond;
+  console.table(
+    results.map((result) => ({
+      ...result,
+      speedup: base ? Math.round((result.samplesPerSecond / base) * 100) / 100 : null,
+    }))
+  );
+  agent.destroy();
+};
+
+main().catch((err) => {
+  console.error("Benchmark error:", err);
+  process.exit(1);
+});
@@ -0,0 +1,86 @@
+// Replace the old non-unique { username, dt } index on Achieve with the
+// unique username_dt_unique index the rollup's upserts rely on. MongoDB
+// refuses a second index on the same keys, so the old one has to go first,
+// and duplicate rows have to be merged before the unique one can be built.
+// Idempotent; stop the server (or set ROLLUP_DISABLED=1) while it runs and
+// restart it afterwards.
+//
+//   node scripts/migrateAchieveIndex.js
+require("dotenv").config();
+require("../utils/timezone");
+const mongoose = require("mongoose");
+const Achieve = require("../models/Achieve");
+
+const OLD_INDEX = "username_1_dt_-1";
+
+// Fold every group of rows sharing username and dt into its first row,
+// summing work, relax and per-window totals
+const dedupe = async () => {
+  const groups = Achieve.aggregate([
+    {
+      $group: {
+        _id: { username: "$username", dt: "$dt" },
+        ids: { $push: "$_id" },
+        count: { $sum: 1 },
+      },
+    },
+    { $match: { count: { $gt: 1 } } },
+  ])
+    .allowDiskUse(true)
+    .cursor({ batchSize: 100 });
+
+  let merged = 0;
+  for await (const group of groups) {
+    const rows = await Achieve.find({ _id: { $in: group.ids } }).lean();
+    const windows = new Map();
+    let work = 0;
+    let relax = 0;
+    rows.forEach((row) => {
+      work += row.work || 0;
+      relax += row.relax || 0;
+      (row.windows || []).forEach((item) => {
+        windows.set(item.window, (windows.get(item.window) || 0) + item.total);
+      });
+    });
+    const [keep, ...drop] = rows;
+    await Achieve.updateOne(
+      { _id: keep._id },
+      {
+        $set: {
+          work,
+          relax,
+          windows: [...windows.entries()]
+            .sort((a, b) => b[1] - a[1])
+            .map(([window, total]) => ({ window, total })),
+        },
+      }
+    );
+    await Achieve.deleteMany({ _id: { $in: drop.map((row) => row._id) } });
+    merged += drop.length;
+  }
+  return merged;
+};
+
+const migrate = async () => {
+  const merged = await dedupe();
+  console.log(`Merged ${merged} duplicate Achieve rows`);
+
+  const indexes = await Achieve.collection.indexes();
+  if (indexes.some((index) => index.name === OLD_INDEX)) {
+    await Achieve.collection.dropIndex(OLD_INDEX);
+    console.log(`Dropped index ${OLD_INDEX}`);
+  }
+  await Achieve.createIndexes();
+  console.log("Achieve indexes are up to date");
+};
+
+mongoose
+  .connect(
+    process.env.MONGODB_URI || "mongodb://127.0.0.1:27017/team_monitor"
+  )
+  .then(migrate)
+  .catch((err) => {
+    console.error("Migration error:", err);
+    process.exitCode = 1;
+  })
+  .finally(() => mongoose.disconnect());
@@ -0,0 +1,62 @@
+// Copy minute Event documents into the per-day EventDay layout.
+// Resumable: progress is kept in JobState, run it again until it reports
+// nothing left, then switch EVENT_STORAGE from "both" to "day".
+//
+//   node scripts/migrateEventDays.js
+require("dotenv").config();
+// Day keys and minute slots must match the ones the server writes
+require("../utils/timezone");
+const mongoose = require("mongoose");
+const Event = require("../models/Event");
+const JobState = require("../models/JobState");
+const { writeDays } = require("../services/eventStore");
+
+const JOB_NAME = "event-day-migration";
+const CHUNK_SIZE = Number(process.env.MIGRATE_CHUNK_SIZE) || 5000;
+
+const migrate = async () => {
+  const state = await JobState.findOneAndUpdate(
+    { name: JOB_NAME },
+    { $setOnInsert: { name: JOB_NAME } },
+    { upsert: true, new: true }
+  );
+  const filter = state.watermark ? { _id: { $gt: state.watermark } } : {};
+  const cursor = Event.find(filter)
+    .sort({ _id: 1 })
+    .select("username dt window windows")
+    .lean()
+    .cursor({ batchSize: 1000 });
+
+  let chunk = [];
+  let events = 0;
+  let days = 0;
+  const flush = async () => {
+    days += await writeDays(chunk);
+    events += chunk.length;
+    const watermark = chunk[chunk.length - 1]._id;
+    await JobState.updateOne(
+      { name: JOB_NAME },
+      { $set: { watermark, lastRunAt: new Date(), stats: { events, days } } }
+    );
+    console.log(`Migrated ${events} events (${days} day updates)`);
+    chunk = [];
+  };
+
+  for await (const event of cursor) {
+    chunk.push(event);
+    if (chunk.length >= CHUNK_SIZE) await flush();
+  }
+  if (chunk.length > 0) await flush();
+  console.log(events ? "Migration finished" : "Nothing left to migrate");
+};
+
+mongoose
+  .connect(
+    process.env.MONGODB_URI || "mongodb://127.0.0.1:27017/team_monitor"
+  )
+  .then(migrate)
+  .catch((err) => {
+    console.error("Migration error:", err);
+    process.exitCode = 1;
+  })
+  .finally(() => mongoose.disconnect());
@@ -1,4 +1,6 @@
 require("dotenv").config();
+// Set timezone to Asia/Taipei (UTC+8)
+require("./utils/timezone");
 const express = require("express");
 const mongoose = require("mongoose");
 const cors = require("cors");
@@ -7,14 +9,34 @@ const { body, validationResult } = require("express-validator");
 const bcrypt = require("bcryptjs");
 const jwt = require("jsonwebtoken");
 const { auth } = require("./middleware/auth");
+const { startRollup } = require("./jobs/rollup");
+const presence = require("./services/presence");
+const ingestQueue = require("./services/ingestQueue");
+const eventStore = require("./services/eventStore");
+const clusterBus = require("./services/clusterBus");
 
-// Set timezone to Asia/Taipei (UTC+8)
-process.env.TZ = "Asia/Taipei";
+// "all" serves everything; in cluster mode (cluster.js) "ingest" workers
+// serve only what clients call and "query" workers everything else too
+const ROLE = process.env.WORKER_ROLE || "all";
+const INGEST_PATHS = [
+  /^\/api\/events\/?$/,
+  /^\/api\/events\/batch$/,
+  /^\/api\/login$/,
+  /^\/api\/token\/refresh$/,
+  /^\/api\/test-connection$/,
+];
 
 const app = express();
 
 // Middleware
-app.use(cors());
+// Clients read the sync cursor of delta polls (routes/events.js)
+app.use(cors({ exposedHeaders: ["X-Sync-Cursor", "ETag"] }));
+if (ROLE === "ingest") {
+  app.use((req, res, next) => {
+    if (INGEST_PATHS.some((pattern) => pattern.test(req.path))) return next();
+    res.status(404).json({ error: "Not served by ingest workers" });
+  });
+}
 app.use(express.json());
 
 // Serve static files from the React app
@@ -29,7 +51,14 @@ mongoose
       useUnifiedTopology: true,
     }
   )
-  .then(() => console.log("MongoDB Connected"))
+  .then(() => {
+    console.log("MongoDB Connected");
+    presence.start();
+    clusterBus.trackState("ingest");
+    clusterBus.shareState("ingest", ingestQueue.getStats);
+    // Hourly Achieve rollup and raw event retention, see jobs/rollup.js
+    if (process.env.ROLLUP_DISABLED !== "1") startRollup();
+  })
   .catch((err) => console.log("MongoDB Connection Error:", err));
 
 // Models
@@ -44,9 +73,11 @@ const User = mongoose.model("User", {
 const eventsRouter = require("./routes/events");
 const downloadRoutes = require("./routes/download");
 const achievesRouter = require("./routes/achieve");
+const exportRouter = require("./routes/export");
 app.use("/api/events", eventsRouter);
 app.use("/api/achieves", achievesRouter);
 app.use("/api/download", downloadRoutes);
+app.use("/api/export", exportRouter);
 
 // Test connection endpoint
 app.get("/api/test-connection", (req, res) => {
@@ -61,6 +92,29 @@ app.get("/api/test-connection", (req, res) => {
   }
 });
 
+const sendToken = (res, user) => {
+  const payload = {
+    user: {
+      id: user.id,
+      username: user.username,
+      isAdmin: user.isAdmin,
+    },
+  };
+
+  jwt.sign(
+    payload,
+    process.env.JWT_SECRET || "your-secret-key",
+    { expiresIn: "1w" },
+    (err, token) => {
+      if (err) {
+        console.error("Token signing error:", err);
+        return res.status(500).json({ msg: "Server error" });
+      }
+      res.json({ token });
+    }
+  );
+};
+
 // Login endpoint
 app.post(
   "/api/login",
@@ -84,23 +138,7 @@ app.post(
         return res.status(400).json({ msg: "Invalid credentials" });
       }
 
-      const payload = {
-        user: {
-          id: user.id,
-          username: user.username,
-          isAdmin: user.isAdmin,
-        },
-      };
-
-      jwt.sign(
-        payload,
-        process.env.JWT_SECRET || "your-secret-key",
-        { expiresIn: "1w" },
-        (err, token) => {
-          if (err) throw err;
-          res.json({ token });
-        }
-      );
+      sendToken(res, user);
     } catch (err) {
       console.error("Login error:", err);
       res.status(500).json({
@@ -111,6 +149,26 @@ app.post(
   }
 );
 
+// Token refresh endpoint: swaps a still valid token for a fresh one without
+// the bcrypt comparison of /api/login, so clients can renew ahead of expiry
+app.post("/api/token/refresh", auth, async (req, res) => {
+  try {
+    // Re-read the user so deleted users and changed roles take effect
+    const user = await User.findById(req.user.id).select("username isAdmin");
+    if (!user) {
+      return res.status(401).json({ msg: "Token is not valid" });
+    }
+
+    sendToken(res, user);
+  } catch (err) {
+    console.error("Token refresh error:", err);
+    res.status(500).json({
+      msg: "Server error",
+      error: process.env.NODE_ENV === "development" ? err.message : undefined,
+    });
+  }
+});
+
 // Create user endpoint (admin only)
 app.post(
   "/api/users",
@@ -184,9 +242,8 @@ app.delete("/api/users/:username", auth, async (req, res) => {
       return res.status(400).json({ msg: "Username is required" });
     }
 
-    const Event = require("./models/Event");
     await User.findOneAndDelete({ username });
-    await Event.deleteMany({ username });
+    await eventStore.deleteUser(username);
     res.json({ msg: "User deleted successfully" });
   } catch (err) {
     console.error("Delete user error:", err);
@@ -204,6 +261,25 @@ app.get("*", (req, res) => {
 });
 
 const PORT = process.env.PORT || 3000;
-app.listen(PORT, "0.0.0.0", () =>
-  console.log(`Server running on port ${PORT}`)
+const server = app.listen(PORT, "0.0.0.0", () =>
+  console.log(
+    clusterBus.inCluster
+      ? `Worker ${clusterBus.workerId} (${ROLE}) running on port ${PORT}`
+      : `Server running on port ${PORT}`
+  )
 );
+
+// Stop taking requests, write the queued events, then exit
+const shutdown = async (signal) => {
+  console.log(`${signal} received, draining ingest queue`);
+  server.close();
+  try {
+    await ingestQueue.drain();
+    await mongoose.disconnect();
+  } catch (err) {
+    console.error("Shutdown error:", err);
+  }
+  process.exit(0);
+};
+process.once("SIGTERM", () => shutdown("SIGTERM"));
+process.once("SIGINT", () => shutdown("SIGINT"));
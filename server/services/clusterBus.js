@@ -0,0 +1,74 @@
+// Messages between the workers of cluster.js over the IPC channel to the
+// primary, which relays each one to every other worker. Outside a cluster
+// publish() is a no-op and nothing is ever received.
+const cluster = require("cluster");
+
+const inCluster = cluster.isWorker && typeof process.send === "function";
+const workerId = inCluster ? cluster.worker.id : 0;
+
+const handlers = new Map(); // channel -> [handler]
+// Latest state each other worker shared per key: key -> Map(workerId -> value)
+const shared = new Map();
+
+const publish = (channel, payload) => {
+  if (!inCluster || !process.connected) return;
+  process.send({ bus: channel, from: workerId, payload });
+};
+
+const subscribe = (channel, handler) => {
+  if (!handlers.has(channel)) handlers.set(channel, []);
+  handlers.get(channel).push(handler);
+};
+
+if (inCluster) {
+  process.on("message", (message) => {
+    if (!message || !message.bus) return;
+    (handlers.get(message.bus) || []).forEach((handler) => {
+      try {
+        handler(message.payload, message.from);
+      } catch (err) {
+        console.error(`Cluster message error (${message.bus}):`, err);
+      }
+    });
+  });
+}
+
+// Publish getter() every intervalMs so other workers can read it with
+// sharedState(key); entries of workers that went away expire
+const shareState = (key, getter, intervalMs = 5000) => {
+  if (!inCluster) return null;
+  const timer = setInterval(
+    () => publish(`state:${key}`, { at: Date.now(), value: getter() }),
+    intervalMs
+  );
+  timer.unref();
+  return timer;
+};
+
+const sharedState = (key, maxAgeMs = 15000) => {
+  const states = shared.get(key);
+  const result = {};
+  if (!states) return result;
+  const now = Date.now();
+  states.forEach(({ at, value }, id) => {
+    if (now - at <= maxAgeMs) result[id] = value;
+    else states.delete(id);
+  });
+  return result;
+};
+
+const trackState = (key) => {
+  if (shared.has(key)) return;
+  shared.set(key, new Map());
+  subscribe(`state:${key}`, (state, from) => shared.get(key).set(from, state));
+};
+
+module.exports = {
+  inCluster,
+  workerId,
+  publish,
+  subscribe,
+  shareState,
+  sharedState,
+  trackState,
+};
@@ -0,0 +1,330 @@
+// dayStart/minuteOfDay use local time, whoever loads this module
+require("../utils/timezone");
+const mongoose = require("mongoose");
+const Event = require("../models/Event");
+const EventDay = require("../models/EventDay");
+const Achieve = require("../models/Achieve");
+const responseCache = require("./responseCache");
+
+const { Int32 } = mongoose.mongo;
+
+// Where activity is stored: "minute" (one Event per user-minute),
+// "day" (one EventDay per user-day) or "both" while migrating; reads use
+// EventDay only in "day" mode
+const STORAGE_MODES = ["minute", "day", "both"];
+const STORAGE_MODE = STORAGE_MODES.includes(process.env.EVENT_STORAGE)
+  ? process.env.EVENT_STORAGE
+  : "minute";
+const writesMinutes = STORAGE_MODE !== "day";
+const writesDays = STORAGE_MODE !== "minute";
+const readsDays = STORAGE_MODE === "day";
+
+const MINUTES_PER_DAY = 1440;
+const OCCUPANCY_WORDS = MINUTES_PER_DAY / 32;
+const EMPTY_OCCUPANCY = Array.from({ length: OCCUPANCY_WORDS }, () => new Int32(0));
+// Seconds a minute without a dwell histogram is stored with
+const FULL_MINUTE = 60;
+
+const dayStart = (dt) => {
+  const date = new Date(dt);
+  date.setHours(0, 0, 0, 0);
+  return date;
+};
+
+const minuteOfDay = (dt) => dt.getHours() * 60 + dt.getMinutes();
+
+// Group minute events by user and day:
+// key -> { username, day, minutes: Map(minute -> [{ window, seconds }]) }
+const groupDays = (events) => {
+  const days = new Map();
+  events.forEach((event) => {
+    const dt = new Date(event.dt);
+    const day = dayStart(dt);
+    const key = `${event.username}\u0000${day.getTime()}`;
+    let group = days.get(key);
+    if (!group) {
+      group = { username: event.username, day, minutes: new Map() };
+      days.set(key, group);
+    }
+    const parts =
+      event.windows && event.windows.length
+        ? event.windows
+        : [{ window: event.window || "", seconds: FULL_MINUTE }];
+    group.minutes.set(minuteOfDay(dt), parts);
+  });
+  return days;
+};
+
+// Make sure the day document exists and holds all `names`; returns it
+// with its window dictionary. $addToSet only appends, so indexes already
+// handed out never change.
+const openDay = async (username, day, names) => {
+  const update = {
+    $addToSet: { windows: { $each: names } },
+    $setOnInsert: { occupancy: EMPTY_OCCUPANCY, slots: {} },
+  };
+  const options = {
+    upsert: true,
+    returnDocument: "after",
+    projection: { windows: 1 },
+  };
+  let result;
+  try {
+    result = await EventDay.collection.findOneAndUpdate({ username, day }, update, options);
+  } catch (err) {
+    // Another writer created the same day first
+    if (err.code !== 11000) throw err;
+    result = await EventDay.collection.findOneAndUpdate({ username, day }, update, options);
+  }
+  return result && result.value !== undefined ? result.value : result;
+};
+
+// Write minute events into their EventDay documents: the window
+// dictionary first, then the minutes' slots and occupancy bits in one
+// update per day. Rewriting a minute replaces its slot, so replays are
+// harmless.
+const writeDays = async (events) => {
+  const days = groupDays(events);
+  const ops = await Promise.all(
+    [...days.values()].map(async ({ username, day, minutes }) => {
+      const names = new Set();
+      minutes.forEach((parts) => parts.forEach((part) => names.add(part.window)));
+      const doc = await openDay(username, day, [...names]);
+      const index = new Map(doc.windows.map((name, i) => [name, i]));
+
+      const set = { updatedAt: new Date() };
+      const masks = new Map();
+      minutes.forEach((parts, minute) => {
+        set[`slots.${minute}`] = parts.map((part) => [index.get(part.window), part.seconds]);
+        const word = Math.floor(minute / 32);
+        masks.set(word, (masks.get(word) || 0) | (1 << minute % 32));
+      });
+      const bit = {};
+      masks.forEach((mask, word) => {
+        bit[`occupancy.${word}`] = { or: new Int32(mask | 0) };
+      });
+      return {
+        updateOne: { filter: { _id: doc._id }, update: { $set: set, $bit: bit } },
+      };
+    })
+  );
+  if (ops.length > 0) {
+    await EventDay.collection.bulkWrite(ops, { ordered: false });
+  }
+  return ops.length;
+};
+
+// Minute events of a day document, shaped like lean Event documents
+const dayToEvents = (doc) =>
+  Object.entries(doc.slots || {})
+    .map(([minute, parts]) => {
+      const windows = parts.map(([i, seconds]) => ({
+        window: doc.windows[i],
+        seconds,
+      }));
+      return {
+        username: doc.username,
+        dt: new Date(doc.day.getTime() + Number(minute) * 60 * 1000),
+        window: windows.length ? windows[0].window : "",
+        windows,
+      };
+    })
+    .sort((a, b) => a.dt - b.dt);
+
+// Active minutes of a day from its occupancy bitmap
+const countMinutes = (doc) =>
+  (doc.occupancy || []).reduce((count, word) => {
+    let bits = word >>> 0;
+    while (bits) {
+      bits &= bits - 1;
+      count += 1;
+    }
+    return count;
+  }, 0);
+
+// Store events in the configured layout(s). Per-document errors of the
+// minute insert surface as err.writeErrors like Event.insertMany.
+const insertEvents = async (events) => {
+  try {
+    if (writesDays) await writeDays(events);
+    if (writesMinutes) await Event.insertMany(events, { ordered: false });
+  } finally {
+    // Replayed minutes may belong to a period whose response is cached
+    const times = events.map((event) => new Date(event.dt).getTime());
+    const oldest = times.reduce((min, time) => Math.min(min, time), Infinity);
+    const newest = times.reduce((max, time) => Math.max(max, time), -Infinity);
+    responseCache.invalidate("events", oldest, newest + 1);
+  }
+};
+
+// Events with from <= dt < to, optionally for one user, sorted by dt
+const findEvents = async ({ username, from, to, descending = false }) => {
+  if (!readsDays) {
+    const filter = { dt: { $gte: from, $lt: to } };
+    if (username) filter.username = username;
+    return Event.find(filter)
+      .sort({ dt: descending ? -1 : 1 })
+      .select("username dt window windows -_id")
+      .lean();
+  }
+
+  const filter = { day: { $gte: dayStart(from), $lt: to } };
+  if (username) filter.username = username;
+  const docs = await EventDay.find(filter).lean();
+  const events = docs
+    .flatMap(dayToEvents)
+    .filter((event) => event.dt >= from && event.dt < to)
+    .sort((a, b) => a.dt - b.dt);
+  return descending ? events.reverse() : events;
+};
+
+// since= queries look this far behind their cursor again: writes are
+// stamped (ObjectId / updatedAt) before they commit, so one still in
+// flight when a cursor was handed out can appear later with an older stamp
+const SYNC_OVERLAP_MS = 60 * 1000;
+
+// Filter on the write stamp for writes at or after `since` (epoch ms)
+// minus the overlap
+const changedSince = (since) => {
+  const after = new Date(since - SYNC_OVERLAP_MS);
+  if (readsDays) return { updatedAt: { $gt: after } };
+  return {
+    _id: { $gte: mongoose.Types.ObjectId.createFromTime(Math.floor(after / 1000)) },
+  };
+};
+
+// Events with from <= dt < to written since the cursor `since`, optionally
+// for one user, sorted by dt, and the latest write stamp among them (epoch
+// ms, 0 if none). In day mode every minute of a changed day is returned.
+const findChangedEvents = async ({ username, from, to, since, descending = false }) => {
+  let events;
+  let changedAt = 0;
+  if (!readsDays) {
+    const filter = { ...changedSince(since), dt: { $gte: from, $lt: to } };
+    if (username) filter.username = username;
+    const docs = await Event.find(filter).select("username dt window windows").lean();
+    events = docs.map(({ _id, ...event }) => {
+      changedAt = Math.max(changedAt, _id.getTimestamp().getTime());
+      return event;
+    });
+  } else {
+    const filter = { ...changedSince(since), day: { $gte: dayStart(from), $lt: to } };
+    if (username) filter.username = username;
+    const docs = await EventDay.find(filter).lean();
+    docs.forEach((doc) => {
+      changedAt = Math.max(changedAt, doc.updatedAt.getTime());
+    });
+    events = docs
+      .flatMap(dayToEvents)
+      .filter((event) => event.dt >= from && event.dt < to);
+  }
+  events.sort((a, b) => (descending ? b.dt - a.dt : a.dt - b.dt));
+  return { events, changedAt };
+};
+
+// Usernames with stored activity, sorted (a distinct scan of the
+// username index)
+const usernames = async () => {
+  const names = await (readsDays ? EventDay : Event).distinct("username");
+  return names.sort();
+};
+
+// Delete all activity of a user: both storage layouts, whichever mode is
+// active (the other may hold data from before a switch), and the Achieve
+// rollups; cached responses that may include it are dropped
+const deleteUser = async (username) => {
+  const [events, days, rollups] = await Promise.all([
+    Event.deleteMany({ username }),
+    EventDay.deleteMany({ username }),
+    Achieve.deleteMany({ username }),
+  ]);
+  const now = Date.now();
+  responseCache.invalidate("events", 0, now);
+  responseCache.invalidate("rollups", 0, now);
+  return {
+    events: events.deletedCount,
+    days: days.deletedCount,
+    rollups: rollups.deletedCount,
+  };
+};
+
+// Events of one user with from <= dt < to in dt order, read from a
+// database cursor so memory stays bounded however long the range is
+async function* streamUserEvents(username, from, to) {
+  const cursor = readsDays
+    ? EventDay.find({ username, day: { $gte: dayStart(from), $lt: to } })
+        .sort({ day: 1 })
+        .lean()
+        .cursor({ batchSize: 10 })
+    : Event.find({ username, dt: { $gte: from, $lt: to } })
+        .sort({ dt: 1 })
+        .select("username dt window windows -_id")
+        .lean()
+        .cursor({ batchSize: 1000 });
+  try {
+    for await (const doc of cursor) {
+      if (!readsDays) {
+        yield doc;
+        continue;
+      }
+      for (const event of dayToEvents(doc)) {
+        if (event.dt >= from && event.dt < to) yield event;
+      }
+    }
+  } finally {
+    await cursor.close();
+  }
+}
+
+// Last event of every user, for rebuilding presence
+const latestPerUser = async () => {
+  if (!readsDays) {
+    const latest = await Event.aggregate([
+      { $sort: { username: 1, dt: -1 } },
+      {
+        $group: {
+          _id: "$username",
+          window: { $first: "$window" },
+          dt: { $first: "$dt" },
+        },
+      },
+    ]);
+    return latest.map((item) => ({
+      username: item._id,
+      window: item.window,
+      dt: item.dt,
+    }));
+  }
+
+  const days = await EventDay.aggregate([
+    { $sort: { username: 1, day: -1 } },
+    { $group: { _id: "$username", doc: { $first: "$$ROOT" } } },
+  ]);
+  return days
+    .map(({ doc }) => dayToEvents(doc).pop())
+    .filter(Boolean)
+    .map((event) => ({
+      username: event.username,
+      window: event.window,
+      dt: event.dt,
+    }));
+};
+
+module.exports = {
+  STORAGE_MODE,
+  writesMinutes,
+  writesDays,
+  readsDays,
+  dayStart,
+  writeDays,
+  dayToEvents,
+  countMinutes,
+  insertEvents,
+  findEvents,
+  changedSince,
+  findChangedEvents,
+  usernames,
+  deleteUser,
+  streamUserEvents,
+  latestPerUser,
+};
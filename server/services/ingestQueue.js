@@ -0,0 +1,225 @@
+const eventStore = require("./eventStore");
+
+// Events held in memory at most; beyond this enqueue() refuses new ones
+const MAX_QUEUE = Number(process.env.INGEST_QUEUE_MAX) || 50000;
+// Events per insertMany, a full batch is written right away
+const FLUSH_SIZE = Number(process.env.INGEST_FLUSH_SIZE) || 500;
+// Longest time a partial batch waits before it is written
+const FLUSH_INTERVAL_MS = Number(process.env.INGEST_FLUSH_MS) || 1000;
+// "enqueue" acknowledges requests once queued, "flush" once written
+const ACK_MODE = process.env.INGEST_ACK === "flush" ? "flush" : "enqueue";
+// A batch that failed as a whole (e.g. lost connection) is retried after
+// FLUSH_INTERVAL_MS, doubling per consecutive failure up to this
+const RETRY_MAX_MS = Number(process.env.INGEST_RETRY_MAX_MS) || 60000;
+// With INGEST_ACK=flush a request fails after this many attempts and the
+// client resends it; acknowledged events stay queued until they are written
+const MAX_ATTEMPTS = 3;
+// Longest time shutdown keeps retrying before it drops what is still queued
+const DRAIN_TIMEOUT_MS = Number(process.env.INGEST_DRAIN_MS) || 30000;
+
+class QueueFullError extends Error {
+  constructor(message, retryAfter) {
+    super(message);
+    this.name = "QueueFullError";
+    this.retryAfter = retryAfter;
+  }
+}
+
+let queue = []; // { doc, attempts, resolve, reject }
+let timer = null;
+let flushing = null;
+let draining = false;
+// Consecutive whole-batch failures, sets the retry backoff
+let failures = 0;
+
+const stats = {
+  enqueued: 0,
+  written: 0,
+  failed: 0,
+  dropped: 0,
+  rejected: 0,
+  retried: 0,
+  flushes: 0,
+  maxDepth: 0,
+  lastFlushMs: 0,
+  maxFlushMs: 0,
+  totalFlushMs: 0,
+};
+
+const settle = (entry, err) => {
+  if (err) {
+    stats.failed += 1;
+    if (entry.reject) entry.reject(err);
+  } else {
+    stats.written += 1;
+    if (entry.resolve) entry.resolve();
+  }
+};
+
+// Give up on `entries`. Events acknowledged before they were written
+// (INGEST_ACK=enqueue) are lost, so they are counted and logged as dropped.
+const fail = (entries, err, reason) => {
+  if (entries.length === 0) return;
+  entries.forEach((entry) => settle(entry, err));
+  const acknowledged = entries.filter((entry) => !entry.reject).length;
+  if (acknowledged > 0) {
+    stats.dropped += acknowledged;
+    console.error(`Ingest: dropped ${acknowledged} acknowledged events (${reason})`);
+  }
+};
+
+const retryDelay = () =>
+  Math.min(RETRY_MAX_MS, FLUSH_INTERVAL_MS * 2 ** Math.max(0, failures - 1));
+
+// Insert one batch unordered; with per-document errors the others are
+// stored, a batch that failed as a whole is put back for another attempt
+const writeBatch = async (batch) => {
+  const started = Date.now();
+  let retry = false;
+  try {
+    await eventStore.insertEvents(batch.map((entry) => entry.doc));
+    batch.forEach((entry) => settle(entry, null));
+  } catch (err) {
+    if (err.writeErrors) {
+      const failed = new Map(
+        [].concat(err.writeErrors).map((writeError) => [writeError.index, writeError])
+      );
+      console.error(`Ingest: ${failed.size} of ${batch.length} events rejected`);
+      batch.forEach((entry, index) => {
+        if (!failed.has(index)) settle(entry, null);
+      });
+      fail(
+        batch.filter((entry, index) => failed.has(index)),
+        err,
+        "rejected by the database"
+      );
+    } else {
+      failures += 1;
+      console.error(`Ingest flush error (${failures} in a row):`, err);
+      // Only requests still waiting for the write give up, and their
+      // clients resend them; acknowledged events are kept for retries
+      const again = [];
+      batch.forEach((entry) => {
+        if (!entry.reject || ++entry.attempts < MAX_ATTEMPTS) again.push(entry);
+        else settle(entry, err);
+      });
+      stats.retried += again.length;
+      queue = again.concat(queue);
+      retry = true;
+    }
+  }
+  if (!retry) failures = 0;
+
+  const elapsed = Date.now() - started;
+  stats.flushes += 1;
+  stats.lastFlushMs = elapsed;
+  stats.maxFlushMs = Math.max(stats.maxFlushMs, elapsed);
+  stats.totalFlushMs += elapsed;
+  return retry;
+};
+
+const schedule = (delay) => {
+  if (timer || flushing || queue.length === 0) return;
+  timer = setTimeout(flush, delay);
+};
+
+// Write queued events: full batches back to back, then the remainder
+// (only when draining or the timer fired)
+const flush = () => {
+  if (timer) {
+    clearTimeout(timer);
+    timer = null;
+  }
+  if (flushing) return flushing;
+
+  flushing = (async () => {
+    let retry = false;
+    while (queue.length > 0 && !retry) {
+      retry = await writeBatch(queue.splice(0, FLUSH_SIZE));
+    }
+    return retry;
+  })().then((retry) => {
+    flushing = null;
+    // drain() waits out the backoff itself
+    if (retry) {
+      if (!draining) schedule(retryDelay());
+    } else if (queue.length >= FLUSH_SIZE) flush();
+    else schedule(FLUSH_INTERVAL_MS);
+  });
+  return flushing;
+};
+
+// Queue events for insertion. Resolves once they are queued, or once they
+// are written with INGEST_ACK=flush; throws QueueFullError when the queue
+// cannot take them all.
+const enqueue = (docs) => {
+  if (draining) {
+    return Promise.reject(new QueueFullError("Server is shutting down", 10));
+  }
+  if (queue.length + docs.length > MAX_QUEUE) {
+    stats.rejected += docs.length;
+    return Promise.reject(new QueueFullError("Ingest queue is full", 5));
+  }
+
+  const entries = docs.map((doc) => ({ doc, attempts: 0 }));
+  let written = Promise.resolve();
+  if (ACK_MODE === "flush") {
+    written = Promise.all(
+      entries.map(
+        (entry) =>
+          new Promise((resolve, reject) => {
+            entry.resolve = resolve;
+            entry.reject = reject;
+          })
+      )
+    ).then(() => undefined);
+  }
+
+  queue.push(...entries);
+  stats.enqueued += entries.length;
+  stats.maxDepth = Math.max(stats.maxDepth, queue.length);
+  // While writes fail, full batches wait for the retry timer too
+  if (queue.length >= FLUSH_SIZE && failures === 0) flush();
+  else schedule(FLUSH_INTERVAL_MS);
+  return written;
+};
+
+// Stop accepting events and write everything still queued. Failed batches
+// are retried with backoff for up to DRAIN_TIMEOUT_MS; what is left then
+// is dropped, and counted, so shutdown cannot hang on a lost database.
+const drain = async () => {
+  draining = true;
+  const deadline = Date.now() + DRAIN_TIMEOUT_MS;
+  while (queue.length > 0 || flushing) {
+    await (flushing || flush());
+    if (queue.length === 0 || failures === 0) continue;
+    const wait = Math.min(retryDelay(), deadline - Date.now());
+    if (wait <= 0) break;
+    await new Promise((resolve) => setTimeout(resolve, wait));
+  }
+  if (timer) {
+    clearTimeout(timer);
+    timer = null;
+  }
+  fail(
+    queue.splice(0),
+    new Error("Server shut down before the events were written"),
+    "shutdown"
+  );
+};
+
+const getStats = () => ({
+  ...stats,
+  depth: queue.length,
+  capacity: MAX_QUEUE,
+  flushSize: FLUSH_SIZE,
+  flushIntervalMs: FLUSH_INTERVAL_MS,
+  ackMode: ACK_MODE,
+  consecutiveFailures: failures,
+  retryDelayMs: failures ? retryDelay() : 0,
+  avgFlushMs: stats.flushes
+    ? Math.round(stats.totalFlushMs / stats.flushes)
+    : 0,
+});
+
+module.exports = { QueueFullError, enqueue, flush, drain, getStats };
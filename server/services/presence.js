@@ -0,0 +1,119 @@
+const { EventEmitter } = require("events");
+const eventStore = require("./eventStore");
+const clusterBus = require("./clusterBus");
+
+// Users whose last event is older than this have no current activity
+const PRESENCE_WINDOW_MS = 10 * 60 * 1000;
+// How often entries crossing PRESENCE_WINDOW_MS are announced as idle
+const SWEEP_INTERVAL_MS = 30 * 1000;
+
+// Last event per user, kept up to date by the ingest routes so
+// /team/current never has to query the Event collection
+const lastSeen = new Map(); // username -> { username, window, dt }
+const emitter = new EventEmitter();
+emitter.setMaxListeners(0);
+
+const isCurrent = (entry, now = Date.now()) =>
+  now - entry.dt.getTime() < PRESENCE_WINDOW_MS;
+
+// Presence as /team/current reports it: window and time of the last event,
+// or nulls if it is older than PRESENCE_WINDOW_MS
+const view = (entry, now = Date.now()) =>
+  isCurrent(entry, now)
+    ? { username: entry.username, window: entry.window, dt: entry.dt }
+    : { username: entry.username, window: null, dt: null };
+
+// Update one user's entry, returns false if it already had a newer event
+const apply = (username, window, dt) => {
+  const date = new Date(dt);
+  const entry = lastSeen.get(username);
+  // Minutes replayed from a client's spool must not move presence back
+  if (entry && entry.dt >= date) return false;
+
+  const next = { username, window: window || "", dt: date };
+  next.idle = !isCurrent(next);
+  lastSeen.set(username, next);
+  if (!next.idle) emitter.emit("change", view(next));
+  return true;
+};
+
+// Updates made by this worker, sent to the other cluster workers once per
+// tick so every worker's streams and /team/current see all ingest
+let outgoing = [];
+const share = (username, window, dt) => {
+  if (!clusterBus.inCluster) return;
+  if (outgoing.length === 0) {
+    setImmediate(() => {
+      clusterBus.publish("presence", outgoing);
+      outgoing = [];
+    });
+  }
+  outgoing.push([username, window, new Date(dt).getTime()]);
+};
+
+clusterBus.subscribe("presence", (updates) => {
+  updates.forEach(([username, window, dt]) => apply(username, window, dt));
+});
+
+const record = (username, window, dt) => {
+  if (apply(username, window, dt)) share(username, window, dt);
+};
+
+const recordEvents = (events) => {
+  events.forEach((event) => record(event.username, event.window, event.dt));
+};
+
+const current = () => {
+  const now = Date.now();
+  return [...lastSeen.values()]
+    .sort((a, b) => (a.username < b.username ? -1 : 1))
+    .map((entry) => view(entry, now));
+};
+
+// Load the last event of every user with one aggregation (served by the
+// { username, dt } index); events recorded meanwhile are kept if newer
+const rebuild = async () => {
+  const latest = await eventStore.latestPerUser();
+  latest.forEach((item) => {
+    const entry = lastSeen.get(item.username);
+    if (!entry || entry.dt < item.dt) {
+      lastSeen.set(item.username, {
+        ...item,
+        idle: !isCurrent(item),
+      });
+    }
+  });
+  return lastSeen.size;
+};
+
+// Announce users who just went idle, so streams match /team/current
+const sweep = () => {
+  const now = Date.now();
+  lastSeen.forEach((entry) => {
+    if (!entry.idle && !isCurrent(entry, now)) {
+      entry.idle = true;
+      emitter.emit("change", view(entry, now));
+    }
+  });
+};
+
+const start = () => {
+  rebuild()
+    .then((count) => console.log(`Presence loaded for ${count} users`))
+    .catch((err) => console.error("Presence rebuild error:", err));
+  return setInterval(sweep, SWEEP_INTERVAL_MS);
+};
+
+const subscribe = (listener) => {
+  emitter.on("change", listener);
+  return () => emitter.off("change", listener);
+};
+
+module.exports = {
+  record,
+  recordEvents,
+  current,
+  rebuild,
+  start,
+  subscribe,
+};
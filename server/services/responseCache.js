@@ -0,0 +1,115 @@
+// Serialized responses for periods that have ended, so reopening a past
+// month does not repeat its range query and JSON encoding. Entries are
+// evicted least recently used first once RESPONSE_CACHE_MB is reached.
+//
+// A closed period can still change: clients replay spooled minutes with
+// their original time, the rollup rewrites Achieve hours and retention
+// deletes old raw data. Each of those writers calls invalidate() with the
+// time range it touched, which drops the overlapping entries in this
+// worker and, through clusterBus, in the others.
+const crypto = require("crypto");
+const clusterBus = require("./clusterBus");
+
+const MAX_BYTES = (Number(process.env.RESPONSE_CACHE_MB) || 64) * 1024 * 1024;
+// One entry may use at most this share of the cache
+const MAX_ENTRY_SHARE = 0.25;
+// A period is closed once it ended this long ago; writes newer than that
+// cannot touch a cached entry, so they skip invalidation altogether
+const CLOSE_DELAY_MS = 60 * 60 * 1000;
+
+// key -> { body, etag, bytes, from, to, sources }, in LRU order (oldest first)
+const entries = new Map();
+let bytes = 0;
+// Bumped by every invalidation, a response loaded across one is not cached
+let generation = 0;
+const stats = { hits: 0, misses: 0, evictions: 0, invalidations: 0 };
+
+const closedBefore = () => Date.now() - CLOSE_DELAY_MS;
+
+const isClosed = (to) => to.getTime() <= closedBefore();
+
+const remove = (key) => {
+  const entry = entries.get(key);
+  if (!entry) return;
+  entries.delete(key);
+  bytes -= entry.bytes;
+};
+
+const get = (key) => {
+  const entry = entries.get(key);
+  if (!entry) {
+    stats.misses += 1;
+    return null;
+  }
+  // Move to the most recently used end
+  entries.delete(key);
+  entries.set(key, entry);
+  stats.hits += 1;
+  return entry;
+};
+
+// Cache `body` (a JSON string) for the period [from, to), built from
+// `sources` ("events" and/or "rollups"). Returns the entry, which is not
+// kept if an invalidation ran since `startedAt` (a generation() value).
+const set = (key, body, { from, to, sources, startedAt }) => {
+  const entry = {
+    body,
+    etag: `"${crypto.createHash("sha1").update(body).digest("base64")}"`,
+    bytes: Buffer.byteLength(body) + key.length,
+    from: from.getTime(),
+    to: to.getTime(),
+    sources,
+  };
+  if (startedAt !== generation || entry.bytes > MAX_BYTES * MAX_ENTRY_SHARE) {
+    return entry;
+  }
+  remove(key);
+  entries.set(key, entry);
+  bytes += entry.bytes;
+  for (const oldest of entries.keys()) {
+    if (bytes <= MAX_BYTES) break;
+    remove(oldest);
+    stats.evictions += 1;
+  }
+  return entry;
+};
+
+const dropOverlapping = (source, from, to) => {
+  generation += 1;
+  entries.forEach((entry, key) => {
+    if (entry.sources.includes(source) && entry.from < to && from < entry.to) {
+      remove(key);
+      stats.invalidations += 1;
+    }
+  });
+};
+
+// Drop entries built from `source` that overlap [from, to) (Dates or
+// epoch ms), here and in the other cluster workers
+const invalidate = (source, from, to) => {
+  from = new Date(from).getTime();
+  to = new Date(to).getTime();
+  if (from >= closedBefore() || from >= to) return;
+  dropOverlapping(source, from, to);
+  clusterBus.publish("response-cache", { source, from, to });
+};
+
+clusterBus.subscribe("response-cache", ({ source, from, to }) =>
+  dropOverlapping(source, from, to)
+);
+
+const getStats = () => ({
+  ...stats,
+  entries: entries.size,
+  bytes,
+  maxBytes: MAX_BYTES,
+});
+
+module.exports = {
+  isClosed,
+  get,
+  set,
+  invalidate,
+  generation: () => generation,
+  getStats,
+};
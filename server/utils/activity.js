@@ -0,0 +1,56 @@
+const { BANNED_APPS } = require("../contants");
+
+// Largest number of windows kept in one event's dwell histogram
+const MAX_DWELL_WINDOWS = 10;
+
+// Normalize a client dwell histogram ([{ window, seconds }] or its JSON text)
+const parseDwell = (value) => {
+  let windows = value;
+  if (typeof windows === "string") {
+    try {
+      windows = JSON.parse(windows);
+    } catch (err) {
+      return [];
+    }
+  }
+  if (!Array.isArray(windows)) return [];
+  return windows
+    .filter(
+      (item) =>
+        item &&
+        typeof item.window === "string" &&
+        Number.isFinite(Number(item.seconds)) &&
+        Number(item.seconds) > 0
+    )
+    .slice(0, MAX_DWELL_WINDOWS)
+    .map((item) => ({ window: item.window, seconds: Number(item.seconds) }));
+};
+
+// Split the minute an event stands for across the windows it was spent in.
+// Events without a dwell histogram count as one minute in `window`.
+const eventWindowMinutes = (event) => {
+  const windows = event.windows || [];
+  const total = windows.reduce((sum, item) => sum + item.seconds, 0);
+  if (!total) return [{ window: event.window, minutes: 1 }];
+  return windows.map((item) => ({
+    window: item.window,
+    minutes: item.seconds / total,
+  }));
+};
+
+// Work and relax minutes of one event
+const eventWorkRelax = (event) => {
+  let work = 0;
+  let relax = 0;
+  eventWindowMinutes(event).forEach(({ window, minutes }) => {
+    if (BANNED_APPS.includes(window)) relax += minutes;
+    else work += minutes;
+  });
+  return { work, relax };
+};
+
+module.exports = {
+  parseDwell,
+  eventWindowMinutes,
+  eventWorkRelax,
+};
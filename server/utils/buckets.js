@@ -0,0 +1,247 @@
+const { BANNED_APPS } = require("../contants");
+
+const GRANULARITIES = ["hour", "day", "week"];
+
+const DAY_MS = 24 * 60 * 60 * 1000;
+// Longest range one bucket query may cover per granularity, which bounds
+// the number of buckets per user in a response
+const MAX_RANGE_MS = {
+  hour: 31 * DAY_MS,
+  day: 366 * DAY_MS,
+  week: 366 * DAY_MS,
+};
+
+// Minutes per window for one raw event: its dwell histogram normalized to
+// one minute, or the whole minute in `window` (see eventWindowMinutes)
+const EVENT_PARTS = {
+  $let: {
+    vars: { total: { $sum: "$windows.seconds" } },
+    in: {
+      $cond: [
+        { $gt: ["$$total", 0] },
+        {
+          $map: {
+            input: "$windows",
+            as: "item",
+            in: {
+              window: "$$item.window",
+              minutes: { $divide: ["$$item.seconds", "$$total"] },
+            },
+          },
+        },
+        [{ window: "$window", minutes: 1 }],
+      ],
+    },
+  },
+};
+
+// One { username, dt, parts } document per occupied minute of EventDay
+// documents overlapping [from, to)
+const dayStages = (match, from, to) => [
+  match,
+  {
+    $project: {
+      username: 1,
+      day: 1,
+      windows: 1,
+      slot: { $objectToArray: "$slots" },
+    },
+  },
+  { $unwind: "$slot" },
+  {
+    $project: {
+      _id: 0,
+      username: 1,
+      dt: {
+        $add: ["$day", { $multiply: [{ $toInt: "$slot.k" }, 60 * 1000] }],
+      },
+      parts: {
+        $let: {
+          vars: {
+            total: {
+              $sum: {
+                $map: { input: "$slot.v", in: { $arrayElemAt: ["$$this", 1] } },
+              },
+            },
+          },
+          in: {
+            $map: {
+              input: "$slot.v",
+              as: "part",
+              in: {
+                window: {
+                  $arrayElemAt: ["$windows", { $arrayElemAt: ["$$part", 0] }],
+                },
+                minutes: {
+                  $divide: [{ $arrayElemAt: ["$$part", 1] }, "$$total"],
+                },
+              },
+            },
+          },
+        },
+      },
+    },
+  },
+  { $match: { dt: { $gte: from, $lt: to } } },
+];
+
+// Minutes per window for one hourly Achieve row
+const ACHIEVE_PARTS = {
+  $map: {
+    input: "$windows",
+    as: "item",
+    in: { window: "$$item.window", minutes: "$$item.total" },
+  },
+};
+
+const sumMinutes = (parts) => ({
+  $sum: { $map: { input: parts, as: "part", in: "$$part.minutes" } },
+});
+
+const round = (value) => ({ $round: [value, 2] });
+
+const usernameFilter = (username) =>
+  Array.isArray(username) ? { $in: username } : username;
+
+const bucketStart = (date, granularity, timezone) => {
+  const trunc = { date, unit: granularity, timezone };
+  if (granularity === "week") trunc.startOfWeek = "sunday";
+  return { $dateTrunc: trunc };
+};
+
+// Stages over Event or EventDay (`source` "minute" or "day"), and before
+// `rolledUpBefore` over the hourly Achieve rollups whose raw events may
+// already be deleted, that yield one { username, dt, parts } document per
+// minute or rolled-up hour in [from, to), `parts` being its minutes per
+// window. `username` may be a list of usernames.
+const partsStages = ({
+  source = "minute",
+  from,
+  to,
+  username,
+  rolledUpBefore,
+  achieveCollection,
+}) => {
+  const match = (start, end) => {
+    const filter = { dt: { $gte: start, $lt: end } };
+    if (username) filter.username = usernameFilter(username);
+    return { $match: filter };
+  };
+
+  const stages = [];
+  const rawFrom = rolledUpBefore && rolledUpBefore > from ? rolledUpBefore : from;
+  if (source === "day") {
+    // Day documents starting up to a day before rawFrom still hold minutes in range
+    const dayMatch = { day: { $gt: new Date(rawFrom - DAY_MS), $lt: to } };
+    if (username) dayMatch.username = usernameFilter(username);
+    stages.push(...dayStages({ $match: dayMatch }, rawFrom, to));
+  } else {
+    stages.push(match(rawFrom, to));
+    stages.push({
+      $project: { _id: 0, username: 1, dt: 1, parts: EVENT_PARTS },
+    });
+  }
+  if (rawFrom > from) {
+    stages.push({
+      $unionWith: {
+        coll: achieveCollection,
+        pipeline: [
+          match(from, rawFrom < to ? rawFrom : to),
+          { $project: { _id: 0, username: 1, dt: 1, parts: ACHIEVE_PARTS } },
+        ],
+      },
+    });
+  }
+  return stages;
+};
+
+// Aggregation (options as for partsStages, plus `granularity` and
+// `timezone`) that returns one document per user and bucket with its
+// total/work/relax minutes, ordered by bucket then username. Work and
+// relax are split on BANNED_APPS the same way eventWorkRelax does.
+const teamBucketsPipeline = (options) => [
+  ...partsStages(options),
+  {
+    $project: {
+      username: 1,
+      bucket: bucketStart("$dt", options.granularity, options.timezone),
+      total: sumMinutes("$parts"),
+      relax: sumMinutes({
+        $filter: {
+          input: "$parts",
+          as: "part",
+          cond: { $in: ["$$part.window", BANNED_APPS] },
+        },
+      }),
+    },
+  },
+  {
+    $group: {
+      _id: { username: "$username", bucket: "$bucket" },
+      total: { $sum: "$total" },
+      relax: { $sum: "$relax" },
+    },
+  },
+  { $sort: { "_id.bucket": 1, "_id.username": 1 } },
+  {
+    $project: {
+      _id: 0,
+      username: "$_id.username",
+      t: "$_id.bucket",
+      total: round("$total"),
+      work: round({ $subtract: ["$total", "$relax"] }),
+      relax: round("$relax"),
+    },
+  },
+];
+
+// Aggregation (options as for partsStages) that returns the minutes per
+// window over the whole range, most used first
+const teamWindowsPipeline = (options) => [
+  ...partsStages(options),
+  { $unwind: "$parts" },
+  { $group: { _id: "$parts.window", minutes: { $sum: "$parts.minutes" } } },
+  { $sort: { minutes: -1 } },
+  { $project: { _id: 0, window: "$_id", minutes: round("$minutes") } },
+];
+
+// Per user, the first bucket touched by writes matching `changed` (a
+// filter on the write stamp, see eventStore.changedSince) and the latest
+// stamp: [{ username, from, changedAt }]. A day document counts as a
+// change from the start of its day.
+const changedBucketsPipeline = ({
+  source = "minute",
+  changed,
+  from,
+  to,
+  granularity,
+  timezone,
+  username,
+}) => {
+  const filter =
+    source === "day"
+      ? { ...changed, day: { $gt: new Date(from - DAY_MS), $lt: to } }
+      : { ...changed, dt: { $gte: from, $lt: to } };
+  if (username) filter.username = usernameFilter(username);
+  const dt = source === "day" ? "$day" : "$dt";
+  const stamp = source === "day" ? "$updatedAt" : { $toDate: "$_id" };
+  return [
+    { $match: filter },
+    {
+      $group: {
+        _id: "$username",
+        from: { $min: bucketStart(dt, granularity, timezone) },
+        changedAt: { $max: stamp },
+      },
+    },
+    { $project: { _id: 0, username: "$_id", from: 1, changedAt: 1 } },
+  ];
+};
+
+module.exports = {
+  GRANULARITIES,
+  MAX_RANGE_MS,
+  teamBucketsPipeline,
+  teamWindowsPipeline,
+  changedBucketsPipeline,
+};
@@ -0,0 +1,5 @@
+// The server keeps local time in Asia/Taipei (UTC+8). Rollup hours and
+// EventDay day keys and minute slots are computed in local time, so every
+// entry point that writes them (server.js, scripts/) requires this module
+// first, before any date is computed.
+process.env.TZ = "Asia/Taipei";
@@ -0,0 +1,35 @@
+// Compact batch uploads from the client (client/wire_format.py): gzip
+// JSON { v, u, w: [window names], s: [[dtDeltaMs, [[windowIndex, seconds]]]] }
+// where the first delta is an epoch-ms timestamp and each later one is
+// relative to the sample before it
+const COMPACT_TYPE = "application/vnd.teammonitor.batch+json";
+const COMPACT_VERSION = 1;
+
+// Decode a compact batch (already inflated by express.raw) into the
+// plain { username, samples } batch body; throws on malformed input
+const decodeCompactBatch = (buffer) => {
+  const body = JSON.parse(buffer.toString("utf8"));
+  if (!body || body.v !== COMPACT_VERSION) {
+    throw new Error(`Unsupported batch version: ${body && body.v}`);
+  }
+  if (!Array.isArray(body.w) || !Array.isArray(body.s)) {
+    throw new Error("Malformed batch");
+  }
+
+  let dt = 0;
+  const samples = body.s.map(([delta, parts]) => {
+    dt += Number(delta);
+    const windows = (Array.isArray(parts) ? parts : []).map(([index, seconds]) => ({
+      window: body.w[index],
+      seconds,
+    }));
+    return {
+      dt,
+      window: windows.length ? windows[0].window : "",
+      windows,
+    };
+  });
+  return { username: body.u, samples };
+};
+
+module.exports = { COMPACT_TYPE, decodeCompactBatch };